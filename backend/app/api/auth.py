@@ -1,26 +1,19 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
-from app.services.auth import create_user, authenticate
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.dependencies import get_async_db
+from app.services.auth import acreate_user, aauthenticate
 from app.core.security import create_token
 
 router = APIRouter(prefix="/auth")
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register")
-def register(email: str, password: str, db: Session = Depends(get_db)):
-    user = create_user(db, email, password)
+async def register(email: str, password: str, db: AsyncSession = Depends(get_async_db)):
+    user = await acreate_user(db, email, password)
     return {"id": user.id}
 
 @router.post("/login")
-def login(email: str, password: str, db: Session = Depends(get_db)):
-    user = authenticate(db, email, password)
+async def login(email: str, password: str, db: AsyncSession = Depends(get_async_db)):
+    user = await aauthenticate(db, email, password)
     if not user:
         raise HTTPException(401, "Invalid credentials")
     return {"token": create_token(user.id, user.role)}
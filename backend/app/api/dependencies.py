@@ -1,10 +1,9 @@
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer
-from jose import jwt
-from sqlalchemy.orm import Session
-from app.core.database import SessionLocal
-from app.core.config import settings
-from app.models.user import User
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.core.metrics import STAGE_SECONDS, timed
+from app.services.principals import Principal, aresolve_principal
+from app.services.scheduler import set_tenant
 
 security = HTTPBearer()
 
@@ -15,20 +14,17 @@ def get_db():
     finally:
         db.close()
 
-def get_current_user(
-    credentials=Depends(security),
-    db: Session = Depends(get_db)
-):
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+async def get_current_user(credentials=Depends(security)) -> Principal:
     try:
-        payload = jwt.decode(
-            credentials.credentials,
-            settings.jwt_secret,
-            algorithms=["HS256"]
-        )
-        user_id = int(payload["sub"])
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise Exception()
-        return user
+        with timed(STAGE_SECONDS, pipeline="auth", stage="total"):
+            principal = await aresolve_principal(credentials.credentials)
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid token")
+
+    # Backend calls made for this request are scheduled as this user's
+    set_tenant(principal.id)
+    return principal
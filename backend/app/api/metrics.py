@@ -0,0 +1,56 @@
+import time
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from app.core.config import settings
+from app.core.metrics import HTTP_REQUEST_SECONDS, render_metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    if not settings.metrics_enabled:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(
+        render_metrics(),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware timing each HTTP request until its response is fully
+    sent (so streamed answers count in full), labelled by route template
+    rather than raw path to keep label cardinality bounded
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.metrics_enabled:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            # The router stores the matched route on the (shared) scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_REQUEST_SECONDS.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route,
+                status=status
+            )
@@ -1,22 +1,116 @@
-from fastapi import APIRouter, Depends
+import json
+import time
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from app.api.dependencies import get_current_user
-from app.services.rag import run_rag
+from app.core.config import settings
+from app.services.rag import arun_rag, arun_rag_batch, astream_rag
+from app.services.scheduler import RateLimited
+from app.services.usage import record_query_usage
 
 router = APIRouter(prefix="/query", tags=["Query"])
 
+
+class BatchQueryRequest(BaseModel):
+    questions: list[Annotated[str, Field(max_length=settings.query_max_question_chars)]]
+    namespace: str
+    top_k: int = Field(5, ge=1, le=settings.query_max_top_k)
+
+
 @router.post("/")
-def query_documents(
+async def query_documents(
     question: str,
     namespace: str,
     user=Depends(get_current_user)
 ):
-    result = run_rag(
+    started = time.perf_counter()
+    result = await arun_rag(
         query=question,
         namespace=namespace
     )
+    record_query_usage(user.id, result, (time.perf_counter() - started) * 1000)
 
     return {
         "question": question,
         "answer": result["answer"],
-        "sources": result["sources"]
+        "sources": result["sources"],
+        "retrieval_backends": result["backends"],
+        "prompt_tokens": result["prompt_tokens"],
+        "cached": result["cached"],
+        "coalesced": result["coalesced"],
+        "timed_out": result.get("timed_out", False)
     }
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@router.post("/stream")
+async def stream_query_documents(
+    question: str,
+    namespace: str,
+    user=Depends(get_current_user)
+):
+    """
+    Server-sent events: `sources` first, then `token` events as the
+    answer is generated, then `done` (or `error`).
+    """
+    async def events():
+        started = time.perf_counter()
+        result = {"answer": ""}
+        try:
+            async for event, data in astream_rag(query=question, namespace=namespace):
+                if event == "sources":
+                    result.update(data)
+                elif event == "token":
+                    result["answer"] += data["text"]
+                yield _sse(event, data)
+
+            record_query_usage(
+                user.id,
+                result,
+                (time.perf_counter() - started) * 1000,
+                action="query_stream"
+            )
+        except RateLimited as e:
+            # Headers are already sent: report the limit in the stream
+            yield _sse("error", {"detail": str(e), "retry_after": e.retry_after})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.post("/batch")
+async def batch_query_documents(
+    request: BatchQueryRequest,
+    user=Depends(get_current_user)
+):
+    if not request.questions:
+        raise HTTPException(status_code=400, detail="No questions given")
+
+    if len(request.questions) > settings.batch_query_max_questions:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.batch_query_max_questions} questions per batch"
+        )
+
+    response = await arun_rag_batch(
+        questions=request.questions,
+        namespace=request.namespace,
+        top_k=request.top_k
+    )
+
+    for result in response["results"]:
+        if result["error"] is None:
+            record_query_usage(user.id, result, result["latency_ms"], action="query_batch")
+
+    return response
@@ -1,94 +1,287 @@
-from fastapi import APIRouter, UploadFile, File, Depends
-from sqlalchemy.orm import Session
-
-from app.api.dependencies import get_db, get_current_user
-from app.models.document import Document
-from app.utils.file_loader import (
-    extract_text_from_pdf_bytes,
-    upload_file
-)
-from app.services.chunking import chunk_text
-from app.services.vector_store import upsert_texts
+import asyncio
+import os
+import zipfile
+
+from fastapi import APIRouter, UploadFile, File, Depends, Response
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import get_async_db, get_current_user
+from app.core.config import settings
+from app.core.metrics import STAGE_SECONDS, timed
+from app.models.document import Document, DocumentChunk
 from fastapi import HTTPException
-from app.services.vector_store import delete_document_vectors
-from app.utils.file_loader import delete_file
+from app.services.bulk_ingestion import (
+    enqueue_bulk_ingestion,
+    expand_zip,
+    mark_duplicates,
+    new_file_entry
+)
+from app.services.cache import invalidate_namespace
+from app.services.ingestion import UploadTooLarge, aspool_upload, enqueue_ingestion
+from app.services.job_queue import get_job_queue
+from app.services.manifest import arecord_ids, verify_manifest
+from app.services.vector_store import adelete_document_vectors, namespace_stats
+from app.utils.file_loader import adelete_file
 
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
 
-@router.post("/upload")
-def upload_document(
+@router.post("/upload", status_code=202)
+async def upload_document(
+    response: Response,
     file: UploadFile = File(...),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user)
 ):
-    # 1️⃣ Read file into memory
-    file_bytes = file.file.read()
-
-    # 2️⃣ Upload to Supabase Storage
-    storage_path = upload_file(
-        file_bytes=file_bytes,
-        filename=file.filename
-    )
-
-    # 3️⃣ Extract text from bytes (NO local disk)
-    text = extract_text_from_pdf_bytes(file_bytes)
-
-    # 4️⃣ Chunk text
-    chunks = chunk_text(
-        text=text,
-        doc_type="general",
-        purpose="qa"
-    )
-
-    # 5️⃣ Store document metadata in DB
-    doc = Document(
-        filename=file.filename,
-        owner_id=user.id,
-        storage_path=storage_path
-    )
-    db.add(doc)
-    db.commit()
-    # db.refresh(doc)
-
-    # 6️⃣ Pinecone namespace (per-user isolation)
+    # 1️⃣ Spool file to disk and fingerprint its content
+    try:
+        with timed(STAGE_SECONDS, pipeline="upload", stage="read"):
+            spool_path, content_hash = await aspool_upload(
+                upload=file,
+                filename=file.filename
+            )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # 2️⃣ Same file already ingested for this owner → reuse the document
+    with timed(STAGE_SECONDS, pipeline="upload", stage="dedup_check"):
+        existing = (await db.execute(
+            select(Document).where(
+                Document.owner_id == user.id,
+                Document.content_hash == content_hash
+            )
+        )).scalars().first()
+
+    if existing:
+        os.remove(spool_path)
+        response.status_code = 200
+        return {
+            "document_id": existing.id,
+            "filename": existing.filename,
+            "status": "duplicate",
+            "storage_path": existing.storage_path
+        }
+
+    # 3️⃣ Same file already queued → point at the in-flight job
+    job = get_job_queue().find_active_job(user.id, content_hash)
+
+    if job:
+        os.remove(spool_path)
+    else:
+        # 4️⃣ Queue for background ingestion
+        job = enqueue_ingestion(
+            owner_id=user.id,
+            filename=file.filename,
+            spool_path=spool_path,
+            content_hash=content_hash
+        )
+
+    # Progress is reported by /documents/jobs/{job_id}
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"]
+    }
+
+
+def _public_file(entry: dict) -> dict:
+    return {
+        key: entry[key]
+        for key in ("filename", "status", "stage", "document_id", "num_chunks", "error")
+    }
+
+
+@router.post("/upload/bulk", status_code=202)
+async def upload_documents_bulk(
+    files: list[UploadFile] = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user)
+):
+    # Multipart requests are capped at 1000 files; larger sets go in zip archives
+    entries = []
+
+    # 1️⃣ Spool every file to disk; zip archives are unpacked into their PDFs
+    for file in files:
+        is_zip = file.filename.lower().endswith(".zip")
+        try:
+            spool_path, content_hash = await aspool_upload(
+                upload=file,
+                filename=file.filename,
+                limit=settings.bulk_max_archive_bytes if is_zip else None
+            )
+        except UploadTooLarge as e:
+            entries.append(new_file_entry(file.filename, status="rejected", error=str(e)))
+            continue
+
+        if not is_zip:
+            entries.append(new_file_entry(file.filename, spool_path, content_hash))
+            continue
+
+        try:
+            entries += await asyncio.to_thread(expand_zip, spool_path)
+        except zipfile.BadZipFile as e:
+            entries.append(new_file_entry(file.filename, status="rejected", error=f"Not a zip archive: {e}"))
+        finally:
+            os.remove(spool_path)
+
+    queued = [e for e in entries if e["status"] == "queued"]
+    if len(queued) > settings.bulk_max_files:
+        for entry in queued:
+            os.remove(entry["spool_path"])
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.bulk_max_files} files per bulk upload"
+        )
+
+    # 2️⃣ Files already ingested for this owner (or repeated in the batch) are skipped
+    existing = {}
+    if queued:
+        rows = await db.execute(
+            select(Document.content_hash, Document.id).where(
+                Document.owner_id == user.id,
+                Document.content_hash.in_({e["content_hash"] for e in queued})
+            )
+        )
+        existing = dict(rows.all())
+    mark_duplicates(entries, existing)
+
+    # 3️⃣ Queue one pipelined job for everything left
+    job = None
+    if any(e["status"] == "queued" for e in entries):
+        name = files[0].filename if len(files) == 1 else f"{len(files)} files"
+        job = enqueue_bulk_ingestion(user.id, name, entries)
+
+    # Per-file progress is reported by /documents/jobs/{job_id}
+    return {
+        "job_id": job["id"] if job else None,
+        "status": job["status"] if job else "done",
+        "files": [_public_file(e) for e in entries]
+    }
+
+
+@router.get("/stats")
+def get_namespace_stats(user=Depends(get_current_user)):
     namespace = f"user_{user.id}"
+    return {
+        "namespace": namespace,
+        "stores": namespace_stats(namespace)
+    }
+
 
-    metadatas = [
-        {
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(
+    job_id: str,
+    user=Depends(get_current_user)
+):
+    job = get_job_queue().get_job(job_id)
+
+    if not job or job["owner_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return {
+        "job_id": job["id"],
+        "filename": job["filename"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "stages": job["stages"],
+        "document_id": job["document_id"],
+        "files": [_public_file(f) for f in job.get("files") or []] or None,
+        "result": job["result"],
+        "error": job["error"]
+    }
+
+@router.put("/{document_id}", status_code=202)
+async def reindex_document(
+    document_id: int,
+    response: Response,
+    file: UploadFile = File(...),
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user)
+):
+    # 1️⃣ Fetch document
+    doc = await db.get(Document, document_id)
+
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # 2️⃣ Ownership check (RBAC)
+    if doc.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    # 3️⃣ Spool the new version to disk and fingerprint its content
+    try:
+        with timed(STAGE_SECONDS, pipeline="upload", stage="read"):
+            spool_path, content_hash = await aspool_upload(
+                upload=file,
+                filename=file.filename
+            )
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+    # 4️⃣ Same content as what is indexed → nothing to do
+    if doc.content_hash == content_hash:
+        os.remove(spool_path)
+        response.status_code = 200
+        return {
             "document_id": doc.id,
-            "chunk_index": idx,
-            "filename": file.filename,
+            "filename": doc.filename,
+            "status": "unchanged",
+            "storage_path": doc.storage_path
         }
-        for idx in range(len(chunks))
-    ]
 
-    # 7️⃣ Upsert chunks to Pinecone
-    upsert_texts(
-        texts=chunks,
-        metadatas=metadatas,
-        namespace=namespace
-    )
+    # 5️⃣ Same version of this document already queued → point at the in-flight job
+    job = get_job_queue().find_active_job(user.id, content_hash, document_id=doc.id)
+
+    if job:
+        os.remove(spool_path)
+    else:
+        # 6️⃣ Queue for background re-indexing (only changed chunks are re-embedded)
+        job = enqueue_ingestion(
+            owner_id=user.id,
+            filename=file.filename,
+            spool_path=spool_path,
+            content_hash=content_hash,
+            document_id=doc.id
+        )
 
     return {
+        "job_id": job["id"],
         "document_id": doc.id,
-        "filename": doc.filename,
-        "num_chunks": len(chunks),
-        "sample_chunk": chunks[0][:300] if chunks else "",
-        "storage_path": storage_path
+        "filename": job["filename"],
+        "status": job["status"]
     }
-    
+
+
+@router.get("/{document_id}/verify")
+async def verify_document_index(
+    document_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user)
+):
+    # 1️⃣ Fetch document
+    doc = await db.get(Document, document_id)
+
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+
+    # 2️⃣ Ownership check (RBAC)
+    if doc.owner_id != user.id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    # 3️⃣ Compare the chunk manifest with what each store holds
+    return await asyncio.to_thread(verify_manifest, doc.id, f"user_{user.id}")
+
+
 @router.delete("/{document_id}")
-def delete_document(
+async def delete_document(
     document_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     user=Depends(get_current_user)
 ):
     # 1️⃣ Fetch document
-    doc = db.query(Document).filter(
-        Document.id == document_id
-    ).first()
+    doc = await db.get(Document, document_id)
 
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
@@ -100,21 +293,29 @@ def delete_document(
     namespace = f"user_{user.id}"
 
     try:
-        # 3️⃣ Delete vectors from Pinecone
-        delete_document_vectors(
+        # 3️⃣ Delete vectors by id (the chunk manifest lists every record)
+        ids = await arecord_ids(db, doc.id)
+        await adelete_document_vectors(
             document_id=doc.id,
-            namespace=namespace
+            namespace=namespace,
+            ids=ids or None
         )
 
         # 4️⃣ Delete file from Supabase Storage
-        delete_file(doc.storage_path)
+        await adelete_file(doc.storage_path)
+
+        # 5️⃣ Delete DB rows (chunk manifest + document)
+        await db.execute(
+            delete(DocumentChunk).where(DocumentChunk.document_id == doc.id)
+        )
+        await db.delete(doc)
+        await db.commit()
 
-        # 5️⃣ Delete DB row
-        db.delete(doc)
-        db.commit()
+        # 6️⃣ Cached answers may cite the deleted document
+        invalidate_namespace(namespace)
 
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=500,
             detail=f"Failed to delete document: {str(e)}"
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.api.dependencies import get_async_db, get_current_user
+from app.models.usage import UsageDaily
+
+router = APIRouter(prefix="/usage", tags=["Usage"])
+
+
+@router.get("/summary")
+async def usage_summary(
+    days: int = 30,
+    user_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    user=Depends(get_current_user)
+):
+    """
+    Per-day, per-action totals from the pre-rolled usage_daily table.
+    Admins may pass `user_id` to see another user's usage.
+    """
+    if user_id is not None and user_id != user.id and user.role != "admin":
+        raise HTTPException(status_code=403, detail="Admins only")
+
+    target = user_id if user_id is not None else user.id
+    # Days are UTC, as usage events are bucketed
+    since = datetime.utcnow().date() - timedelta(days=days - 1)
+
+    rows = (await db.execute(
+        select(UsageDaily).where(
+            UsageDaily.user_id == target,
+            UsageDaily.day >= since
+        ).order_by(UsageDaily.day, UsageDaily.action)
+    )).scalars().all()
+
+    daily = [
+        {
+            "day": row.day.isoformat(),
+            "action": row.action,
+            "events": row.events,
+            "tokens": row.tokens,
+            "prompt_tokens": row.prompt_tokens,
+            "completion_tokens": row.completion_tokens,
+            "avg_latency_ms": round(row.latency_ms / row.events, 1) if row.events else 0.0,
+            "chunks": row.chunks,
+        }
+        for row in rows
+    ]
+
+    totals = {}
+    for row in daily:
+        t = totals.setdefault(row["action"], {"events": 0, "tokens": 0})
+        t["events"] += row["events"]
+        t["tokens"] += row["tokens"]
+
+    return {
+        "user_id": target,
+        "since": since.isoformat(),
+        "daily": daily,
+        "totals": totals
+    }
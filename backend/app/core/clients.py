@@ -0,0 +1,68 @@
+"""
+Lazily created, process-wide clients for external services.
+
+Each client is built by its registered factory on first use and shared
+afterwards (one connection pool per service). `override_client` swaps in
+a local stand-in, e.g. in benchmarks or for offline development.
+"""
+import threading
+from typing import Any, Callable
+
+_factories: dict[str, Callable[[], Any]] = {}
+_instances: dict[str, Any] = {}
+_lock = threading.RLock()
+
+
+def register_client(name: str, factory: Callable[[], Any]) -> None:
+    with _lock:
+        _factories[name] = factory
+
+
+def get_client(name: str) -> Any:
+    instance = _instances.get(name)
+    if instance is not None:
+        return instance
+
+    with _lock:
+        if name not in _instances:
+            if name not in _factories:
+                raise KeyError(f"No client registered as {name!r}")
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def peek_client(name: str) -> Any:
+    """
+    Returns the client if it has already been created, else None
+    """
+    return _instances.get(name)
+
+
+def set_client(name: str, instance: Any) -> None:
+    """
+    Stores a client created outside its factory (e.g. by an async constructor)
+    """
+    with _lock:
+        _instances[name] = instance
+
+
+def override_client(name: str, instance: Any) -> None:
+    """
+    Replaces a client with a stand-in for the rest of the process
+    """
+    with _lock:
+        _instances[name] = instance
+
+
+def reset_client(name: str) -> None:
+    """
+    Drops a client so the next get_client call rebuilds it
+    """
+    with _lock:
+        _instances.pop(name, None)
+
+
+def require_setting(value, name: str):
+    if not value:
+        raise RuntimeError(f"{name} must be set to use this service")
+    return value
@@ -15,12 +15,138 @@ class Settings(BaseSettings):
     pinecone_env: Optional[str] = None
     pinecone_index_host: Optional[str] = None
     pinecone_sparse_index_host: Optional[str] = None
-    SUPABASE_URL: str
-    SUPABASE_SERVICE_KEY: str
+    SUPABASE_URL: Optional[str] = None
+    SUPABASE_SERVICE_KEY: Optional[str] = None
     SUPABASE_BUCKET: str = "documents"
     database_url: Optional[str] = None
     jwt_secret: Optional[str] = None
 
+    # Database pools
+    db_pool_size: int = 5
+    db_max_overflow: int = 5
+    db_async_pool_size: int = 10
+
+    # Auth caches
+    token_cache_ttl_seconds: int = 300
+    user_cache_ttl_seconds: int = 60
+    principal_cache_max_entries: int = 10000
+
+    # Usage accounting
+    usage_buffer_size: int = 10000
+    usage_flush_interval: float = 5.0
+    usage_flush_batch: int = 1000
+    usage_overflow_policy: str = "drop"  # drop / block
+    usage_block_timeout: float = 0.05
+
+    # Background ingestion
+    ingestion_queue_backend: str = "memory"  # memory / sqlite
+    ingestion_sqlite_path: str = "ingestion_jobs.db"
+    ingestion_workers: int = 2
+    ingestion_job_ttl_seconds: int = 24 * 3600  # finished jobs kept (memory backend)
+    ingestion_spool_dir: Optional[str] = None
+    max_upload_bytes: int = 200 * 1024 * 1024
+
+    # Bulk ingestion (pipelined across documents)
+    bulk_max_files: int = 5000
+    bulk_max_archive_bytes: int = 2 * 1024 * 1024 * 1024
+    bulk_max_expanded_bytes: int = 4 * 1024 * 1024 * 1024  # unpacked from one archive
+    bulk_store_workers: int = 4
+    bulk_extract_workers: int = 2
+    bulk_chunk_workers: int = 2
+    bulk_stage_queue_depth: int = 4  # documents buffered between stages
+    bulk_upsert_chunks: int = 2000  # chunks coalesced per upsert flush
+
+    # PDF extraction
+    pdf_extract_workers: Optional[int] = None  # defaults to CPU count
+    # Smaller documents are extracted as one range, not split across
+    # workers: below this the pool round trips cost more than they save
+    pdf_parallel_min_pages: int = 8
+    pdf_page_timeout: float = 30.0
+
+    # Vector store backend
+    vector_backend: str = "pinecone"  # pinecone / local
+    local_index_dir: str = "local_index"
+    local_embedding_dim: int = 384
+    local_ann_threshold: int = 20000
+
+    # Built-in lexical (BM25) index, the sparse leg of hybrid retrieval
+    # when no Pinecone sparse index is configured
+    lexical_index_enabled: bool = True
+    lexical_index_dir: str = "lexical_index"
+    lexical_bm25_k1: float = 1.2
+    lexical_bm25_b: float = 0.75
+    lexical_merge_factor: int = 8  # segments per namespace before a merge
+
+    # Vector upserts
+    upsert_batch_size: int = 96
+    upsert_batch_max_bytes: int = 2 * 1024 * 1024
+    upsert_parallelism: int = 4
+    upsert_max_retries: int = 3
+    upsert_retry_backoff: float = 0.5
+    vector_delete_batch_size: int = 1000  # Pinecone's limit of ids per delete
+
+    # Retrieval
+    retrieval_pool_size: int = 16
+    dense_search_timeout: float = 10.0
+    sparse_search_timeout: float = 2.0
+    # Hedged searches: when a search has not answered within this quantile
+    # of the backend's recent latencies, a duplicate is sent and the first
+    # answer wins (no hedging until min_samples latencies are known)
+    search_hedging_enabled: bool = True
+    search_hedge_quantile: float = 0.95
+    search_hedge_min_samples: int = 20
+    search_hedge_min_delay: float = 0.01
+
+    # Per-request deadline for run_rag and astream_rag, bounding queueing,
+    # searches and generation (seconds, 0 = none). Generation past it is
+    # cancelled and the partial answer returned, marked timed_out.
+    query_deadline_seconds: float = 30.0
+    llm_pool_size: int = 64  # above Starlette's 40 request threads
+    # Client-side timeout of one LLM request (or one read of its stream),
+    # so a hung generation doesn't hold a pool thread forever
+    llm_request_timeout: float = 60.0
+
+    # Batch queries
+    batch_query_parallelism: int = 8
+    batch_query_max_questions: int = 500
+    query_max_question_chars: int = 2000
+    query_max_top_k: int = 20
+
+    # Per-tenant fair scheduling of LLM, search and upsert calls:
+    # global concurrency caps, weighted fair queuing and per-tenant token
+    # buckets (rate in calls/second, 0 = unlimited). The rates are for
+    # interactive requests: a /query/batch request is charged one LLM
+    # call, and its questions (batch_query_parallelism at a time) are
+    # bounded by the concurrency caps only.
+    scheduler_enabled: bool = True
+    llm_max_concurrency: int = 8
+    llm_tenant_rate: float = 1.0
+    llm_tenant_burst: int = 10
+    search_max_concurrency: int = 32
+    search_tenant_rate: float = 5.0
+    search_tenant_burst: int = 30
+    upsert_max_concurrency: int = 8
+    upsert_tenant_rate: float = 0.0
+    upsert_tenant_burst: int = 0
+    scheduler_max_queued_per_tenant: int = 16
+    scheduler_queue_timeout: float = 10.0
+    scheduler_tenant_weights: dict[str, float] = {}  # tenant (user id) -> weight, default 1
+
+    # Coalesce concurrent identical queries into one pipeline run
+    query_singleflight_enabled: bool = True
+
+    # Prompt assembly
+    context_token_budget: int = 3000
+
+    # Retrieval + answer cache
+    cache_backend: str = "memory"  # memory / redis / none
+    cache_ttl_seconds: int = 600
+    cache_max_entries: int = 1024
+    redis_url: Optional[str] = None
+
+    # Observability
+    metrics_enabled: bool = True
+
     # Prefer an absolute env file path if it exists, otherwise fall back to default behavior
     model_config = {"env_file": str(_env_path) if _env_path.exists() else ".env"}
 
@@ -1,16 +1,118 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker, declarative_base
+from app.core.clients import get_client, peek_client, register_client, require_setting
 from app.core.config import settings
 
-engine = create_engine(
-    settings.database_url,
-    pool_pre_ping=True,
-    pool_size=5,
-    max_overflow=5,
-    execution_options={"compiled_cache": None},
-    connect_args={"sslmode": "require"}
-)
+
+def _is_postgres(url) -> bool:
+    return url.get_backend_name() == "postgresql"
+
+
+def _database_url():
+    return make_url(require_setting(settings.database_url, "DATABASE_URL"))
+
+
+def _build_engine():
+    url = _database_url()
+    return create_engine(
+        url,
+        pool_pre_ping=True,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        execution_options={"compiled_cache": None},
+        connect_args={"sslmode": "require"} if _is_postgres(url) else {}
+    )
+
+
+def _async_url(url):
+    if _is_postgres(url):
+        # asyncpg takes `ssl` as a connect arg, not `sslmode` in the URL
+        return url.set(drivername="postgresql+asyncpg").difference_update_query(["sslmode"])
+    if url.get_backend_name() == "sqlite":
+        return url.set(drivername="sqlite+aiosqlite")
+    return url
+
+
+# ---- Async engine for `async def` routes ----
+def _build_async_engine():
+    url = _database_url()
+    options = {"pool_pre_ping": True}
+    if _is_postgres(url):
+        options.update(
+            pool_size=settings.db_async_pool_size,
+            max_overflow=settings.db_max_overflow,
+            connect_args={"ssl": "require"}
+        )
+    return create_async_engine(_async_url(url), **options)
+
+
+register_client("db_engine", _build_engine)
+register_client("db_async_engine", _build_async_engine)
+
+
+def get_engine():
+    return get_client("db_engine")
 
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+def get_async_engine():
+    return get_client("db_async_engine")
+
+
+async def dispose_async_engine():
+    engine = peek_client("db_async_engine")
+    if engine is not None:
+        await engine.dispose()
+
+
+# Sessions resolve their engine on first use rather than at import,
+# so importing the app doesn't require (or connect to) a database.
+class _LazySession(Session):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return get_engine()
+
+
+class _LazyAsyncSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        return get_async_engine().sync_engine
+
+
+SessionLocal = sessionmaker(class_=_LazySession, autocommit=False, autoflush=False)
+AsyncSessionLocal = async_sessionmaker(
+    sync_session_class=_LazyAsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
 Base = declarative_base()
+
+
+def add_missing_columns(engine, *tables):
+    """
+    Adds the columns (and their indexes) that `tables` gained after they
+    were created: create_all only creates missing tables, it never alters
+    existing ones. Existing rows get the column's scalar default, if any.
+    New columns must be nullable or have a default.
+    """
+    inspector = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+
+    with engine.begin() as conn:
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue  # create_all creates it whole
+
+            present = {column["name"] for column in inspector.get_columns(table.name)}
+            added = [column for column in table.columns if column.name not in present]
+            for column in added:
+                conn.execute(text(
+                    f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(column.name)} "
+                    f"{column.type.compile(dialect=engine.dialect)}"
+                ))
+                if column.default is not None and column.default.is_scalar:
+                    conn.execute(table.update().values({column.name: column.default.arg}))
+
+            names = {column.name for column in added}
+            for index in table.indexes:
+                if names & {column.name for column in index.columns}:
+                    index.create(conn, checkfirst=True)
@@ -0,0 +1,254 @@
+"""
+In-process counters, gauges and histograms, rendered in the Prometheus text
+exposition format by GET /metrics.
+
+Recording is a lock, a dict lookup and (for histograms) a bisect, so it
+is cheap enough to leave on in production. Values are per process: with
+several uvicorn workers, scrape each worker.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+from app.core.config import settings
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: tuple = ()) -> str:
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def _header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{self._labels(key)} {_format_number(value)}")
+        return lines
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = dict(self._values)
+        lines = self._header()
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{self._labels(key)} {_format_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        if not settings.metrics_enabled:
+            return
+        key = self._key(labels)
+        slot = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # [per-bucket counts (+Inf last), sum]
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][slot] += 1
+            state[1] += value
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        lines = self._header()
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = self._labels(key, (("le", _format_number(bound)),))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_number(total)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+_registry: list[_Metric] = []
+
+
+def counter(name: str, help: str, labelnames: tuple = ()) -> Counter:
+    metric = Counter(name, help, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def gauge(name: str, help: str, labelnames: tuple = ()) -> Gauge:
+    metric = Gauge(name, help, labelnames)
+    _registry.append(metric)
+    return metric
+
+
+def histogram(name: str, help: str, labelnames: tuple = (), buckets: tuple = LATENCY_BUCKETS) -> Histogram:
+    metric = Histogram(name, help, labelnames, buckets)
+    _registry.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@contextmanager
+def timed(metric: Histogram, **labels):
+    """
+    Observes the time spent in the block (also when it raises)
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metric.observe(time.perf_counter() - started, **labels)
+
+
+# ---- Metrics recorded by the app ----
+
+HTTP_REQUEST_SECONDS = histogram(
+    "docintel_http_request_seconds",
+    "HTTP request latency by route template",
+    ("method", "route", "status")
+)
+STAGE_SECONDS = histogram(
+    "docintel_stage_seconds",
+    "Time spent in each stage of the query, retrieval, auth and upload pipelines",
+    ("pipeline", "stage")
+)
+RETRIEVAL_SEARCHES = counter(
+    "docintel_retrieval_searches_total",
+    "Vector searches by backend and outcome (ok, timeout, error)",
+    ("backend", "status")
+)
+RETRIEVAL_HITS = counter(
+    "docintel_retrieval_hits_total",
+    "Hits returned by each vector backend",
+    ("backend",)
+)
+CACHE_LOOKUPS = counter(
+    "docintel_cache_lookups_total",
+    "Cache lookups by cache (answer, token, user) and result (hit, miss)",
+    ("cache", "result")
+)
+SINGLEFLIGHT_CALLS = counter(
+    "docintel_singleflight_calls_total",
+    "Calls through a single-flight group by role: leader (ran the call) or follower (coalesced onto a leader's call)",
+    ("flight", "role")
+)
+SCHEDULER_QUEUED = gauge(
+    "docintel_scheduler_queued",
+    "Calls waiting for a slot, by resource (llm, search, upsert) and tenant",
+    ("resource", "tenant")
+)
+SCHEDULER_ACTIVE = gauge(
+    "docintel_scheduler_active",
+    "Calls holding a slot, by resource and tenant",
+    ("resource", "tenant")
+)
+SCHEDULER_WAIT_SECONDS = histogram(
+    "docintel_scheduler_wait_seconds",
+    "Time calls spent queued for a slot, by resource and tenant",
+    ("resource", "tenant")
+)
+SCHEDULER_REJECTIONS = counter(
+    "docintel_scheduler_rejections_total",
+    "Calls refused with 429, by resource, tenant and reason (rate, queue_full, timeout)",
+    ("resource", "tenant", "reason")
+)
+HEDGED_REQUESTS = counter(
+    "docintel_hedged_requests_total",
+    "Hedged calls by backend and outcome: sent (a duplicate was issued) or won (the duplicate answered first)",
+    ("backend", "outcome")
+)
+DEADLINE_EXCEEDED = counter(
+    "docintel_deadline_exceeded_total",
+    "Calls cut short by the request deadline, by stage (retrieval, llm, <resource>_queue)",
+    ("stage",)
+)
+PROMPT_TOKENS = histogram(
+    "docintel_prompt_tokens",
+    "Prompt size sent to the LLM, in tokens",
+    buckets=(128, 256, 512, 1024, 2048, 3072, 4096, 8192, 16384)
+)
+DOCUMENT_CHUNKS = histogram(
+    "docintel_document_chunks",
+    "Chunks stored per ingested document",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+)
+DOCUMENT_PAGES = histogram(
+    "docintel_document_pages",
+    "Pages per ingested document",
+    buckets=(1, 2, 5, 10, 25, 50, 100, 250, 500, 1000)
+)
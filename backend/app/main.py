@@ -1,40 +1,86 @@
-from fastapi import FastAPI
+import logging
+import math
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
 # Database
-from app.core.database import Base, engine
+from app.core.database import Base, add_missing_columns, dispose_async_engine, get_engine
 
 # Models (important: ensures table creation)
 from app.models.user import User
-from app.models.document import Document
+from app.models.document import Document, DocumentChunk
+from app.models.usage import Usage, UsageDaily
 
 # Routers
 from app.api.auth import router as auth_router
 from app.api.upload import router as upload_router
 from app.api.query import router as query_router
+from app.api.usage import router as usage_router
+from app.api.metrics import MetricsMiddleware, router as metrics_router
 
+# Background workers
+from app.services.ingestion import worker_pool
+from app.services.usage import usage_recorder
+from app.services.scheduler import RateLimited
+from app.services.deadline import DeadlineExceeded
 
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="Enterprise Document Intelligence System")
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(RateLimited)
+async def rate_limited(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "reason": exc.reason},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))}
+    )
+
+
+@app.exception_handler(DeadlineExceeded)
+async def deadline_exceeded(request: Request, exc: DeadlineExceeded):
+    # Past the deadline before generation started (queued or retrieving);
+    # generation cut short returns its partial answer instead
+    return JSONResponse(
+        status_code=504,
+        content={"detail": str(exc), "stage": exc.stage}
+    )
+
 
 app.include_router(query_router)
 @app.on_event("startup")
 def startup():
-    # Create tables if they don't exist
-    Base.metadata.create_all(bind=engine)
+    # Create tables if they don't exist, and add columns introduced since
+    # existing ones were created
+    Base.metadata.create_all(bind=get_engine())
+    add_missing_columns(get_engine(), Document.__table__, DocumentChunk.__table__, Usage.__table__)
+    worker_pool.start()
+    usage_recorder.start()
+    logger.info("Application running")
+
+@app.on_event("shutdown")
+async def shutdown():
+    worker_pool.stop()
+    # Flush buffered usage events before exiting
+    usage_recorder.stop()
+    await dispose_async_engine()
 
 # Register API routes
 app.include_router(auth_router)
 app.include_router(upload_router)
+app.include_router(usage_router)
+app.include_router(metrics_router)
 
 @app.get("/")
-def health_check():
+async def health_check():
     return {"status": "running"}
 
-print("APplication running")
-
-import uvicorn
-
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "app.main:app",
         host="0.0.0.0",
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
 from datetime import datetime
 from app.core.database import Base
 
@@ -10,3 +10,26 @@ class Document(Base):
     owner_id = Column(Integer, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow())
     storage_path = Column(String, nullable=False)
+    content_hash = Column(String(64), index=True)
+
+
+class DocumentChunk(Base):
+    """
+    Manifest of the chunks indexed for a document: which vector record
+    holds each distinct chunk (by content hash), where it sits in the
+    document and which chunk precedes it (prev_hash; NULL for rows
+    written before it was tracked). Re-indexing diffs a new version
+    against it.
+    """
+    __tablename__ = "document_chunks"
+    __table_args__ = (
+        UniqueConstraint("document_id", "chunk_hash", name="uq_document_chunk_hash"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, nullable=False, index=True)
+    chunk_hash = Column(String(64), nullable=False)
+    record_id = Column(String(64), nullable=False)
+    chunk_index = Column(Integer, nullable=False)
+    page = Column(Integer)
+    prev_hash = Column(String(64))
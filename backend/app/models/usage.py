@@ -1,10 +1,35 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, Date, DateTime, Float, Integer, String, UniqueConstraint
+from datetime import datetime
 from app.core.database import Base
 
 class Usage(Base):
     __tablename__ = "usage"
 
     id = Column(Integer, primary_key=True)
-    user_id = Column(Integer)
+    user_id = Column(Integer, index=True)
     action = Column(String)
     tokens = Column(Integer)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    latency_ms = Column(Float, default=0.0)
+    chunks = Column(Integer, default=0)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class UsageDaily(Base):
+    """
+    Per-user, per-day, per-action totals, rolled up when usage is flushed
+    """
+    __tablename__ = "usage_daily"
+    __table_args__ = (UniqueConstraint("user_id", "day", "action"),)
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False, index=True)
+    day = Column(Date, nullable=False)
+    action = Column(String, nullable=False)
+    events = Column(Integer, default=0)
+    tokens = Column(Integer, default=0)
+    prompt_tokens = Column(Integer, default=0)
+    completion_tokens = Column(Integer, default=0)
+    latency_ms = Column(Float, default=0.0)
+    chunks = Column(Integer, default=0)
@@ -1,3 +1,7 @@
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.models.user import User
 from app.core.security import hash_password, verify_password
@@ -18,3 +22,24 @@ def authenticate(db: Session, email, password):
     if not verify_password(password, user.hashed_password):
         return None
     return user
+
+
+async def acreate_user(db: AsyncSession, email, password):
+    # bcrypt is deliberately slow; keep it off the event loop
+    hashed = await asyncio.to_thread(hash_password, password)
+    user = User(
+        email=email,
+        hashed_password=hashed
+    )
+    db.add(user)
+    await db.commit()
+    return user
+
+async def aauthenticate(db: AsyncSession, email, password):
+    result = await db.execute(select(User).where(User.email == email))
+    user = result.scalar_one_or_none()
+    if not user:
+        return None
+    if not await asyncio.to_thread(verify_password, password, user.hashed_password):
+        return None
+    return user
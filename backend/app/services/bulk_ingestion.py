@@ -0,0 +1,462 @@
+"""
+Bulk ingestion: many files (a multipart list and/or zip archives)
+ingested as one job whose documents flow through a staged pipeline
+
+    store -> extract -> chunk -> upsert
+
+Each stage runs on its own small thread pool and hands documents to the
+next one through a bounded queue, so while one document is extracted the
+previous one is chunked and an earlier one upserted. Pages are chunked
+as they are extracted; the chunk stage records the chunk manifest. The
+upsert stage coalesces the chunks of several documents into large
+flushes.
+"""
+import copy
+import os
+import queue
+import threading
+import time
+import traceback
+import zipfile
+from collections import Counter
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.metrics import DOCUMENT_CHUNKS, DOCUMENT_PAGES, STAGE_SECONDS, timed
+from app.models.document import Document
+from app.services.cache import invalidate_namespace
+from app.services.chunking import chunk_pages
+from app.services.ingestion import (
+    UploadTooLarge,
+    dedupe_chunks,
+    discard_document,
+    metered_pages,
+    register_job_kind,
+    spool_upload
+)
+from app.services.job_queue import INGESTION_STAGES, get_job_queue, new_job
+from app.services.manifest import add_chunks
+from app.services.vector_store import upsert_texts
+from app.utils.file_loader import iter_pdf_pages, upload_file_from_path
+
+FINISHED = ("succeeded", "failed", "duplicate", "rejected")
+SAVE_INTERVAL = 0.5  # seconds between job record writes
+IDLE_FLUSH = 0.25  # upsert what is pending when no chunks arrive for this long
+
+_DONE = object()
+
+
+def new_file_entry(filename: str, spool_path=None, content_hash=None, status="queued", error=None) -> dict:
+    return {
+        "filename": filename,
+        "spool_path": spool_path,
+        "content_hash": content_hash,
+        "status": status,
+        "stage": None,
+        "document_id": None,
+        "storage_path": None,
+        "num_chunks": None,
+        "error": error,
+    }
+
+
+def expand_zip(path: str) -> list[dict]:
+    """
+    Spools every PDF inside a zip archive and returns their file entries.
+    Members are streamed out one block at a time, so one larger than
+    max_upload_bytes is rejected (UploadTooLarge) without being unpacked
+    in full. Once bulk_max_expanded_bytes have been unpacked, the
+    remaining members are rejected, so a zip bomb can't fill the disk.
+    """
+    entries = []
+    left = settings.bulk_max_expanded_bytes
+
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            name = os.path.basename(info.filename)
+            if (
+                info.is_dir()
+                or not name.lower().endswith(".pdf")
+                or name.startswith("._")
+                or info.filename.startswith("__MACOSX/")
+            ):
+                continue
+
+            expanded = f"Archive expands past {settings.bulk_max_expanded_bytes} bytes"
+            if left <= 0:
+                entries.append(new_file_entry(name, status="rejected", error=expanded))
+                continue
+
+            limit = min(settings.max_upload_bytes, left)
+            try:
+                with archive.open(info) as member:
+                    spool_path, content_hash = spool_upload(member, name, limit=limit)
+                left -= os.path.getsize(spool_path)
+                entries.append(new_file_entry(name, spool_path, content_hash))
+            except UploadTooLarge as e:
+                left -= limit
+                error = expanded if limit < settings.max_upload_bytes else str(e)
+                entries.append(new_file_entry(name, status="rejected", error=error))
+            except Exception as e:
+                # Too large, corrupt or encrypted member: reject it alone
+                entries.append(new_file_entry(name, status="rejected", error=str(e)))
+
+    return entries
+
+
+def mark_duplicates(entries: list[dict], existing: dict[str, int]):
+    """
+    Marks entries whose content is already indexed (`existing` maps
+    content_hash -> document_id) or appears earlier in the batch, and
+    drops their spool files
+    """
+    first = {}
+
+    for entry in entries:
+        if entry["status"] != "queued":
+            continue
+
+        content_hash = entry["content_hash"]
+        if content_hash in existing:
+            entry.update(status="duplicate", document_id=existing[content_hash])
+        elif content_hash in first:
+            entry.update(status="duplicate", error=f"Same content as {first[content_hash]}")
+        else:
+            first[content_hash] = entry["filename"]
+            continue
+
+        os.remove(entry["spool_path"])
+        entry["spool_path"] = None
+
+
+def enqueue_bulk_ingestion(owner_id: int, name: str, entries: list[dict]) -> dict:
+    """
+    Records a bulk job for spooled file entries and returns it
+    """
+    job = new_job(
+        owner_id=owner_id,
+        filename=name,
+        spool_path=None,
+        kind="bulk",
+        files=entries
+    )
+    get_job_queue().create_job(job)
+    return job
+
+
+class BulkPipeline:
+    """
+    Runs the files of one bulk job through the stage pipeline. Per-file
+    status lives in the job's `files` entries; the job's `stages` report
+    the share of files that got through each stage.
+    """
+
+    def __init__(self, job: dict):
+        self.job_id = job["id"]
+        self.owner_id = job["owner_id"]
+        self.namespace = f"user_{self.owner_id}"
+        self.files = copy.deepcopy(job["files"])
+        self._lock = threading.Lock()
+        self._saved_at = 0.0
+        self._passed = Counter()  # files through each stage
+        self._failed_at = Counter()  # files failed in each stage
+        self._total = 0
+
+    # ---------- bookkeeping ----------
+
+    def _update(self, i: int, **fields):
+        with self._lock:
+            self.files[i].update(fields)
+        self._save()
+
+    def _save(self, force: bool = False):
+        # The whole file list is rewritten each time, so writes are
+        # throttled; the final state is always saved (force)
+        with self._lock:
+            now = time.monotonic()
+            if not force and now - self._saved_at < SAVE_INTERVAL:
+                return
+            self._saved_at = now
+
+            stages = {}
+            failed = 0
+            for name in INGESTION_STAGES:
+                # A file that failed earlier never gets through later stages
+                failed += self._failed_at[name]
+                done = self._passed[name] + failed
+                progress = round(done / self._total, 3) if self._total else 1.0
+                stages[name] = {
+                    "status": "done" if progress >= 1.0 else "running",
+                    "progress": progress,
+                }
+            get_job_queue().update_job(
+                self.job_id,
+                files=copy.deepcopy(self.files),
+                stages=stages
+            )
+
+    def _is_failed(self, i: int) -> bool:
+        with self._lock:
+            return self.files[i]["status"] == "failed"
+
+    def _fail(self, i: int, stage: str, error: Exception):
+        with self._lock:
+            entry = self.files[i]
+            if entry["status"] == "failed":
+                return
+            entry.update(status="failed", stage=stage, error=str(error))
+            self._failed_at[stage] += 1
+            document_id, storage_path = entry["document_id"], entry["storage_path"]
+
+        traceback.print_exc()
+        if document_id is not None:
+            discard_document(document_id, self.namespace, storage_path)
+            invalidate_namespace(self.namespace)
+        self._update(i, document_id=None, storage_path=None)
+
+    def _finish(self, i: int, num_chunks: int):
+        with self._lock:
+            entry = self.files[i]
+            document_id, content_hash = entry["document_id"], entry["content_hash"]
+
+        db = SessionLocal()
+        try:
+            db.query(Document).filter(Document.id == document_id).update(
+                {"content_hash": content_hash}
+            )
+            db.commit()
+        finally:
+            db.close()
+
+        DOCUMENT_CHUNKS.observe(num_chunks)
+        invalidate_namespace(self.namespace)
+        with self._lock:
+            self._passed["upsert"] += 1
+        self._update(i, status="succeeded", stage=None, num_chunks=num_chunks)
+
+    # ---------- stages ----------
+
+    def _store(self, i: int, _):
+        entry = self.files[i]
+        self._update(i, status="running", stage="store")
+        storage_path = upload_file_from_path(entry["spool_path"], entry["filename"])
+        self._update(i, storage_path=storage_path)
+
+        db = SessionLocal()
+        try:
+            doc = Document(
+                filename=entry["filename"],
+                owner_id=self.owner_id,
+                storage_path=storage_path
+            )
+            db.add(doc)
+            db.commit()
+            self._update(i, document_id=doc.id)
+        finally:
+            db.close()
+
+    def _extract(self, i: int, _) -> list[dict]:
+        # Pages go straight into the chunker as they are extracted, so a
+        # document's pages are never all held at once, only its chunks
+        # (which the upsert stage buffers anyway)
+        self._update(i, stage="extract")
+        meter = {"extract_s": 0.0, "pages": 0}
+        pages = metered_pages(iter_pdf_pages(self.files[i]["spool_path"]), meter)
+        chunks = list(dedupe_chunks(chunk_pages(pages, doc_type="general", purpose="qa")))
+        DOCUMENT_PAGES.observe(meter["pages"])
+        return chunks
+
+    def _chunk(self, i: int, chunks: list[dict]) -> tuple:
+        self._update(i, stage="chunk")
+        entry = self.files[i]
+
+        # Manifest first, so a failed upsert can be discarded by id
+        ids = add_chunks(entry["document_id"], chunks)
+        metadatas = [
+            {
+                "document_id": entry["document_id"],
+                "chunk_index": c["chunk_index"],
+                "chunk_hash": c["chunk_hash"],
+                "prev_chunk": c["prev_hash"],
+                "filename": entry["filename"],
+                "page": c["page"],
+            }
+            for c in chunks
+        ]
+        return [c["text"] for c in chunks], metadatas, ids
+
+    def _stage(self, name: str, fn, inbox: queue.Queue, outbox: queue.Queue, workers: int) -> list[threading.Thread]:
+        """
+        Starts `workers` threads applying fn(i, payload) to the documents
+        arriving in `inbox` and passing results on to `outbox`; the last
+        one to finish passes the end-of-stream marker on
+        """
+        remaining = [workers]
+
+        def work():
+            while True:
+                item = inbox.get()
+                if item is _DONE:
+                    inbox.put(_DONE)  # for sibling workers
+                    break
+
+                i, payload = item
+                if self._is_failed(i):
+                    continue
+                try:
+                    with timed(STAGE_SECONDS, pipeline="bulk", stage=name):
+                        result = fn(i, payload)
+                except Exception as e:
+                    self._fail(i, name, e)
+                    continue
+
+                with self._lock:
+                    self._passed[name] += 1
+                outbox.put((i, result))
+
+            with self._lock:
+                remaining[0] -= 1
+                last = remaining[0] == 0
+            if last:
+                outbox.put(_DONE)
+
+        threads = [
+            threading.Thread(target=work, name=f"bulk-{name}-{k}", daemon=True)
+            for k in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _coalesce_upserts(self, inbox: queue.Queue):
+        """
+        Upsert stage: buffers chunks from several documents and upserts
+        them in flushes of about bulk_upsert_chunks, or whatever is
+        pending once the upstream stages go quiet. A document succeeds
+        when the flush holding its last chunk does.
+        """
+        pending = []  # (file index, text, metadata, record id)
+        remaining = {}  # file index -> chunks not yet upserted
+
+        def upsert(batch):
+            upsert_texts(
+                texts=[p[1] for p in batch],
+                metadatas=[p[2] for p in batch],
+                namespace=self.namespace,
+                ids=[p[3] for p in batch]
+            )
+
+        def flush():
+            batch = [p for p in pending if not self._is_failed(p[0])]
+            pending.clear()
+            if not batch:
+                return
+
+            counts = Counter(p[0] for p in batch)
+            try:
+                with timed(STAGE_SECONDS, pipeline="bulk", stage="upsert"):
+                    upsert(batch)
+            except Exception:
+                # Still failing after upsert's own retries: retry document
+                # by document so one bad document doesn't fail the others
+                for i in counts:
+                    try:
+                        upsert([p for p in batch if p[0] == i])
+                    except Exception as e:
+                        self._fail(i, "upsert", e)
+
+            for i, count in counts.items():
+                remaining[i] -= count
+                if remaining[i] == 0:
+                    finish(i)
+
+        def finish(i):
+            if self._is_failed(i):
+                return
+            try:
+                self._finish(i, self.files[i]["num_chunks"])
+            except Exception as e:
+                self._fail(i, "upsert", e)
+
+        while True:
+            try:
+                item = inbox.get(timeout=IDLE_FLUSH if pending else None)
+            except queue.Empty:
+                flush()
+                continue
+            if item is _DONE:
+                break
+
+            i, (texts, metadatas, ids) = item
+            self._update(i, stage="upsert", num_chunks=len(texts))
+            if not texts:
+                finish(i)
+                continue
+
+            remaining[i] = len(texts)
+            pending.extend(zip([i] * len(texts), texts, metadatas, ids))
+            if len(pending) >= settings.bulk_upsert_chunks:
+                flush()
+
+        flush()
+
+    # ---------- run ----------
+
+    def _resume(self, i: int) -> bool:
+        """
+        Prepares a file for (re)processing; files left half-done by an
+        interrupted run start over
+        """
+        entry = self.files[i]
+        if entry["document_id"] is not None:
+            discard_document(entry["document_id"], self.namespace, entry["storage_path"])
+            entry.update(document_id=None, storage_path=None)
+        if not entry["spool_path"] or not os.path.exists(entry["spool_path"]):
+            entry.update(status="failed", error="Spooled file is gone (interrupted before a restart)")
+            return False
+        entry.update(status="queued", stage=None, error=None)
+        return True
+
+    def run(self) -> dict:
+        todo = [i for i, entry in enumerate(self.files) if entry["status"] not in FINISHED]
+        todo = [i for i in todo if self._resume(i)]
+        self._total = len(todo)
+        self._save(force=True)
+
+        depth = settings.bulk_stage_queue_depth
+        to_store = queue.Queue()
+        to_extract = queue.Queue(maxsize=depth)
+        to_chunk = queue.Queue(maxsize=depth)
+        to_upsert = queue.Queue(maxsize=depth)
+
+        for i in todo:
+            to_store.put((i, None))
+        to_store.put(_DONE)
+
+        threads = (
+            self._stage("store", self._store, to_store, to_extract, settings.bulk_store_workers)
+            + self._stage("extract", self._extract, to_extract, to_chunk, settings.bulk_extract_workers)
+            + self._stage("chunk", self._chunk, to_chunk, to_upsert, settings.bulk_chunk_workers)
+        )
+        self._coalesce_upserts(to_upsert)
+        for thread in threads:
+            thread.join()
+
+        self._save(force=True)
+
+        statuses = Counter(entry["status"] for entry in self.files)
+        return {
+            "files": len(self.files),
+            "succeeded": statuses["succeeded"],
+            "failed": statuses["failed"],
+            "duplicate": statuses["duplicate"],
+            "rejected": statuses["rejected"],
+            "num_chunks": sum(entry["num_chunks"] or 0 for entry in self.files if entry["status"] == "succeeded"),
+        }
+
+
+def run_bulk_job(job: dict) -> dict:
+    return BulkPipeline(job).run()
+
+
+register_job_kind("bulk", run_bulk_job, "bulk_upload")
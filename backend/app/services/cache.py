@@ -0,0 +1,205 @@
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from app.core.config import settings
+from app.core.metrics import CACHE_LOOKUPS, STAGE_SECONDS, timed
+
+
+class CacheBackend:
+    """
+    Minimal key/value interface used by the RAG cache.
+
+    `incr` must be atomic and its counters must not be evicted, since they
+    hold per-namespace generations used for invalidation.
+    """
+
+    def get(self, key: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: dict, ttl: int) -> None:
+        raise NotImplementedError
+
+    def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    def incr(self, key: str) -> int:
+        raise NotImplementedError
+
+    def get_counter(self, key: str) -> int:
+        raise NotImplementedError
+
+
+class InMemoryCache(CacheBackend):
+    """
+    Process-local LRU cache with per-entry TTL
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: dict, ttl: int) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + 1
+            return self._counters[key]
+
+    def get_counter(self, key: str) -> int:
+        with self._lock:
+            return self._counters.get(key, 0)
+
+
+class RedisCache(CacheBackend):
+    """
+    Shared cache on any Redis-compatible client (get / set(ex=) / incr).
+    Eviction is left to the server's TTL and maxmemory policy.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key: str) -> Optional[dict]:
+        raw = self.client.get(key)
+        return json.loads(raw) if raw else None
+
+    def set(self, key: str, value: dict, ttl: int) -> None:
+        self.client.set(key, json.dumps(value), ex=ttl)
+
+    def delete(self, key: str) -> None:
+        self.client.delete(key)
+
+    def incr(self, key: str) -> int:
+        return int(self.client.incr(key))
+
+    def get_counter(self, key: str) -> int:
+        raw = self.client.get(key)
+        return int(raw) if raw else 0
+
+
+_cache: Optional[CacheBackend] = None
+_cache_lock = threading.Lock()
+
+
+def _build_cache() -> Optional[CacheBackend]:
+    backend = settings.cache_backend
+
+    if backend == "none":
+        return None
+    if backend == "memory":
+        return InMemoryCache(max_entries=settings.cache_max_entries)
+    if backend == "redis":
+        try:
+            import redis
+        except ImportError as exc:
+            raise ImportError(
+                "redis is required for cache_backend=redis. Install it: `pip install redis`"
+            ) from exc
+        return RedisCache(redis.Redis.from_url(settings.redis_url))
+
+    raise ValueError(f"Unknown cache backend: {backend}")
+
+
+def get_cache() -> Optional[CacheBackend]:
+    """
+    Returns the process-wide cache backend, or None when caching is off
+    """
+    global _cache
+
+    with _cache_lock:
+        if _cache is None and settings.cache_backend != "none":
+            _cache = _build_cache()
+    return _cache
+
+
+def set_cache(cache: Optional[CacheBackend]) -> None:
+    """
+    Replaces the cache backend (e.g. with a local stand-in)
+    """
+    global _cache
+
+    with _cache_lock:
+        _cache = cache
+
+
+def normalize_question(question: str) -> str:
+    question = re.sub(r"\s+", " ", question.strip().lower())
+    return question.rstrip("?!. ")
+
+
+def _generation_key(namespace: str) -> str:
+    return f"rag:gen:{namespace}"
+
+
+def answer_cache_key(namespace: str, question: str, top_k: int, model: str) -> Optional[str]:
+    """
+    Builds the cache key for a query, or None when caching is off.
+
+    The key embeds the namespace's current generation, so compute it once
+    before retrieval and reuse it when storing the answer: an invalidation
+    that lands in between then makes the stored entry unreachable.
+    """
+    cache = get_cache()
+    if cache is None:
+        return None
+
+    generation = cache.get_counter(_generation_key(namespace))
+    digest = hashlib.sha256(
+        f"{normalize_question(question)}|{top_k}|{model}".encode("utf-8")
+    ).hexdigest()
+    return f"rag:{namespace}:{generation}:{digest}"
+
+
+def get_cached_answer(key: Optional[str]) -> Optional[dict]:
+    cache = get_cache()
+    if cache is None or key is None:
+        return None
+    with timed(STAGE_SECONDS, pipeline="query", stage="cache_lookup"):
+        value = cache.get(key)
+    CACHE_LOOKUPS.inc(cache="answer", result="miss" if value is None else "hit")
+    return value
+
+
+def set_cached_answer(key: Optional[str], value: dict) -> None:
+    cache = get_cache()
+    if cache is None or key is None:
+        return
+    cache.set(key, value, ttl=settings.cache_ttl_seconds)
+
+
+def invalidate_namespace(namespace: str) -> None:
+    """
+    Drops every cached entry for a namespace by bumping its generation;
+    stale entries are never read again and age out via LRU/TTL.
+    """
+    cache = get_cache()
+    if cache is not None:
+        cache.incr(_generation_key(namespace))
@@ -1,9 +1,161 @@
-try:
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-except ImportError as exc:
-    raise ImportError(
-        "langchain_text_splitters is required. Install it: `pip install -U langchain-text-splitters`"
-    ) from exc
+import bisect
+import hashlib
+from functools import lru_cache
+from itertools import accumulate
+from typing import Iterable, Iterator, Optional
+
+SEPARATORS = ("\n\n", "\n", ".", " ", "")
+
+
+class TextSplitter:
+    """
+    Recursive character splitter producing the same chunks as LangChain's
+    RecursiveCharacterTextSplitter (keep_separator=True, whitespace
+    stripped), but working on character offsets into the source text:
+    splits are cut positions computed with str.split, chunks are grown
+    and overlapped by bisecting those positions, and only the final
+    chunks are sliced out. Every chunk comes with its start offset.
+    """
+
+    def __init__(self, chunk_size: int, overlap: int, separators: tuple = SEPARATORS):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.separators = separators
+
+    def split_text(self, text: str) -> list[str]:
+        return [chunk for _, chunk in self.split_with_offsets(text)]
+
+    def split_with_offsets(self, text: str, level: Optional[int] = None) -> list[tuple[int, str]]:
+        """
+        Returns [(start offset, chunk text)] in document order. `level`
+        forces the top-level separator (an index into `separators`)
+        instead of picking the coarsest one present in the text.
+        """
+        out = []
+        if level is None:
+            self._split(text, 0, len(text), 0, out)
+        else:
+            self._split_cuts(text, _cut_positions(text, 0, len(text), self.separators[level]), self._finer(level), out)
+        return out
+
+    def split_partial(self, text: str, level: int) -> tuple[list[tuple[int, str]], int]:
+        """
+        Splits the head of a text that continues past its end, with the
+        top-level separator forced to `level`: returns the chunks that more
+        text can no longer change, and the offset to resume from once more
+        text is appended (the start of the chunk still being grown, or of
+        the last, possibly truncated, split)
+        """
+        out = []
+        cuts = _cut_positions(text, 0, len(text), self.separators[level])
+        head = self._split_cuts(text, cuts[:-1], self._finer(level), out, final=False)
+        return out, cuts[head]
+
+    def top_level(self, text: str, start: int = 0, end: Optional[int] = None, level: int = 0) -> Optional[int]:
+        """
+        Index of the coarsest separator (from `level` on) present in the
+        span; None when none is (and the last separator is not "")
+        """
+        end = len(text) if end is None else end
+        for i in range(level, len(self.separators)):
+            separator = self.separators[i]
+            if separator == "" or text.find(separator, start, end) != -1:
+                return i
+        return None
+
+    def _finer(self, level: int) -> Optional[int]:
+        if self.separators[level] and level + 1 < len(self.separators):
+            return level + 1
+        return None
+
+    def _split(self, text: str, start: int, end: int, level: int, out: list):
+        # The coarsest separator present in the span decides the splits;
+        # splits that are still too long recurse with the finer ones
+        found = self.top_level(text, start, end, level)
+        if found is None:
+            cuts, finer = [start, end], None
+        else:
+            cuts, finer = _cut_positions(text, start, end, self.separators[found]), self._finer(found)
+        self._split_cuts(text, cuts, finer, out)
+
+    def _split_cuts(self, text: str, cuts: list[int], finer: Optional[int], out: list, final: bool = True) -> int:
+        """
+        Chunks the splits between consecutive cuts: runs of short splits
+        are merged, long ones recurse with the finer separators. With
+        final=False the chunk being grown at the end is not emitted and
+        the index of its first split is returned.
+        """
+        size = self.chunk_size
+        run = 0  # first split of the current run of short splits
+
+        for j in range(len(cuts) - 1):
+            if cuts[j + 1] - cuts[j] < size:
+                continue
+            if run < j:
+                self._merge(text, cuts, run, j, out)
+            if finer is None:
+                out.append((cuts[j], text[cuts[j]:cuts[j + 1]]))
+            else:
+                self._split(text, cuts[j], cuts[j + 1], finer, out)
+            run = j + 1
+
+        if run < len(cuts) - 1:
+            return self._merge(text, cuts, run, len(cuts) - 1, out, final)
+        return run
+
+    def _merge(self, text: str, cuts: list[int], lo: int, hi: int, out: list, final: bool = True) -> int:
+        """
+        Greedily packs splits lo..hi-1 (each shorter than chunk_size) into
+        chunks, starting each chunk with the tail of the previous one that
+        fits in `overlap`. Returns the first split of the last chunk.
+        """
+        size = self.chunk_size
+        head = lo
+
+        while True:
+            # Splits head..last-1 fit in one chunk, split `last` does not
+            last = bisect.bisect_right(cuts, cuts[head] + size, head + 1, hi + 1) - 1
+            if last >= hi:
+                break
+            _emit(text, cuts[head], cuts[last], out)
+            # Drop leading splits until what is left is within the overlap
+            # and leaves room for split `last`
+            floor = max(cuts[last] - self.overlap, cuts[last + 1] - size)
+            head = bisect.bisect_left(cuts, floor, head, last)
+
+        if final:
+            _emit(text, cuts[head], cuts[hi], out)
+        return head
+
+
+def _cut_positions(text: str, start: int, end: int, separator: str) -> list[int]:
+    """
+    Boundaries of the splits of text[start:end]; the separator is kept at
+    the start of the split that follows it
+    """
+    if not separator:
+        return list(range(start, end + 1))
+
+    step = len(separator)
+    lengths = list(map(step.__add__, map(len, text[start:end].split(separator))))
+    lengths[0] -= step
+    cuts = list(accumulate(lengths, initial=start))
+    if cuts[1] == start:
+        # Text starts with the separator: no empty leading split
+        del cuts[0]
+    return cuts
+
+
+def _emit(text: str, start: int, end: int, out: list):
+    chunk = text[start:end]
+    body = chunk.lstrip()
+    if body:
+        out.append((start + len(chunk) - len(body), body.rstrip()))
+
+
+@lru_cache(maxsize=16)
+def _get_splitter(chunk_size: int, overlap: int) -> TextSplitter:
+    return TextSplitter(chunk_size, overlap)
 
 
 def get_chunking_config(doc_type: str, purpose: str):
@@ -38,13 +190,87 @@ def get_chunking_config(doc_type: str, purpose: str):
     return chunk_size, overlap
 
 
+def get_splitter(doc_type: str, purpose: str) -> TextSplitter:
+    return _get_splitter(*get_chunking_config(doc_type, purpose))
+
+
 def chunk_text(text: str, doc_type: str, purpose: str):
-    chunk_size, overlap = get_chunking_config(doc_type, purpose)
+    return get_splitter(doc_type, purpose).split_text(text)
+
+
+def chunk_pages(
+    pages: Iterable[dict],
+    doc_type: str,
+    purpose: str,
+    splitter: Optional[TextSplitter] = None
+) -> Iterator[dict]:
+    """
+    Chunks a document given as a stream of pages ({page_number, text})
+    without holding its whole text. Pages are appended to a window; once
+    it reaches a few chunk lengths, the chunks that more text cannot
+    change are emitted and the window restarts at the chunk still being
+    grown. The top-level separator is fixed by the first window, so the
+    chunks are the ones chunk_text would return for the concatenated
+    pages unless a coarser separator only shows up after that window.
+
+    Yields {"text", "start", "end", "page", "page_end", "chunk_hash"}:
+    start/end are offsets in the concatenated document text, page and
+    page_end the pages the chunk starts and ends on, chunk_hash the
+    sha256 of the text.
+    """
+    splitter = splitter or get_splitter(doc_type, purpose)
+    window = splitter.chunk_size * 8
+
+    buffer = ""
+    base = 0  # document offset of buffer[0]
+    level = None  # top-level separator, fixed by the first window
+    page_starts = []
+    page_numbers = []
+
+    def records(chunks):
+        for offset, chunk in chunks:
+            start = base + offset
+            end = start + len(chunk)
+            first = max(0, bisect.bisect_right(page_starts, start) - 1)
+            last = max(first, bisect.bisect_right(page_starts, end - 1) - 1)
+            yield {
+                "text": chunk,
+                "start": start,
+                "end": end,
+                "page": page_numbers[first],
+                "page_end": page_numbers[last],
+                "chunk_hash": hashlib.sha256(chunk.encode("utf-8")).hexdigest(),
+            }
+
+    for page in pages:
+        page_starts.append(base + len(buffer))
+        page_numbers.append(page["page_number"])
+        buffer += page["text"]
+
+        if len(buffer) < window:
+            continue
+        if level is None:
+            level = splitter.top_level(buffer)
+            if level is None:
+                continue
+
+        chunks, resume = splitter.split_partial(buffer, level)
+        if resume == 0 and len(buffer) >= window * 8:
+            # No top-level separator for a long stretch: give up exactness
+            # and cut before the last chunks to keep the window bounded
+            chunks = splitter.split_with_offsets(buffer, level)
+            resume = chunks[-2][0] if len(chunks) > 2 else 0
+            chunks = chunks[:-2]
+        if resume == 0:
+            continue
+
+        yield from records(chunks)
+        buffer = buffer[resume:]
+        base += resume
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        separators=["\n\n", "\n", ".", " ", ""]
-    )
+        # Pages that ended before the window are no longer needed
+        first = max(0, bisect.bisect_right(page_starts, base) - 1)
+        del page_starts[:first]
+        del page_numbers[:first]
 
-    return splitter.split_text(text)
+    yield from records(splitter.split_with_offsets(buffer, level))
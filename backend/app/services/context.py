@@ -0,0 +1,158 @@
+from functools import lru_cache
+
+from app.core.config import settings
+from app.services.chunking import get_chunking_config
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    # Loaded on first use: tiktoken reads (and may download) its BPE ranks
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # optional dependency
+        return None
+
+# Shorter suffix/prefix matches are as likely to be chance as overlap
+_MIN_OVERLAP = 10
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts prompt tokens with tiktoken when installed, otherwise uses the
+    usual ~4 characters per token estimate
+    """
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return -(-len(text) // 4)
+
+
+def _is_boundary(text: str, pos: int) -> bool:
+    # Whether a word starts or ends at text[pos]: the edge of the text or
+    # next to whitespace or a full stop (chunks split on those)
+    return pos <= 0 or pos >= len(text) or text[pos - 1] in " \n." or text[pos] in " \n."
+
+
+def _overlap(left: str, right: str) -> int:
+    """
+    Length of the longest suffix of `left` that is a prefix of `right`
+    and could be the overlap the chunker gave them: at most the ingestion
+    profile's overlap, at least _MIN_OVERLAP characters, and starting and
+    ending on word boundaries. Anything else is kept, since repeating a
+    few characters costs less than cutting real text.
+    """
+    limit = min(get_chunking_config("general", "qa")[1], len(left), len(right))
+    for size in range(limit, _MIN_OVERLAP - 1, -1):
+        if (
+            left.endswith(right[:size])
+            and _is_boundary(left, len(left) - size)
+            and _is_boundary(right, size)
+        ):
+            return size
+    return 0
+
+
+# Source fields only used to find adjacent chunks
+LINK_FIELDS = ("chunk_hash", "prev_chunk")
+
+
+def _follows(before: dict, after: dict) -> bool:
+    """
+    Whether chunk `after` directly follows chunk `before` in the document:
+    by its prev_chunk link, or for records indexed without links, by
+    consecutive chunk_index. Links stay right when a re-index shifts the
+    chunk_index of unchanged chunks without rewriting their records.
+    """
+    if after.get("prev_chunk") is not None and before.get("chunk_hash"):
+        return after["prev_chunk"] == before["chunk_hash"]
+    index = before.get("chunk_index", -1)
+    return index >= 0 and after.get("chunk_index", -1) == index + 1
+
+
+def merge_adjacent(contexts: list[str], sources: list[dict]) -> list[dict]:
+    """
+    Groups retrieved chunks into passages: runs of adjacent chunks (see
+    _follows) from the same document are joined into one text with the
+    overlapping characters removed. Each passage keeps the best score of
+    its chunks and the positions (into contexts/sources) it was built from.
+    """
+    by_doc = {}
+    for pos, source in enumerate(sources):
+        key = source.get("document_id") or source.get("filename")
+        by_doc.setdefault(key, []).append(pos)
+
+    passages = []
+    for positions in by_doc.values():
+        positions.sort(key=lambda p: sources[p].get("chunk_index", -1))
+
+        # Link each chunk to the retrieved chunk right after it, if any
+        following = {}
+        linked = set()
+        for pos in positions:
+            for other in positions:
+                if other != pos and other not in linked and _follows(sources[pos], sources[other]):
+                    following[pos] = other
+                    linked.add(other)
+                    break
+
+        for start in positions:
+            if start in linked:
+                continue
+            passage = {
+                "text": contexts[start],
+                "score": sources[start]["score"],
+                "positions": [start],
+            }
+            pos = start
+            while pos in following:
+                pos = following[pos]
+                text = contexts[pos]
+                passage["text"] += text[_overlap(passage["text"], text):]
+                passage["score"] = max(passage["score"], sources[pos]["score"])
+                passage["positions"].append(pos)
+            passages.append(passage)
+
+    return passages
+
+
+def pack_context(
+    contexts: list[str],
+    sources: list[dict],
+    budget: int = None
+) -> tuple[str, list[int]]:
+    """
+    Builds the context block within a token budget.
+
+    Adjacent chunks are merged first, then passages are added in relevance
+    order while they fit; a passage that would overflow is skipped in
+    favour of smaller, less relevant ones. If not even the best passage
+    fits, it is truncated to the budget. Returns the context block and the
+    positions of the chunks it contains.
+    """
+    budget = budget or settings.context_token_budget
+    passages = sorted(
+        merge_adjacent(contexts, sources),
+        key=lambda p: p["score"],
+        reverse=True
+    )
+
+    separator_tokens = count_tokens("\n\n")
+    selected = []
+    used = 0
+
+    for passage in passages:
+        cost = count_tokens(passage["text"]) + (separator_tokens if selected else 0)
+        if used + cost <= budget:
+            selected.append(passage)
+            used += cost
+
+    if not selected and passages:
+        best = dict(passages[0])
+        # Characters-per-token of this passage, to cut close to the budget
+        ratio = len(best["text"]) / max(count_tokens(best["text"]), 1)
+        best["text"] = best["text"][:int(budget * ratio)]
+        selected.append(best)
+
+    positions = sorted(pos for p in selected for pos in p["positions"])
+    return "\n\n".join(p["text"] for p in selected), positions
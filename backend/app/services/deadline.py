@@ -0,0 +1,88 @@
+"""
+Per-request deadlines. run_rag sets one for the whole pipeline, and the
+calls below it (scheduler queues, vector searches, the LLM) bound their
+own waits by the time left instead of only by their fixed timeouts.
+
+The deadline lives in a context variable, so it follows the request into
+tasks and (through contextvars.copy_context) into pool threads.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from app.core.metrics import DEADLINE_EXCEEDED
+
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    The request deadline passed during `stage`; `partial` holds whatever
+    the stage produced before it was cut short (e.g. answer tokens)
+    """
+
+    def __init__(self, stage: str, partial: str = ""):
+        super().__init__(f"Request deadline exceeded during {stage}")
+        self.stage = stage
+        self.partial = partial
+
+
+def exceeded(stage: str, partial: str = "") -> DeadlineExceeded:
+    DEADLINE_EXCEEDED.inc(stage=stage)
+    return DeadlineExceeded(stage, partial)
+
+
+@contextmanager
+def deadline_scope(seconds: Optional[float]):
+    """
+    Sets a deadline `seconds` from now for the block. An earlier
+    enclosing deadline still applies; None or 0 adds none.
+    """
+    if not seconds or seconds <= 0:
+        yield
+        return
+
+    at = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        at = min(at, current)
+
+    token = _deadline.set(at)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def deadline_at() -> Optional[float]:
+    """
+    The deadline as a time.monotonic() value, None without one
+    """
+    return _deadline.get()
+
+
+def remaining() -> Optional[float]:
+    """
+    Seconds left before the deadline (0 once passed), None without one
+    """
+    at = _deadline.get()
+    if at is None:
+        return None
+    return max(0.0, at - time.monotonic())
+
+
+def bound(timeout: Optional[float]) -> Optional[float]:
+    """
+    The smaller of `timeout` and the time left (None = unbounded)
+    """
+    left = remaining()
+    if left is None:
+        return timeout
+    if timeout is None:
+        return left
+    return min(timeout, left)
+
+
+def expired() -> bool:
+    return remaining() == 0.0
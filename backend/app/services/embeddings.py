@@ -0,0 +1,36 @@
+import math
+import re
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from app.core.config import settings
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def _features(text: str) -> Counter:
+    tokens = _TOKEN_RE.findall(text.lower())
+    bigrams = [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    return Counter(tokens + bigrams)
+
+
+def embed_texts(texts: list[str], dim: int = None) -> np.ndarray:
+    """
+    Local, network-free embedding: signed feature hashing of word unigrams
+    and bigrams with sublinear term frequency, L2-normalised so a dot
+    product is cosine similarity. Returns a float32 (len(texts), dim) array.
+    """
+    dim = dim or settings.local_embedding_dim
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+
+    for row, text in enumerate(texts):
+        for feature, count in _features(text).items():
+            h = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if h & 0x80000000 else -1.0
+            out[row, h % dim] += sign * (1.0 + math.log(count))
+
+    norms = np.linalg.norm(out, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return out / norms
@@ -0,0 +1,208 @@
+"""
+Hedged requests for idempotent calls such as vector searches.
+
+Each call starts one attempt. If it has not answered once the backend's
+recent p95 latency (`search_hedge_quantile`) has passed, a duplicate is
+sent and whichever answers first wins. About one call in twenty is
+duplicated; in exchange a single slow replica or connection no longer
+sets the tail latency.
+
+Hedge delays come from a window of each backend's recent attempt
+latencies. Until `search_hedge_min_samples` are known nothing is hedged.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Executor, wait
+from typing import Awaitable, Callable, Optional
+
+from app.core.config import settings
+from app.core.metrics import HEDGED_REQUESTS
+
+
+class LatencyTracker:
+    """
+    Recent latencies of one backend and their quantile
+    """
+
+    def __init__(self, window: int = 256, refresh: int = 16):
+        self._samples = deque(maxlen=window)
+        self._refresh = refresh
+        self._fresh = 0  # samples since the quantile was computed
+        self._quantile = None
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self._fresh += 1
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            if self._quantile is None or self._fresh >= self._refresh:
+                ordered = sorted(self._samples)
+                self._quantile = ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+                self._fresh = 0
+            return self._quantile
+
+
+_trackers: dict[str, LatencyTracker] = {}
+_trackers_lock = threading.Lock()
+
+
+def get_tracker(name: str) -> LatencyTracker:
+    tracker = _trackers.get(name)
+    if tracker is None:
+        with _trackers_lock:
+            tracker = _trackers.setdefault(name, LatencyTracker())
+    return tracker
+
+
+def reset_trackers():
+    """
+    Forgets every backend's latencies, e.g. after swapping the stores
+    """
+    with _trackers_lock:
+        _trackers.clear()
+
+
+def hedge_delay(name: str) -> Optional[float]:
+    """
+    Seconds to wait before hedging a call to `name`; None = don't hedge
+    """
+    if not settings.search_hedging_enabled:
+        return None
+    delay = get_tracker(name).quantile(settings.search_hedge_quantile, settings.search_hedge_min_samples)
+    if delay is None:
+        return None
+    return max(delay, settings.search_hedge_min_delay)
+
+
+class _Hedged:
+    """
+    The attempts of one hedged call. `launch` starts an attempt and
+    returns its future (concurrent or asyncio).
+    """
+
+    def __init__(self, name: str, launch: Callable, timeout: float):
+        now = time.monotonic()
+        self.name = name
+        self.launch = launch
+        self.expires = now + timeout
+        delay = hedge_delay(name)
+        self.hedge_at = None if delay is None else now + delay
+        self.attempts = [launch()]
+
+    def poll(self, now: float) -> Optional[tuple]:
+        """
+        Returns (status, result or exception) once settled, status being
+        ok, error or timeout; sends the hedge when it is due
+        """
+        for i, attempt in enumerate(self.attempts):
+            if attempt.done() and not attempt.cancelled() and attempt.exception() is None:
+                if i:
+                    HEDGED_REQUESTS.inc(backend=self.name, outcome="won")
+                return "ok", attempt.result()
+
+        if all(attempt.done() for attempt in self.attempts):
+            # Errors are not retried: hedging is for latency only
+            return "error", self.attempts[0].exception()
+
+        if now >= self.expires:
+            return "timeout", None
+
+        if self.hedge_at is not None and now >= self.hedge_at:
+            self.hedge_at = None
+            self.attempts.append(self.launch())
+            HEDGED_REQUESTS.inc(backend=self.name, outcome="sent")
+        return None
+
+    def next_event(self) -> float:
+        if self.hedge_at is None:
+            return self.expires
+        return min(self.expires, self.hedge_at)
+
+    def cancel(self):
+        for attempt in self.attempts:
+            if not attempt.done():
+                attempt.cancel()
+            elif not attempt.cancelled():
+                attempt.exception()  # retrieved, so a lost attempt's error is not logged
+
+
+def _timed(name: str, fn: Callable):
+    started = time.monotonic()
+    result = fn()
+    get_tracker(name).observe(time.monotonic() - started)
+    return result
+
+
+def run_hedged(pool: Executor, calls: dict[str, Callable], timeouts: dict[str, float]) -> dict:
+    """
+    Runs every calls[name]() on `pool`, hedged, waiting at most
+    timeouts[name] for each. Returns {name: (status, result or exception)}.
+
+    Attempts already running when their call settles are left to finish
+    in the pool (threads cannot be interrupted); queued ones are dropped.
+    """
+    pending = {
+        name: _Hedged(name, lambda name=name, fn=fn: pool.submit(_timed, name, fn), timeouts[name])
+        for name, fn in calls.items()
+    }
+    outcomes = {}
+
+    while pending:
+        now = time.monotonic()
+        for name, call in list(pending.items()):
+            outcome = call.poll(now)
+            if outcome is not None:
+                call.cancel()
+                outcomes[name] = outcome
+                del pending[name]
+        if not pending:
+            break
+
+        wake = min(call.next_event() for call in pending.values())
+        wait(
+            [attempt for call in pending.values() for attempt in call.attempts],
+            timeout=max(0.0, wake - time.monotonic()),
+            return_when=FIRST_COMPLETED
+        )
+
+    return {name: outcomes[name] for name in calls}
+
+
+async def _atimed(name: str, fn: Callable[[], Awaitable]):
+    started = time.monotonic()
+    try:
+        result = await fn()
+    except asyncio.CancelledError:
+        # A losing or abandoned attempt took at least this long
+        get_tracker(name).observe(time.monotonic() - started)
+        raise
+    get_tracker(name).observe(time.monotonic() - started)
+    return result
+
+
+async def ahedged(name: str, fn: Callable[[], Awaitable], timeout: float) -> tuple:
+    """
+    Async variant for one call: awaits fn() hedged, at most `timeout`
+    seconds. Returns (status, result or exception); losing attempts are
+    cancelled.
+    """
+    call = _Hedged(name, lambda: asyncio.ensure_future(_atimed(name, fn)), timeout)
+    try:
+        while True:
+            outcome = call.poll(time.monotonic())
+            if outcome is not None:
+                return outcome
+            await asyncio.wait(
+                call.attempts,
+                timeout=max(0.0, call.next_event() - time.monotonic()),
+                return_when=asyncio.FIRST_COMPLETED
+            )
+    finally:
+        call.cancel()
@@ -0,0 +1,625 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+import threading
+import time
+import traceback
+from typing import Iterable, Iterator, Optional
+
+from sqlalchemy import delete, update
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.core.metrics import DOCUMENT_CHUNKS, DOCUMENT_PAGES, STAGE_SECONDS, timed
+from app.models.document import Document, DocumentChunk
+from app.services.cache import invalidate_namespace
+from app.services.chunking import chunk_pages
+from app.services.job_queue import get_job_queue, new_job
+from app.services.manifest import add_chunks, load_manifest, record_ids, remove_chunks
+from app.services.scheduler import tenant_scope
+from app.services.usage import record_usage
+from app.services.vector_store import (
+    chunk_record_id,
+    delete_document_vectors,
+    delete_legacy_vectors,
+    delete_records,
+    update_record_fields,
+    upsert_texts
+)
+from app.utils.file_loader import (
+    count_pdf_pages,
+    delete_file,
+    iter_pdf_pages,
+    upload_file_from_path
+)
+
+SPOOL_BLOCK_SIZE = 1024 * 1024
+
+
+def _spool_dir() -> str:
+    path = settings.ingestion_spool_dir or os.path.join(
+        tempfile.gettempdir(), "doc-intel-spool"
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class UploadTooLarge(Exception):
+    def __init__(self, limit: int):
+        super().__init__(f"Upload exceeds the {limit} byte limit")
+        self.limit = limit
+
+
+def _spool_file(filename: str):
+    fd, spool_path = tempfile.mkstemp(
+        dir=_spool_dir(),
+        suffix=os.path.splitext(filename)[1]
+    )
+    return os.fdopen(fd, "wb"), spool_path
+
+
+def _spool_block(out, hasher, block: bytes, size: int, limit: int) -> int:
+    size += len(block)
+    if size > limit:
+        raise UploadTooLarge(limit)
+    hasher.update(block)
+    out.write(block)
+    return size
+
+
+def _remove_partial(spool_path: str):
+    try:
+        os.remove(spool_path)
+    except OSError:
+        pass
+
+
+def spool_upload(fileobj, filename: str, limit: Optional[int] = None) -> tuple[str, str]:
+    """
+    Copies an uploaded file to local disk in blocks while fingerprinting it,
+    so at most one block is in memory. Returns (spool_path, sha256 hex
+    digest); raises UploadTooLarge past `limit` (max_upload_bytes).
+    """
+    limit = limit or settings.max_upload_bytes
+    out, spool_path = _spool_file(filename)
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        with out:
+            while True:
+                block = fileobj.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                size = _spool_block(out, hasher, block, size, limit)
+    except Exception:
+        _remove_partial(spool_path)
+        raise
+
+    return spool_path, hasher.hexdigest()
+
+
+async def aspool_upload(upload, filename: str, limit: Optional[int] = None) -> tuple[str, str]:
+    """
+    Async variant of spool_upload for a Starlette UploadFile. Blocks are
+    hashed and written on a worker thread, so the event loop only awaits
+    the reads.
+    """
+    limit = limit or settings.max_upload_bytes
+    out, spool_path = _spool_file(filename)
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        with out:
+            while True:
+                block = await upload.read(SPOOL_BLOCK_SIZE)
+                if not block:
+                    break
+                size = await asyncio.to_thread(_spool_block, out, hasher, block, size, limit)
+    except Exception:
+        _remove_partial(spool_path)
+        raise
+
+    return spool_path, hasher.hexdigest()
+
+
+def enqueue_ingestion(
+    owner_id: int,
+    filename: str,
+    spool_path: str,
+    content_hash: str,
+    document_id: Optional[int] = None
+) -> dict:
+    """
+    Records an ingestion job for a spooled file and returns it; with a
+    document_id the file is a new version of that document and the job
+    re-indexes it incrementally
+    """
+    job = new_job(
+        owner_id=owner_id,
+        filename=filename,
+        spool_path=spool_path,
+        content_hash=content_hash,
+        kind="ingest" if document_id is None else "reindex",
+        document_id=document_id
+    )
+    get_job_queue().create_job(job)
+    return job
+
+
+def dedupe_chunks(chunks: Iterable[dict]) -> Iterator[dict]:
+    """
+    Drops repeated chunks (e.g. running headers/footers) by chunk_hash so
+    each distinct chunk is embedded and stored once per document. Yields
+    the chunks that are kept with their position in the original
+    sequence (chunk_index) and the chunk_hash of the kept chunk before
+    them (prev_hash, "" for the first) added.
+    """
+    seen = set()
+    prev = ""
+
+    for idx, chunk in enumerate(chunks):
+        # Raw digests keep the seen-set at 32 bytes per chunk
+        digest = bytes.fromhex(chunk["chunk_hash"])
+        if digest in seen:
+            continue
+        seen.add(digest)
+        yield {**chunk, "chunk_index": idx, "prev_hash": prev}
+        prev = chunk["chunk_hash"]
+
+
+def _set_stage(job_id: str, stage: str, status: str, progress: float):
+    queue = get_job_queue()
+    job = queue.get_job(job_id)
+    stages = job["stages"]
+    stages[stage] = {"status": status, "progress": progress}
+    queue.update_job(job_id, stage=stage, stages=stages)
+
+
+def metered_pages(pages: Iterator[dict], meter: dict) -> Iterator[dict]:
+    """
+    Passes pages through, counting them and the time spent producing them
+    """
+    while True:
+        t0 = time.perf_counter()
+        page = next(pages, None)
+        meter["extract_s"] += time.perf_counter() - t0
+        if page is None:
+            return
+        meter["pages"] += 1
+        yield page
+
+
+def discard_document(document_id: Optional[int], namespace: str, storage_path: Optional[str]):
+    """
+    Removes what a failed ingestion left behind, so a retry of the same
+    file isn't answered with a half-indexed duplicate. Either part may be
+    missing when ingestion stopped before creating it.
+    """
+    cleanups = []
+    if document_id is not None:
+        cleanups.append(lambda: delete_document_vectors(document_id, namespace, record_ids(document_id)))
+    if storage_path:
+        cleanups.append(lambda: delete_file(storage_path))
+
+    for cleanup in cleanups:
+        try:
+            cleanup()
+        except Exception:
+            traceback.print_exc()
+
+    if document_id is None:
+        return
+
+    db = SessionLocal()
+    try:
+        db.execute(delete(DocumentChunk).where(DocumentChunk.document_id == document_id))
+        doc = db.get(Document, document_id)
+        if doc is not None:
+            db.delete(doc)
+        db.commit()
+    finally:
+        db.close()
+
+
+def _upsert_chunks(document_id: int, filename: str, namespace: str, chunks: list[dict]) -> list[str]:
+    """
+    Records new chunks in the document's chunk manifest, then upserts
+    them; returns their record ids
+    """
+    ids = add_chunks(document_id, chunks)
+    upsert_texts(
+        texts=[c["text"] for c in chunks],
+        metadatas=[
+            {
+                "document_id": document_id,
+                "chunk_index": c["chunk_index"],
+                "chunk_hash": c["chunk_hash"],
+                "prev_chunk": c["prev_hash"],
+                "filename": filename,
+                "page": c["page"],
+            }
+            for c in chunks
+        ],
+        namespace=namespace,
+        ids=ids
+    )
+    return ids
+
+
+def _set_stages(job_id: str, stages: tuple, status: str, progress: float):
+    for stage in stages:
+        _set_stage(job_id, stage, status, progress)
+
+
+_STREAMED_STAGES = ("extract", "chunk", "upsert")
+
+
+def run_ingestion_job(job: dict) -> dict:
+    """
+    Runs store -> extract -> chunk -> upsert for a claimed job and returns
+    the result summary stored on the job.
+
+    The file is never read into memory as a whole: storage streams it
+    from the spool file, extraction reads pages from a memory map, and
+    pages flow through the chunker into the vector stores in groups of
+    chunks. Peak memory depends on the group size, not the file size.
+    """
+    job_id = job["id"]
+    filename = job["filename"]
+    owner_id = job["owner_id"]
+    spool_path = job["spool_path"]
+    namespace = f"user_{owner_id}"
+
+    # A job interrupted by a restart is rerun from the start: drop the
+    # document it had begun, so the rerun doesn't leave a second one
+    if job.get("document_id") is not None or job.get("storage_path"):
+        discard_document(job.get("document_id"), namespace, job.get("storage_path"))
+        get_job_queue().update_job(job_id, document_id=None, storage_path=None)
+
+    # 1️⃣ Upload to Supabase Storage
+    _set_stage(job_id, "store", "running", 0.0)
+    with timed(STAGE_SECONDS, pipeline="upload", stage="store"):
+        storage_path = upload_file_from_path(spool_path, filename)
+    get_job_queue().update_job(job_id, storage_path=storage_path)
+    _set_stage(job_id, "store", "done", 1.0)
+
+    # 2️⃣ Store document metadata (the content hash is only set once
+    # ingestion succeeds, so duplicates never match a partial document)
+    db = SessionLocal()
+    try:
+        with timed(STAGE_SECONDS, pipeline="upload", stage="db_write"):
+            doc = Document(
+                filename=filename,
+                owner_id=owner_id,
+                storage_path=storage_path
+            )
+            db.add(doc)
+            db.commit()
+            document_id = doc.id
+    finally:
+        db.close()
+
+    get_job_queue().update_job(job_id, document_id=document_id)
+
+    # 3️⃣ Extract -> chunk -> upsert, streamed page by page
+    _set_stages(job_id, _STREAMED_STAGES, "running", 0.0)
+
+    num_pages = 0
+    group_size = settings.upsert_batch_size * settings.upsert_parallelism
+    meter = {"extract_s": 0.0, "upsert_s": 0.0, "pages": 0}
+    num_chunks = 0
+    sample_chunk = ""
+    group = []
+
+    def flush():
+        t0 = time.perf_counter()
+        _upsert_chunks(document_id, filename, namespace, group)
+        meter["upsert_s"] += time.perf_counter() - t0
+        group.clear()
+
+        progress = round(meter["pages"] / num_pages, 3) if num_pages else 1.0
+        _set_stages(job_id, _STREAMED_STAGES, "running", progress)
+
+    started = time.perf_counter()
+    try:
+        # An unreadable PDF fails here, and is discarded like any other
+        num_pages = count_pdf_pages(spool_path)
+        pages = metered_pages(iter_pdf_pages(spool_path), meter)
+        for chunk in dedupe_chunks(chunk_pages(pages, doc_type="general", purpose="qa")):
+            if not sample_chunk:
+                sample_chunk = chunk["text"][:300]
+            group.append(chunk)
+            num_chunks += 1
+            if len(group) >= group_size:
+                flush()
+        if group:
+            flush()
+    except Exception:
+        discard_document(document_id, namespace, storage_path)
+        raise
+    finally:
+        # Even a partial upsert changes what the namespace can answer
+        invalidate_namespace(namespace)
+
+    chunk_s = time.perf_counter() - started - meter["extract_s"] - meter["upsert_s"]
+    STAGE_SECONDS.observe(meter["extract_s"], pipeline="upload", stage="extract")
+    STAGE_SECONDS.observe(max(0.0, chunk_s), pipeline="upload", stage="chunk")
+    STAGE_SECONDS.observe(meter["upsert_s"], pipeline="upload", stage="upsert")
+    DOCUMENT_PAGES.observe(meter["pages"])
+    DOCUMENT_CHUNKS.observe(num_chunks)
+
+    db = SessionLocal()
+    try:
+        db.query(Document).filter(Document.id == document_id).update(
+            {"content_hash": job.get("content_hash")}
+        )
+        db.commit()
+    finally:
+        db.close()
+
+    _set_stages(job_id, _STREAMED_STAGES, "done", 1.0)
+
+    return {
+        "document_id": document_id,
+        "filename": filename,
+        "num_chunks": num_chunks,
+        "sample_chunk": sample_chunk,
+        "storage_path": storage_path,
+    }
+
+
+def _drop_chunks(document_id: int, namespace: str, ids: list[str]):
+    delete_records(ids, namespace)
+    db = SessionLocal()
+    try:
+        remove_chunks(db, document_id, ids)
+        db.commit()
+    finally:
+        db.close()
+
+
+def run_reindex_job(job: dict) -> dict:
+    """
+    Re-indexes a new version of an existing document by diffing its
+    chunks (by content hash) against the document's chunk manifest:
+    only new chunks are embedded and upserted, and chunks that
+    disappeared are deleted.
+
+    Kept chunks are only rewritten in the index when their predecessor
+    (prev_chunk, which merge_adjacent follows) or page changed, i.e. at
+    the edges of the edit. Their chunk_index in the index is left as it
+    was, so an insertion does not touch every later chunk; the manifest,
+    a local table, is renumbered in full. Work on the vector stores is
+    proportional to the size of the edit rather than of the document.
+    """
+    job_id = job["id"]
+    document_id = job["document_id"]
+    filename = job["filename"]
+    owner_id = job["owner_id"]
+    spool_path = job["spool_path"]
+    namespace = f"user_{owner_id}"
+
+    db = SessionLocal()
+    try:
+        old_storage_path = db.get(Document, document_id).storage_path
+    finally:
+        db.close()
+
+    manifest = load_manifest(document_id)
+
+    # 1️⃣ Upload the new version to Supabase Storage
+    _set_stage(job_id, "store", "running", 0.0)
+    with timed(STAGE_SECONDS, pipeline="reindex", stage="store"):
+        storage_path = upload_file_from_path(spool_path, filename)
+    _set_stage(job_id, "store", "done", 1.0)
+
+    # 2️⃣ Extract -> chunk -> diff, streamed page by page
+    _set_stages(job_id, _STREAMED_STAGES, "running", 0.0)
+
+    num_pages = 0
+    group_size = settings.upsert_batch_size * settings.upsert_parallelism
+    meter = {"extract_s": 0.0, "pages": 0}
+    seen = set()
+    added = []
+    shifted = {}  # manifest rows to renumber
+    moved = {}  # records to relink
+    group = []
+
+    def flush():
+        added.extend(chunk_record_id(document_id, c["chunk_hash"]) for c in group)
+        _upsert_chunks(document_id, filename, namespace, group)
+        group.clear()
+
+        progress = round(meter["pages"] / num_pages, 3) if num_pages else 1.0
+        _set_stages(job_id, _STREAMED_STAGES, "running", progress)
+
+    try:
+        num_pages = count_pdf_pages(spool_path)
+        with timed(STAGE_SECONDS, pipeline="reindex", stage="diff"):
+            pages = metered_pages(iter_pdf_pages(spool_path), meter)
+            for chunk in dedupe_chunks(chunk_pages(pages, doc_type="general", purpose="qa")):
+                seen.add(chunk["chunk_hash"])
+                indexed = manifest.get(chunk["chunk_hash"])
+
+                if indexed is None:
+                    group.append(chunk)
+                    if len(group) >= group_size:
+                        flush()
+                    continue
+
+                position = (chunk["chunk_index"], chunk["page"], chunk["prev_hash"])
+                if (indexed["chunk_index"], indexed["page"], indexed["prev_hash"]) != position:
+                    shifted[chunk["chunk_hash"]] = chunk
+                # Rows from before prev_hash was tracked (NULL) are
+                # relinked once
+                if (indexed["page"], indexed["prev_hash"]) != (chunk["page"], chunk["prev_hash"]):
+                    moved[chunk["chunk_hash"]] = chunk
+            if group:
+                flush()
+
+        # 3️⃣ Relink chunks at the edges of the edit, drop chunks that are gone
+        with timed(STAGE_SECONDS, pipeline="reindex", stage="apply"):
+            update_record_fields(
+                {
+                    manifest[h]["record_id"]: {
+                        "chunk_index": c["chunk_index"],
+                        "page": c["page"],
+                        "prev_chunk": c["prev_hash"],
+                    }
+                    for h, c in moved.items()
+                },
+                namespace
+            )
+            removed = [row["record_id"] for h, row in manifest.items() if h not in seen]
+            delete_records(removed, namespace)
+            if not manifest:
+                # Indexed before the manifest existed: its record ids are
+                # unknown, so drop its old records now that the new
+                # version is in place
+                delete_legacy_vectors(document_id, namespace)
+
+            db = SessionLocal()
+            try:
+                if shifted:
+                    db.execute(update(DocumentChunk), [
+                        {
+                            "id": manifest[h]["id"],
+                            "chunk_index": c["chunk_index"],
+                            "page": c["page"],
+                            "prev_hash": c["prev_hash"],
+                        }
+                        for h, c in shifted.items()
+                    ])
+                remove_chunks(db, document_id, removed)
+                db.query(Document).filter(Document.id == document_id).update({
+                    "filename": filename,
+                    "storage_path": storage_path,
+                    "content_hash": job.get("content_hash"),
+                })
+                db.commit()
+            finally:
+                db.close()
+    except Exception:
+        # Roll back to the previous version: drop the chunks added so far
+        # (all listed in `added`, as the manifest is written before the
+        # upsert) and the new upload
+        for cleanup in (
+            lambda: _drop_chunks(document_id, namespace, added),
+            lambda: delete_file(storage_path)
+        ):
+            try:
+                cleanup()
+            except Exception:
+                traceback.print_exc()
+        raise
+    finally:
+        invalidate_namespace(namespace)
+
+    _set_stages(job_id, _STREAMED_STAGES, "done", 1.0)
+
+    try:
+        delete_file(old_storage_path)
+    except Exception:
+        traceback.print_exc()
+
+    return {
+        "document_id": document_id,
+        "filename": filename,
+        "num_chunks": len(seen),
+        "added": len(added),
+        "removed": len(removed),
+        "moved": len(moved),
+        "unchanged": len(seen) - len(added) - len(moved),
+        "storage_path": storage_path,
+    }
+
+
+_job_kinds = {}
+
+
+def register_job_kind(kind: str, runner, usage_action: str):
+    """
+    Lets workers run jobs of `kind` with `runner(job) -> result`; the
+    result must include num_chunks for usage accounting
+    """
+    _job_kinds[kind] = (runner, usage_action)
+
+
+register_job_kind("ingest", run_ingestion_job, "upload")
+register_job_kind("reindex", run_reindex_job, "reindex")
+
+
+class IngestionWorkerPool:
+    """
+    Background threads that claim queued jobs and run the ingestion pipeline
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.num_workers):
+            thread = threading.Thread(
+                target=self._work,
+                name=f"ingestion-worker-{i}",
+                daemon=True
+            )
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = 5.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _work(self):
+        queue = get_job_queue()
+
+        while not self._stop.is_set():
+            job = queue.claim_next(timeout=1.0)
+            if job is None:
+                continue
+
+            try:
+                runner, action = _job_kinds[job.get("kind", "ingest")]
+                # Jobs wait for their owner's share of the backends
+                with tenant_scope(job["owner_id"], patient=True):
+                    result = runner(job)
+                queue.update_job(job["id"], status="succeeded", result=result)
+                record_usage(
+                    job["owner_id"],
+                    action,
+                    latency_ms=(time.time() - job["created_at"]) * 1000,
+                    chunks=result["num_chunks"]
+                )
+            except Exception as e:
+                traceback.print_exc()
+                failed = queue.get_job(job["id"]) or job
+                stage = failed.get("stage")
+                stages = failed["stages"]
+                if stage:
+                    stages[stage]["status"] = "failed"
+                queue.update_job(
+                    job["id"],
+                    status="failed",
+                    stages=stages,
+                    error=str(e)
+                )
+            finally:
+                spool_paths = [job["spool_path"]] + [f["spool_path"] for f in job.get("files") or []]
+                for path in spool_paths:
+                    if not path:
+                        continue
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+
+
+worker_pool = IngestionWorkerPool(num_workers=settings.ingestion_workers)
@@ -0,0 +1,348 @@
+import copy
+import json
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.core.config import settings
+
+
+INGESTION_STAGES = ["store", "extract", "chunk", "upsert"]
+
+
+def new_job(
+    owner_id: int,
+    filename: str,
+    spool_path: Optional[str],
+    content_hash: Optional[str] = None,
+    kind: str = "ingest",
+    document_id: Optional[int] = None,
+    files: Optional[list[dict]] = None
+) -> dict:
+    """
+    Builds a fresh ingestion job record in the `queued` state.
+    `kind` is "ingest" for a new document, "reindex" for a new
+    version of `document_id`, or "bulk" for the per-file entries in
+    `files`, ingested together.
+    """
+    now = time.time()
+    return {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "owner_id": owner_id,
+        "filename": filename,
+        "spool_path": spool_path,
+        "content_hash": content_hash,
+        "status": "queued",
+        "stage": None,
+        "stages": {
+            name: {"status": "pending", "progress": 0.0}
+            for name in INGESTION_STAGES
+        },
+        "document_id": document_id,
+        "storage_path": None,
+        "files": files,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class JobQueue:
+    """
+    Persists ingestion job records and hands queued jobs to workers.
+
+    Implementations must make `claim_next` atomic so that a job is only
+    ever picked up by a single worker, and must hold back a reindex job
+    while another reindex of the same document is running: both would
+    write the same document's chunk manifest.
+    """
+
+    def create_job(self, job: dict) -> None:
+        raise NotImplementedError
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update_job(self, job_id: str, **fields) -> Optional[dict]:
+        raise NotImplementedError
+
+    def claim_next(self, timeout: float = 1.0) -> Optional[dict]:
+        raise NotImplementedError
+
+    def find_active_job(
+        self,
+        owner_id: int,
+        content_hash: str,
+        document_id: Optional[int] = None
+    ) -> Optional[dict]:
+        """
+        Returns a queued or running job for the same owner and file
+        content, and with a document_id, for that document
+        """
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryJobQueue(JobQueue):
+    """
+    Process-local queue. Jobs are lost on restart, and finished ones are
+    forgotten ingestion_job_ttl_seconds after they finish.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._pending = queue.Queue()
+        self._lock = threading.Lock()
+        self._reindexing = {}  # document_id -> its running reindex job
+        self._deferred = {}  # document_id -> reindex job ids waiting on it
+
+    def create_job(self, job: dict) -> None:
+        with self._lock:
+            self._evict_finished()
+            self._jobs[job["id"]] = copy.deepcopy(job)
+        self._pending.put(job["id"])
+
+    def _evict_finished(self):
+        expired = time.time() - settings.ingestion_job_ttl_seconds
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job["status"] not in ("queued", "running") and job["updated_at"] < expired
+        ]:
+            del self._jobs[job_id]
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return copy.deepcopy(job) if job else None
+
+    def update_job(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            job["updated_at"] = time.time()
+            if job.get("kind") == "reindex" and job["status"] not in ("queued", "running"):
+                self._release(job)
+            return copy.deepcopy(job)
+
+    def _release(self, job: dict):
+        # Hands the document to its next waiting reindex job, if any
+        document_id = job["document_id"]
+        if self._reindexing.get(document_id) != job["id"]:
+            return
+        del self._reindexing[document_id]
+        waiting = self._deferred.get(document_id)
+        if waiting:
+            self._pending.put(waiting.pop(0))
+            if not waiting:
+                del self._deferred[document_id]
+
+    def claim_next(self, timeout: float = 1.0) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            try:
+                job_id = self._pending.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                return None
+
+            with self._lock:
+                job = self._jobs[job_id]
+                if job.get("kind") == "reindex":
+                    document_id = job["document_id"]
+                    if document_id in self._reindexing:
+                        self._deferred.setdefault(document_id, []).append(job_id)
+                        continue
+                    self._reindexing[document_id] = job_id
+
+            return self.update_job(job_id, status="running")
+
+    def find_active_job(
+        self,
+        owner_id: int,
+        content_hash: str,
+        document_id: Optional[int] = None
+    ) -> Optional[dict]:
+        with self._lock:
+            for job in self._jobs.values():
+                if (
+                    job["owner_id"] == owner_id
+                    and job.get("content_hash") == content_hash
+                    and job["status"] in ("queued", "running")
+                    and (document_id is None or job.get("document_id") == document_id)
+                ):
+                    return copy.deepcopy(job)
+        return None
+
+
+class SQLiteJobQueue(JobQueue):
+    """
+    Durable queue backed by a local SQLite file.
+
+    Jobs that were `running` when the process died are put back in the
+    queue on startup, so they are retried once workers come back; the
+    runner discards whatever the interrupted run had written.
+    """
+
+    def __init__(self, path: str, poll_interval: float = 0.25):
+        self._poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            path,
+            check_same_thread=False,
+            isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS ingestion_jobs (
+                id TEXT PRIMARY KEY,
+                owner_id INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_ingestion_jobs_status "
+            "ON ingestion_jobs (status, created_at)"
+        )
+        self._requeue_interrupted()
+
+    def _requeue_interrupted(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, payload FROM ingestion_jobs WHERE status = 'running'"
+            ).fetchall()
+            for job_id, payload in rows:
+                job = json.loads(payload)
+                job["status"] = "queued"
+                self._write(job)
+
+    def _write(self, job: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO ingestion_jobs "
+            "(id, owner_id, status, created_at, payload) VALUES (?, ?, ?, ?, ?)",
+            (
+                job["id"],
+                job["owner_id"],
+                job["status"],
+                job["created_at"],
+                json.dumps(job),
+            )
+        )
+
+    def create_job(self, job: dict) -> None:
+        with self._lock:
+            self._write(job)
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM ingestion_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update_job(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM ingestion_jobs WHERE id = ?",
+                (job_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            job.update(fields)
+            job["updated_at"] = time.time()
+            self._write(job)
+            return job
+
+    def claim_next(self, timeout: float = 1.0) -> Optional[dict]:
+        deadline = time.monotonic() + timeout
+
+        while True:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # A reindex job waits while its document is being
+                    # reindexed by another job
+                    row = self._conn.execute(
+                        "SELECT payload FROM ingestion_jobs AS q "
+                        "WHERE status = 'queued' AND NOT ("
+                        "  json_extract(payload, '$.kind') = 'reindex' AND EXISTS ("
+                        "    SELECT 1 FROM ingestion_jobs AS r WHERE r.status = 'running' "
+                        "    AND json_extract(r.payload, '$.kind') = 'reindex' "
+                        "    AND json_extract(r.payload, '$.document_id') = "
+                        "        json_extract(q.payload, '$.document_id')"
+                        "  )"
+                        ") ORDER BY created_at LIMIT 1"
+                    ).fetchone()
+                    job = None
+                    if row is not None:
+                        job = json.loads(row[0])
+                        job["status"] = "running"
+                        job["updated_at"] = time.time()
+                        self._write(job)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+
+            if job is not None:
+                return job
+            if time.monotonic() >= deadline:
+                return None
+            time.sleep(self._poll_interval)
+
+    def find_active_job(
+        self,
+        owner_id: int,
+        content_hash: str,
+        document_id: Optional[int] = None
+    ) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload FROM ingestion_jobs "
+                "WHERE owner_id = ? AND status IN ('queued', 'running') "
+                "AND json_extract(payload, '$.content_hash') = ? "
+                "AND (? IS NULL OR json_extract(payload, '$.document_id') = ?) LIMIT 1",
+                (owner_id, content_hash, document_id, document_id)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_job_queue: Optional[JobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> JobQueue:
+    """
+    Returns the process-wide job queue for the configured backend
+    """
+    global _job_queue
+
+    with _job_queue_lock:
+        if _job_queue is None:
+            backend = settings.ingestion_queue_backend
+            if backend == "memory":
+                _job_queue = InMemoryJobQueue()
+            elif backend == "sqlite":
+                _job_queue = SQLiteJobQueue(settings.ingestion_sqlite_path)
+            else:
+                raise ValueError(f"Unknown ingestion queue backend: {backend}")
+
+    return _job_queue
@@ -1,12 +1,181 @@
-from langchain_groq import ChatGroq
+from typing import AsyncIterator, Optional
+
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FuturesTimeout
+
+from app.core.clients import get_client, register_client
 from app.core.config import settings
+from app.core.metrics import STAGE_SECONDS, timed
+from app.services.deadline import DeadlineExceeded, exceeded, expired, remaining
+from app.services.scheduler import ascheduled, hold, scheduled
+
+MODEL_NAME = "llama-3.1-8b-instant"  # fast + free-tier friendly
+
+
+def _build_llm():
+    from langchain_groq import ChatGroq
+
+    return ChatGroq(
+        groq_api_key=settings.groq_api_key,
+        model_name=MODEL_NAME,
+        temperature=0.2,
+        request_timeout=settings.llm_request_timeout
+    )
+
+
+register_client("llm", _build_llm)
 
-llm = ChatGroq(
-    groq_api_key=settings.groq_api_key,
-    model_name="llama-3.1-8b-instant",  # fast + free-tier friendly
-    temperature=0.2
+
+def get_llm():
+    return get_client("llm")
+
+
+# Threads that consume deadline-bound generations, so the caller can
+# return at the deadline while the stream is closed behind it
+_llm_pool = ThreadPoolExecutor(
+    max_workers=settings.llm_pool_size,
+    thread_name_prefix="llm"
 )
 
+
 def generate_answer(prompt: str) -> str:
-    response = llm.invoke(prompt)
-    return response.content
+    """
+    Returns the answer. Under a request deadline the answer is streamed
+    and, if the deadline passes first, the stream is closed and
+    DeadlineExceeded raised carrying the tokens received so far.
+    """
+    if remaining() is None:
+        with scheduled("llm"), timed(STAGE_SECONDS, pipeline="query", stage="llm"):
+            response = get_llm().invoke(prompt)
+        return response.content
+
+    if expired():
+        raise exceeded("llm")
+
+    parts = []
+    stop = threading.Event()
+
+    def collect():
+        with timed(STAGE_SECONDS, pipeline="query", stage="llm"):
+            stream = get_llm().stream(prompt)
+            try:
+                for chunk in stream:
+                    if stop.is_set():
+                        break
+                    if chunk.content:
+                        parts.append(chunk.content)
+            finally:
+                close = getattr(stream, "close", None)
+                if close is not None:
+                    close()
+
+    # The slot is taken here, so queueing is bounded by our deadline, but
+    # given back when the worker is done: past the deadline the stream is
+    # only closed at its next chunk, and the slot covers it until then
+    release = hold("llm")
+    try:
+        # The worker runs in a copy of our context: same tenant and deadline
+        future = _llm_pool.submit(contextvars.copy_context().run, collect)
+    except BaseException:
+        release()
+        raise
+    future.add_done_callback(lambda _: release())
+
+    try:
+        future.result(timeout=remaining())
+    except FuturesTimeout:
+        stop.set()
+        future.cancel()
+        raise exceeded("llm", partial="".join(parts))
+    return "".join(parts)
+
+
+async def agenerate_answer(prompt: str) -> str:
+    """
+    Async variant of generate_answer: past the deadline the generation
+    is cancelled (closing the provider stream)
+    """
+    if remaining() is None:
+        async with ascheduled("llm"):
+            with timed(STAGE_SECONDS, pipeline="query", stage="llm"):
+                response = await get_llm().ainvoke(prompt)
+        return response.content
+
+    if expired():
+        raise exceeded("llm")
+
+    parts = []
+
+    async def collect():
+        async with ascheduled("llm"):
+            with timed(STAGE_SECONDS, pipeline="query", stage="llm"):
+                stream = get_llm().astream(prompt)
+                try:
+                    async for chunk in stream:
+                        if chunk.content:
+                            parts.append(chunk.content)
+                finally:
+                    await stream.aclose()
+
+    try:
+        await asyncio.wait_for(collect(), remaining())
+    except DeadlineExceeded:
+        raise
+    except asyncio.TimeoutError:
+        raise exceeded("llm", partial="".join(parts))
+    return "".join(parts)
+
+
+async def astream_answer(prompt: str, deadline: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Yields answer tokens as the model produces them. Past `deadline` (a
+    time.monotonic() value) the stream is cancelled, giving back its LLM
+    slot, and DeadlineExceeded raised.
+
+    The deadline is passed in rather than read from the context: an
+    async generator runs in its consumer's context, so a caller that is
+    itself a generator can't keep a deadline_scope open across yields.
+    """
+    if deadline is None:
+        async for token in _astream_answer(prompt):
+            yield token
+        return
+
+    stream = _astream_answer(prompt)
+    try:
+        while True:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise exceeded("llm")
+            try:
+                token = await asyncio.wait_for(anext(stream), left)
+            except StopAsyncIteration:
+                return
+            except asyncio.TimeoutError:
+                raise exceeded("llm")
+            yield token
+    finally:
+        await stream.aclose()
+
+
+async def _astream_answer(prompt: str) -> AsyncIterator[str]:
+    async with ascheduled("llm"):
+        started = time.perf_counter()
+        first = True
+        try:
+            async for chunk in get_llm().astream(prompt):
+                if chunk.content:
+                    if first:
+                        _observe_first_token(started)
+                        first = False
+                    yield chunk.content
+        finally:
+            STAGE_SECONDS.observe(time.perf_counter() - started, pipeline="query", stage="llm")
+
+
+def _observe_first_token(started: float):
+    STAGE_SECONDS.observe(time.perf_counter() - started, pipeline="query", stage="llm_first_token")
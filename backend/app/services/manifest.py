@@ -0,0 +1,113 @@
+"""
+Chunk manifest (document_chunks): the record id, content hash and
+position of every chunk indexed for a document.
+
+Rows are written before their vectors are upserted, so the manifest
+always covers everything in the index for a document: deleting a
+document's records by id never leaves vectors behind.
+"""
+from sqlalchemy import delete, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import SessionLocal
+from app.models.document import DocumentChunk
+from app.services.vector_store import chunk_record_id, verify_records
+
+_SQL_BATCH = 1000  # ids per IN (...) clause, well below SQLite's variable limit
+
+
+def load_manifest(document_id: int) -> dict:
+    """
+    Returns {chunk_hash: {id, record_id, chunk_index, page, prev_hash}}
+    """
+    db = SessionLocal()
+    try:
+        rows = db.execute(
+            select(DocumentChunk).where(DocumentChunk.document_id == document_id)
+        ).scalars()
+        return {
+            row.chunk_hash: {
+                "id": row.id,
+                "record_id": row.record_id,
+                "chunk_index": row.chunk_index,
+                "page": row.page,
+                "prev_hash": row.prev_hash,
+            }
+            for row in rows
+        }
+    finally:
+        db.close()
+
+
+def record_ids(document_id: int) -> list[str]:
+    db = SessionLocal()
+    try:
+        return list(db.execute(
+            select(DocumentChunk.record_id).where(DocumentChunk.document_id == document_id)
+        ).scalars())
+    finally:
+        db.close()
+
+
+async def arecord_ids(db: AsyncSession, document_id: int) -> list[str]:
+    return list((await db.execute(
+        select(DocumentChunk.record_id).where(DocumentChunk.document_id == document_id)
+    )).scalars())
+
+
+def add_chunks(document_id: int, chunks: list[dict]) -> list[str]:
+    """
+    Records chunks ({chunk_hash, chunk_index, page, prev_hash}) in the manifest and
+    returns their record ids, in order
+    """
+    if not chunks:
+        # An empty executemany would insert one row of defaults
+        return []
+
+    ids = [chunk_record_id(document_id, c["chunk_hash"]) for c in chunks]
+    db = SessionLocal()
+    try:
+        db.execute(insert(DocumentChunk), [
+            {
+                "document_id": document_id,
+                "chunk_hash": c["chunk_hash"],
+                "record_id": _id,
+                "chunk_index": c["chunk_index"],
+                "page": c["page"],
+                "prev_hash": c["prev_hash"],
+            }
+            for c, _id in zip(chunks, ids)
+        ])
+        db.commit()
+    finally:
+        db.close()
+    return ids
+
+
+def remove_chunks(db, document_id: int, ids: list[str]):
+    """
+    Deletes manifest rows by record id (in the caller's transaction)
+    """
+    for start in range(0, len(ids), _SQL_BATCH):
+        db.execute(delete(DocumentChunk).where(
+            DocumentChunk.document_id == document_id,
+            DocumentChunk.record_id.in_(ids[start:start + _SQL_BATCH])
+        ))
+
+
+def verify_manifest(document_id: int, namespace: str) -> dict:
+    """
+    Checks that every store holds exactly the records the manifest lists
+    for the document
+    """
+    ids = record_ids(document_id)
+    stores = verify_records(document_id, ids, namespace)
+    return {
+        "document_id": document_id,
+        "chunks": len(ids),
+        "consistent": all(
+            not report["missing"] and not report["orphaned"]
+            for report in stores.values()
+        ),
+        "stores": stores,
+    }
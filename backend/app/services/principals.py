@@ -0,0 +1,118 @@
+import hashlib
+import time
+from typing import NamedTuple
+
+from jose import jwt
+from sqlalchemy import event, select
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.core.metrics import CACHE_LOOKUPS, STAGE_SECONDS, timed
+from app.models.user import User
+from app.services.cache import InMemoryCache
+
+
+class Principal(NamedTuple):
+    """
+    The authenticated caller, detached from any DB session
+    """
+    id: int
+    email: str
+    role: str
+
+
+# sha256(token) -> verified claims
+_token_cache = InMemoryCache(max_entries=settings.principal_cache_max_entries)
+# user id -> Principal
+_user_cache = InMemoryCache(max_entries=settings.principal_cache_max_entries)
+
+
+def _decode(token: str) -> dict:
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    claims = _token_cache.get(key)
+    CACHE_LOOKUPS.inc(cache="token", result="miss" if claims is None else "hit")
+
+    if claims is not None:
+        if claims["exp"] <= time.time():
+            _token_cache.delete(key)
+            raise ValueError("Token expired")
+        return claims
+
+    with timed(STAGE_SECONDS, pipeline="auth", stage="jwt_decode"):
+        payload = jwt.decode(
+            token,
+            settings.jwt_secret,
+            algorithms=["HS256"]
+        )
+    claims = {"user_id": int(payload["sub"]), "exp": float(payload["exp"])}
+
+    ttl = min(settings.token_cache_ttl_seconds, int(claims["exp"] - time.time()))
+    if ttl > 0:
+        _token_cache.set(key, claims, ttl=ttl)
+
+    return claims
+
+
+def resolve_principal(token: str) -> Principal:
+    """
+    Verifies a bearer token and returns its user.
+
+    Decoded claims are cached per token and users per id, so the database
+    is only hit when a user hasn't been seen within user_cache_ttl_seconds.
+    Raises on an invalid/expired token or unknown user.
+    """
+    user_id = _decode(token)["user_id"]
+
+    principal = _user_cache.get(user_id)
+    CACHE_LOOKUPS.inc(cache="user", result="miss" if principal is None else "hit")
+    if principal is not None:
+        return principal
+
+    db = SessionLocal()
+    try:
+        with timed(STAGE_SECONDS, pipeline="auth", stage="user_lookup"):
+            user = db.query(User).filter(User.id == user_id).first()
+        if not user:
+            raise LookupError(f"Unknown user {user_id}")
+        principal = Principal(id=user.id, email=user.email, role=user.role)
+    finally:
+        db.close()
+
+    _user_cache.set(user_id, principal, ttl=settings.user_cache_ttl_seconds)
+    return principal
+
+
+async def aresolve_principal(token: str) -> Principal:
+    """
+    Async variant of resolve_principal for `async def` routes
+    """
+    user_id = _decode(token)["user_id"]
+
+    principal = _user_cache.get(user_id)
+    CACHE_LOOKUPS.inc(cache="user", result="miss" if principal is None else "hit")
+    if principal is not None:
+        return principal
+
+    async with AsyncSessionLocal() as db:
+        with timed(STAGE_SECONDS, pipeline="auth", stage="user_lookup"):
+            result = await db.execute(select(User).where(User.id == user_id))
+        user = result.scalar_one_or_none()
+        if not user:
+            raise LookupError(f"Unknown user {user_id}")
+        principal = Principal(id=user.id, email=user.email, role=user.role)
+
+    _user_cache.set(user_id, principal, ttl=settings.user_cache_ttl_seconds)
+    return principal
+
+
+def invalidate_user(user_id: int) -> None:
+    """
+    Forces the next request for this user to re-read it from the database
+    """
+    _user_cache.delete(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _invalidate_on_change(mapper, connection, target):
+    invalidate_user(target.id)
@@ -1,10 +1,29 @@
-from langchain_core.prompts import PromptTemplate
-from app.services.retriever import retrieve_chunks
-from app.services.llm import generate_answer
+import asyncio
+import time
 
-prompt_template = PromptTemplate(
-    input_variables=["context", "question"],
-    template="""
+from app.core.config import settings
+from app.core.metrics import PROMPT_TOKENS, STAGE_SECONDS, timed
+from app.services.retriever import aretrieve_chunks, retrieve_chunks
+from app.services.llm import (
+    MODEL_NAME,
+    agenerate_answer,
+    astream_answer,
+    generate_answer
+)
+from app.services.context import LINK_FIELDS, count_tokens, pack_context
+from app.services.deadline import DeadlineExceeded, deadline_at, deadline_scope
+from app.services.scheduler import RateLimited, admit, get_tenant, tenant_scope
+from app.services.singleflight import AsyncSingleFlight, SingleFlight
+from app.services.cache import (
+    answer_cache_key,
+    normalize_question,
+    get_cached_answer,
+    set_cached_answer
+)
+
+# Plain str.format template: same substitution as a LangChain
+# PromptTemplate without importing langchain_core at startup
+prompt_template = """
 You are a helpful AI assistant answering questions from enterprise documents.
 
 Answer the question using ONLY the provided context.
@@ -22,27 +41,318 @@ Rules:
 - If the answer is not in the context, say "I don't know"
 - Be concise, factual, and neutral
 """
-)
 
-def run_rag(query: str, namespace: str):
-    contexts, sources = retrieve_chunks(query, namespace)
+TIMED_OUT_ANSWER = "The answer could not be generated in time. Please try again."
+
+_flights = SingleFlight("query")
+_aflights = AsyncSingleFlight("query")
+
+
+def _flight_key(query: str, namespace: str, top_k: int) -> tuple:
+    return namespace, normalize_question(query), top_k
+
+
+def _shared(result: dict, shared: bool) -> dict:
+    # Coalesced callers consumed no retrieval or LLM call of their own
+    return {**result, "coalesced": shared}
+
+
+def run_rag(query: str, namespace: str, top_k: int = 5):
+    """
+    Answers a question. Concurrent calls for the same (namespace,
+    normalised question, top_k) share one retrieval and generation.
+    Everything runs under a deadline of query_deadline_seconds: an
+    answer cut short by it is returned partial, with timed_out set.
+    """
+    with deadline_scope(settings.query_deadline_seconds):
+        if not settings.query_singleflight_enabled:
+            return _shared(_run_rag(query, namespace, top_k), False)
+
+        try:
+            return _shared(*_flights.do(
+                _flight_key(query, namespace, top_k),
+                lambda: _run_rag(query, namespace, top_k)
+            ))
+        except RateLimited as e:
+            if e.tenant == get_tenant():
+                raise
+            # The call we joined hit another tenant's limit: run our own
+            return _shared(_run_rag(query, namespace, top_k), False)
+
+
+def _run_rag(query: str, namespace: str, top_k: int):
+    cache_key = answer_cache_key(namespace, query, top_k, MODEL_NAME)
+    cached = get_cached_answer(cache_key)
+
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    with timed(STAGE_SECONDS, pipeline="query", stage="retrieve"):
+        contexts, sources, backends = retrieve_chunks(query, namespace, top_k)
 
     if not contexts:
         return {
             "answer": "No relevant information found in your documents.",
-            "sources": []
+            "sources": [],
+            "backends": backends,
+            "prompt_tokens": 0,
+            "cached": False
         }
 
-    context_block = "\n\n".join(contexts)
+    prompt, sources, prompt_tokens = _build_prompt(contexts, sources, query)
 
-    prompt = prompt_template.format(
-        context=context_block,
-        question=query
-    )
+    try:
+        answer = generate_answer(prompt)
+        timed_out = False
+    except DeadlineExceeded as e:
+        answer = e.partial or TIMED_OUT_ANSWER
+        timed_out = True
 
-    answer = generate_answer(prompt)
+    result = {
+        "answer": answer,
+        "sources": sources,
+        "backends": backends,
+        "prompt_tokens": prompt_tokens,
+        "timed_out": timed_out
+    }
 
-    return {
+    if not timed_out:
+        _maybe_cache(cache_key, result)
+
+    return {**result, "cached": False}
+
+
+async def arun_rag(query: str, namespace: str, top_k: int = 5):
+    """
+    Async variant of run_rag
+    """
+    with deadline_scope(settings.query_deadline_seconds):
+        if not settings.query_singleflight_enabled:
+            return _shared(await _arun_rag(query, namespace, top_k), False)
+
+        try:
+            return _shared(*await _aflights.do(
+                _flight_key(query, namespace, top_k),
+                lambda: _arun_rag(query, namespace, top_k)
+            ))
+        except RateLimited as e:
+            if e.tenant == get_tenant():
+                raise
+            return _shared(await _arun_rag(query, namespace, top_k), False)
+
+
+async def _arun_rag(query: str, namespace: str, top_k: int):
+    cache_key = answer_cache_key(namespace, query, top_k, MODEL_NAME)
+    cached = get_cached_answer(cache_key)
+
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    with timed(STAGE_SECONDS, pipeline="query", stage="retrieve"):
+        contexts, sources, backends = await aretrieve_chunks(query, namespace, top_k)
+
+    if not contexts:
+        return {
+            "answer": "No relevant information found in your documents.",
+            "sources": [],
+            "backends": backends,
+            "prompt_tokens": 0,
+            "cached": False
+        }
+
+    prompt, sources, prompt_tokens = _build_prompt(contexts, sources, query)
+
+    try:
+        answer = await agenerate_answer(prompt)
+        timed_out = False
+    except DeadlineExceeded as e:
+        answer = e.partial or TIMED_OUT_ANSWER
+        timed_out = True
+
+    result = {
         "answer": answer,
-        "sources": sources
+        "sources": sources,
+        "backends": backends,
+        "prompt_tokens": prompt_tokens,
+        "timed_out": timed_out
     }
+
+    if not timed_out:
+        _maybe_cache(cache_key, result)
+
+    return {**result, "cached": False}
+
+
+async def arun_rag_batch(questions: list[str], namespace: str, top_k: int = 5) -> dict:
+    """
+    Answers many questions concurrently (bounded by batch_query_parallelism).
+    Questions that normalise to the same text are answered once. Batches
+    wait for the caller's share of the LLM and search backends instead of
+    being refused.
+    """
+    started = time.perf_counter()
+
+    unique = {}
+    for question in questions:
+        unique.setdefault(normalize_question(question), question)
+
+    limit = asyncio.Semaphore(settings.batch_query_parallelism)
+
+    async def answer(question: str) -> dict:
+        async with limit:
+            t0 = time.perf_counter()
+            try:
+                result = await arun_rag(query=question, namespace=namespace, top_k=top_k)
+                error = None
+            except Exception as e:
+                result = None
+                error = str(e)
+            return _outcome(result, error, t0)
+
+    # The batch counts as one call against the tenant's LLM rate; its
+    # questions then only wait for their fair share of capacity
+    admit("llm")
+    with tenant_scope(patient=True, admitted=True):
+        tasks = [asyncio.ensure_future(answer(q)) for q in unique.values()]
+    answered = dict(zip(unique.keys(), await asyncio.gather(*tasks)))
+
+    return _batch_response(questions, unique, answered, started)
+
+
+async def astream_rag(query: str, namespace: str, top_k: int = 5):
+    """
+    Same pipeline as arun_rag, but yields (event, data) pairs:
+    "sources" once retrieval is done, then "token" per answer fragment,
+    then "done". Runs under a deadline of query_deadline_seconds like
+    run_rag: past it the answer stream is cancelled and "done" reports
+    timed_out.
+    """
+    cache_key = answer_cache_key(namespace, query, top_k, MODEL_NAME)
+    cached = get_cached_answer(cache_key)
+
+    if cached is not None:
+        yield "sources", {
+            "sources": cached["sources"],
+            "backends": cached["backends"],
+            "prompt_tokens": cached["prompt_tokens"],
+            "cached": True
+        }
+        yield "token", {"text": cached["answer"]}
+        yield "done", {"cached": True}
+        return
+
+    # The scope can't stay open across yields, so it only covers
+    # retrieval; the answer stream is given its deadline explicitly
+    with deadline_scope(settings.query_deadline_seconds):
+        expires = deadline_at()
+        with timed(STAGE_SECONDS, pipeline="query", stage="retrieve"):
+            contexts, sources, backends = await aretrieve_chunks(query, namespace, top_k)
+
+    if not contexts:
+        yield "sources", {
+            "sources": [],
+            "backends": backends,
+            "prompt_tokens": 0,
+            "cached": False
+        }
+        yield "token", {"text": "No relevant information found in your documents."}
+        yield "done", {"cached": False}
+        return
+
+    prompt, sources, prompt_tokens = _build_prompt(contexts, sources, query)
+
+    yield "sources", {
+        "sources": sources,
+        "backends": backends,
+        "prompt_tokens": prompt_tokens,
+        "cached": False
+    }
+
+    parts = []
+    timed_out = False
+    try:
+        async for token in astream_answer(prompt, deadline=expires):
+            parts.append(token)
+            yield "token", {"text": token}
+    except DeadlineExceeded:
+        timed_out = True
+        if not parts:
+            yield "token", {"text": TIMED_OUT_ANSWER}
+
+    if not timed_out:
+        _maybe_cache(cache_key, {
+            "answer": "".join(parts),
+            "sources": sources,
+            "backends": backends,
+            "prompt_tokens": prompt_tokens
+        })
+
+    yield "done", {"cached": False, "timed_out": timed_out}
+
+
+def _outcome(result, error, started: float) -> dict:
+    return {
+        "result": result,
+        "error": error,
+        "latency_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+def _batch_response(questions: list[str], unique: dict, answered: dict, started: float) -> dict:
+    results = []
+    for question in questions:
+        outcome = answered[normalize_question(question)]
+        result = outcome["result"] or {}
+        results.append({
+            "question": question,
+            "answer": result.get("answer"),
+            "sources": result.get("sources", []),
+            "prompt_tokens": result.get("prompt_tokens", 0),
+            "cached": result.get("cached", False),
+            "coalesced": result.get("coalesced", False),
+            "timed_out": result.get("timed_out", False),
+            "latency_ms": outcome["latency_ms"],
+            "error": outcome["error"]
+        })
+
+    latencies = sorted(o["latency_ms"] for o in answered.values())
+
+    return {
+        "results": results,
+        "timing": {
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+            "questions": len(questions),
+            "unique_questions": len(unique),
+            "failed": sum(1 for o in answered.values() if o["error"]),
+            "mean_ms": round(sum(latencies) / len(latencies), 1) if latencies else 0.0,
+            "max_ms": latencies[-1] if latencies else 0.0
+        }
+    }
+
+
+def _build_prompt(contexts: list[str], sources: list[dict], query: str):
+    """
+    Returns the prompt, the sources that made it into the context and
+    the prompt size in tokens
+    """
+    with timed(STAGE_SECONDS, pipeline="query", stage="pack"):
+        context_block, used = pack_context(contexts, sources)
+
+        prompt = prompt_template.format(
+            context=context_block,
+            question=query
+        )
+        prompt_tokens = count_tokens(prompt)
+
+    PROMPT_TOKENS.observe(prompt_tokens)
+    used_sources = [
+        {k: v for k, v in sources[pos].items() if k not in LINK_FIELDS}
+        for pos in used
+    ]
+    return prompt, used_sources, prompt_tokens
+
+
+def _maybe_cache(cache_key, result: dict):
+    # Only cache answers built from every configured backend
+    if all(status in ("ok", "disabled") for status in result["backends"].values()):
+        set_cached_answer(cache_key, result)
@@ -1,60 +1,46 @@
-from pinecone import Pinecone
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
 from app.core.config import settings
+from app.core.metrics import RETRIEVAL_HITS, RETRIEVAL_SEARCHES, STAGE_SECONDS, timed
+from app.services.deadline import bound, exceeded, expired
+from app.services.hedging import ahedged, run_hedged
+from app.services.scheduler import ascheduled, scheduled
+from app.services.vector_backends import get_dense_store, get_sparse_store
 
-pc = Pinecone(api_key=settings.pinecone_api_key)
+# ---- Toggle (semantic-only by default) ----
+USE_HYBRID = True
 
-# ---- Dense index (required) ----
-dense_index = pc.Index(host=settings.pinecone_index_host)
+SEARCH_FIELDS = ["text", "document_id", "filename", "chunk_index", "page", "chunk_hash", "prev_chunk"]
 
-# ---- Sparse index (optional) ----
-sparse_index = None
-if hasattr(settings, "pinecone_sparse_index_host") and settings.pinecone_sparse_index_host:
-    sparse_index = pc.Index(host=settings.pinecone_sparse_index_host)
+# Shared pool so dense and sparse searches run side by side
+_search_pool = ThreadPoolExecutor(
+    max_workers=settings.retrieval_pool_size,
+    thread_name_prefix="retrieval"
+)
 
-# ---- Toggle (semantic-only by default) ----
-USE_HYBRID = True
 
+def _search(name: str, store, query: str, namespace: str, top_k: int):
+    with timed(STAGE_SECONDS, pipeline="retrieval", stage=name):
+        return store.search(namespace, query, top_k, SEARCH_FIELDS)
 
-def retrieve_chunks(
-    query: str,
-    namespace: str,
-    top_k: int = 5
-):
-    """
-    Returns:
-      contexts: List[str]
-      sources: List[{filename, chunk_index, score}]
-    """
 
-    # ---------- SEMANTIC SEARCH (always runs) ----------
-    dense_response = dense_index.search(
-        namespace=namespace,
-        query={
-            "inputs": {"text": query},
-            "top_k": top_k if not USE_HYBRID else top_k * 4
-        },
-        fields=["text", "filename", "chunk_index"]
-    )
-
-    dense_hits = dense_response.get("result", {}).get("hits", [])
-
-    all_hits = dense_hits
-
-    # ---------- SPARSE SEARCH (only if enabled & exists) ----------
-    if USE_HYBRID and sparse_index is not None:
-        sparse_response = sparse_index.search(
-            namespace=namespace,
-            query={
-                "inputs": {"text": query},
-                "top_k": top_k * 4
-            },
-            fields=["text", "filename", "chunk_index"]
-        )
+async def _asearch(name: str, store, query: str, namespace: str, top_k: int):
+    with timed(STAGE_SECONDS, pipeline="retrieval", stage=name):
+        return await store.asearch(namespace, query, top_k, SEARCH_FIELDS)
 
-        sparse_hits = sparse_response.get("result", {}).get("hits", [])
-        all_hits = dense_hits + sparse_hits
 
-    # ---------- MERGE & DEDUPLICATE ----------
+def _record_search(name: str, status: str, hits: int):
+    RETRIEVAL_SEARCHES.inc(backend=name, status=status)
+    if hits:
+        RETRIEVAL_HITS.inc(hits, backend=name)
+
+
+def merge_hits(all_hits: list[dict], top_k: int) -> list[dict]:
+    """
+    Deduplicates hits by id (keeping the best score) and returns the top_k
+    """
     merged = {}
 
     for hit in all_hits:
@@ -68,28 +54,159 @@ def retrieve_chunks(
         if _id not in merged or merged[_id]["score"] < score:
             merged[_id] = {
                 "text": fields["text"],
+                "document_id": fields.get("document_id"),
                 "filename": fields.get("filename", "unknown"),
                 "chunk_index": fields.get("chunk_index", -1),
+                "page": fields.get("page"),
+                "chunk_hash": fields.get("chunk_hash"),
+                "prev_chunk": fields.get("prev_chunk"),
                 "score": score,
             }
 
-    # ---------- SORT & TRIM ----------
-    ranked = sorted(
+    return sorted(
         merged.values(),
         key=lambda x: x["score"],
         reverse=True
     )[:top_k]
 
-    # ---------- FINAL OUTPUT (UNCHANGED FORMAT) ----------
+
+def retrieve_chunks(
+    query: str,
+    namespace: str,
+    top_k: int = 5
+):
+    """
+    Returns:
+      contexts: List[str]
+      sources: List[{document_id, filename, chunk_index, page, score,
+                     chunk_hash, prev_chunk}] (the last two for merge_adjacent)
+      backends: {backend: "ok" | "timeout" | "error" | "disabled"}
+    """
+    with scheduled("search"):
+        return _retrieve_chunks(query, namespace, top_k)
+
+
+def _retrieve_chunks(query: str, namespace: str, top_k: int):
+    dense_store = get_dense_store()
+    sparse_store = get_sparse_store()
+    hybrid = USE_HYBRID and sparse_store is not None
+
+    # ---------- ISSUE SEARCHES CONCURRENTLY (hedged) ----------
+    # Each backend waits at most its own timeout, and never past the
+    # request deadline
+    calls = {
+        "dense": partial(
+            _search, "dense", dense_store, query, namespace,
+            top_k * 4 if USE_HYBRID else top_k
+        )
+    }
+    timeouts = {"dense": bound(settings.dense_search_timeout)}
+
+    if hybrid:
+        calls["sparse"] = partial(
+            _search, "sparse", sparse_store, query, namespace, top_k * 4
+        )
+        timeouts["sparse"] = bound(settings.sparse_search_timeout)
+
+    outcomes = run_hedged(_search_pool, calls, timeouts)
+
+    # ---------- COLLECT (degrade to whatever answered in time) ----------
+    backends = {"dense": "disabled", "sparse": "disabled"}
+    all_hits = []
+    dense_error = None
+
+    for name, (status, value) in outcomes.items():
+        hits = value if status == "ok" else []
+        backends[name] = status
+        all_hits.extend(hits)
+        if name == "dense" and status == "error":
+            dense_error = value
+        _record_search(name, status, len(hits))
+
+    return _finish(all_hits, backends, dense_error, top_k)
+
+
+async def aretrieve_chunks(
+    query: str,
+    namespace: str,
+    top_k: int = 5
+):
+    """
+    Async variant of retrieve_chunks; same return values
+    """
+    async with ascheduled("search"):
+        return await _aretrieve_chunks(query, namespace, top_k)
+
+
+async def _aretrieve_chunks(query: str, namespace: str, top_k: int):
+    dense_store = get_dense_store()
+    sparse_store = get_sparse_store()
+    hybrid = USE_HYBRID and sparse_store is not None
+
+    async def run(name, store, k, timeout):
+        status, value = await ahedged(
+            name,
+            partial(_asearch, name, store, query, namespace, k),
+            bound(timeout)
+        )
+        if status == "ok":
+            return name, value, status, None
+        return name, [], status, value
+
+    # ---------- ISSUE SEARCHES CONCURRENTLY (hedged) ----------
+    searches = [
+        run(
+            "dense", dense_store,
+            top_k * 4 if USE_HYBRID else top_k,
+            settings.dense_search_timeout
+        )
+    ]
+    if hybrid:
+        searches.append(
+            run("sparse", sparse_store, top_k * 4, settings.sparse_search_timeout)
+        )
+
+    # ---------- COLLECT (degrade to whatever answered in time) ----------
+    backends = {"dense": "disabled", "sparse": "disabled"}
+    all_hits = []
+    dense_error = None
+
+    for name, hits, status, error in await asyncio.gather(*searches):
+        backends[name] = status
+        _record_search(name, status, len(hits))
+        all_hits.extend(hits)
+        if name == "dense" and error is not None:
+            dense_error = error
+
+    return _finish(all_hits, backends, dense_error, top_k)
+
+
+def _finish(all_hits: list[dict], backends: dict, dense_error, top_k: int):
+    if "ok" not in backends.values():
+        if dense_error is not None:
+            raise dense_error
+        if expired():
+            raise exceeded("retrieval")
+        raise TimeoutError("Vector search timed out")
+
+    # ---------- MERGE, DEDUPLICATE, SORT & TRIM ----------
+    with timed(STAGE_SECONDS, pipeline="retrieval", stage="merge"):
+        ranked = merge_hits(all_hits, top_k)
+
+    # ---------- FINAL OUTPUT ----------
     contexts = [r["text"] for r in ranked]
 
     sources = [
         {
+            "document_id": r["document_id"],
             "filename": r["filename"],
             "chunk_index": r["chunk_index"],
+            "page": r["page"],
             "score": r["score"],
+            "chunk_hash": r["chunk_hash"],
+            "prev_chunk": r["prev_chunk"],
         }
         for r in ranked
     ]
 
-    return contexts, sources
+    return contexts, sources, backends
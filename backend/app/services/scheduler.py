@@ -0,0 +1,455 @@
+"""
+Per-tenant fair scheduling of calls to shared backends: the LLM, vector
+search and vector upserts.
+
+Each resource has a global concurrency cap. Calls beyond it queue, and
+freed slots go to queued calls in start-time fair queuing order: every
+call is tagged with a virtual start time, max(now, the tenant's previous
+tag + 1 / weight), and the lowest tag runs next. A tenant with a deep
+backlog therefore gets its weighted share while a tenant that has just
+arrived is served next. Each tenant also has a token bucket per
+resource.
+
+Calls over the rate, over the per-tenant queue limit or queued longer
+than `scheduler_queue_timeout` raise RateLimited, which the API turns
+into 429 with Retry-After. Patient callers (ingestion jobs, batch
+queries) wait for capacity and tokens instead. Either way no call waits
+past the request deadline (DeadlineExceeded).
+
+A batch query is charged one token up front (`admit`) and its calls,
+made in an `admitted` scope, skip the token buckets: the rates are sized
+for interactive requests, and a batch drawing one token per question
+would crawl at the tenant rate and leave none for the user's own
+queries. Its calls still queue under the concurrency caps, in fair order.
+
+The tenant and patience are read from context variables, set per
+request (the authenticated user) or per job (its owner); calls made
+outside both belong to the "system" tenant, which is always patient
+and has no rate limit.
+"""
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from app.core.clients import get_client, register_client
+from app.core.config import settings
+from app.core.metrics import (
+    SCHEDULER_ACTIVE,
+    SCHEDULER_QUEUED,
+    SCHEDULER_REJECTIONS,
+    SCHEDULER_WAIT_SECONDS
+)
+from app.services.deadline import bound, exceeded, expired, remaining
+
+SYSTEM_TENANT = "system"
+RESOURCES = ("llm", "search", "upsert")
+
+_tenant: ContextVar[Optional[str]] = ContextVar("scheduler_tenant", default=None)
+_patient: ContextVar[bool] = ContextVar("scheduler_patient", default=False)
+_admitted: ContextVar[bool] = ContextVar("scheduler_admitted", default=False)
+
+
+def set_tenant(tenant) -> None:
+    """
+    Attributes calls made from the current context to `tenant`
+    """
+    _tenant.set(str(tenant))
+
+
+def get_tenant() -> str:
+    return _tenant.get() or SYSTEM_TENANT
+
+
+@contextmanager
+def tenant_scope(tenant=None, patient: Optional[bool] = None, admitted: Optional[bool] = None):
+    """
+    Sets the tenant, patience and/or admission (calls already paid for:
+    no token bucket) for the calls made in the block
+    """
+    tokens = []
+    if tenant is not None:
+        tokens.append((_tenant, _tenant.set(str(tenant))))
+    if patient is not None:
+        tokens.append((_patient, _patient.set(patient)))
+    if admitted is not None:
+        tokens.append((_admitted, _admitted.set(admitted)))
+    try:
+        yield
+    finally:
+        for var, token in reversed(tokens):
+            var.reset(token)
+
+
+class RateLimited(Exception):
+    """
+    A call was refused: `reason` is rate, queue_full or timeout, and
+    `retry_after` the suggested wait in seconds
+    """
+
+    def __init__(self, resource: str, tenant: str, reason: str, retry_after: float):
+        super().__init__(f"Too many {resource} requests ({reason}); retry in {retry_after:.1f}s")
+        self.resource = resource
+        self.tenant = tenant
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+
+    def take(self, now: float) -> float:
+        """
+        Takes a token and returns 0, or returns the seconds until one is
+        available (taking nothing)
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class _Tenant:
+    __slots__ = ("name", "weight", "bucket", "finish", "queued", "active")
+
+    def __init__(self, name: str, weight: float, bucket: Optional[_TokenBucket]):
+        self.name = name
+        self.weight = weight
+        self.bucket = bucket
+        self.finish = 0.0  # virtual finish tag of the tenant's last call
+        self.queued = 0
+        self.active = 0
+
+
+class _Waiter:
+    """
+    A call waiting for a slot; woken through a threading.Event or, for
+    async callers, a future on their event loop
+    """
+    __slots__ = ("tenant", "enqueued", "state", "event", "loop", "future")
+
+    def __init__(self, tenant: _Tenant, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.tenant = tenant
+        self.enqueued = time.monotonic()
+        self.state = "new"  # new / queued / granted / abandoned
+        self.loop = loop
+        self.event = None if loop else threading.Event()
+        self.future = loop.create_future() if loop else None
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(_resolve, self.future)
+
+
+def _resolve(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+class FairScheduler:
+    """
+    Concurrency cap, weighted fair queue and per-tenant token buckets for
+    one resource. Usable from threads (`slot`) and coroutines (`aslot`).
+    """
+
+    def __init__(
+        self,
+        resource: str,
+        capacity: int,
+        rate: float = 0.0,
+        burst: int = 0,
+        max_queued: int = 16,
+        queue_timeout: float = 10.0,
+        weights: Optional[dict] = None
+    ):
+        self.resource = resource
+        self.capacity = capacity
+        self.rate = rate
+        self.burst = burst
+        self.max_queued = max_queued
+        self.queue_timeout = queue_timeout
+        self.weights = weights or {}
+        self._tenants = {}
+        self._queue = []  # (start tag, seq, waiter)
+        self._seq = itertools.count()
+        self._vtime = 0.0
+        self._active = 0
+        self._service_time = 1.0  # moving average of slot hold time
+        self._lock = threading.Lock()
+
+    def _tenant(self, name: str) -> _Tenant:
+        tenant = self._tenants.get(name)
+        if tenant is None:
+            # Calls outside any request or job are capped but not rate limited
+            limited = self.rate > 0 and name != SYSTEM_TENANT
+            bucket = _TokenBucket(self.rate, self.burst) if limited else None
+            tenant = self._tenants[name] = _Tenant(name, float(self.weights.get(name, 1.0)), bucket)
+        return tenant
+
+    def _reject(self, tenant: _Tenant, reason: str, retry_after: float):
+        SCHEDULER_REJECTIONS.inc(resource=self.resource, tenant=tenant.name, reason=reason)
+        raise RateLimited(self.resource, tenant.name, reason, retry_after)
+
+    # ---------- admission (under self._lock) ----------
+
+    def _admit(self, waiter: _Waiter, patient: bool, charge: bool = True) -> float:
+        """
+        Grants a slot or queues the waiter. Returns 0, or (for patient
+        callers over the rate) the seconds to wait before trying again.
+        Without `charge` the token bucket is skipped.
+        """
+        tenant = waiter.tenant
+        if tenant.bucket is not None and charge:
+            delay = tenant.bucket.take(time.monotonic())
+            if delay:
+                if patient:
+                    return delay
+                self._reject(tenant, "rate", delay)
+
+        if not patient and tenant.queued >= self.max_queued and self._active >= self.capacity:
+            if tenant.bucket is not None and charge:
+                tenant.bucket.refund()
+            self._reject(tenant, "queue_full", max(1.0, tenant.queued * self._service_time / self.capacity))
+
+        start = max(self._vtime, tenant.finish)
+        tenant.finish = start + 1.0 / tenant.weight
+
+        if self._active < self.capacity and not self._queue:
+            self._vtime = start
+            self._grant(waiter)
+        else:
+            waiter.state = "queued"
+            tenant.queued += 1
+            SCHEDULER_QUEUED.inc(resource=self.resource, tenant=tenant.name)
+            heapq.heappush(self._queue, (start, next(self._seq), waiter))
+        return 0.0
+
+    def _grant(self, waiter: _Waiter):
+        tenant = waiter.tenant
+        if waiter.state == "queued":
+            tenant.queued -= 1
+            SCHEDULER_QUEUED.dec(resource=self.resource, tenant=tenant.name)
+        waiter.state = "granted"
+        self._active += 1
+        tenant.active += 1
+        SCHEDULER_ACTIVE.inc(resource=self.resource, tenant=tenant.name)
+        SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - waiter.enqueued, resource=self.resource, tenant=tenant.name)
+        waiter.enqueued = time.monotonic()  # now the start of the hold
+
+    def _dispatch(self):
+        while self._queue and self._active < self.capacity:
+            start, _, waiter = heapq.heappop(self._queue)
+            if waiter.state != "queued":
+                continue
+            self._vtime = start
+            self._grant(waiter)
+            waiter.wake()
+
+    def _release(self, waiter: _Waiter):
+        tenant = waiter.tenant
+        with self._lock:
+            held = time.monotonic() - waiter.enqueued
+            self._service_time += 0.1 * (held - self._service_time)
+            self._active -= 1
+            tenant.active -= 1
+            SCHEDULER_ACTIVE.dec(resource=self.resource, tenant=tenant.name)
+            self._dispatch()
+
+    def _give_up(self, waiter: _Waiter) -> bool:
+        """
+        Takes a queued waiter out of the queue; False if it was granted
+        a slot meanwhile
+        """
+        with self._lock:
+            if waiter.state != "queued":
+                return False
+            waiter.state = "abandoned"
+            waiter.tenant.queued -= 1
+            SCHEDULER_QUEUED.dec(resource=self.resource, tenant=waiter.tenant.name)
+            return True
+
+    def _check_delay(self, delay: float):
+        # A patient caller over the rate: give up now if the tokens come
+        # after the request deadline
+        left = remaining()
+        if left is not None and delay >= left:
+            raise exceeded(f"{self.resource}_queue")
+
+    def _timed_out(self, waiter: _Waiter):
+        if expired():
+            raise exceeded(f"{self.resource}_queue")
+        self._reject(waiter.tenant, "timeout", self._service_time)
+
+    def admit(self, tenant: str):
+        """
+        Takes one token from the tenant's bucket without taking a slot,
+        for work that then runs admitted; RateLimited if there is none
+        """
+        with self._lock:
+            state = self._tenant(tenant)
+            if state.bucket is None:
+                return
+            delay = state.bucket.take(time.monotonic())
+            if delay:
+                self._reject(state, "rate", delay)
+
+    # ---------- sync ----------
+
+    def acquire(self, tenant: str, patient: bool = False, charge: bool = True) -> _Waiter:
+        patient = patient or tenant == SYSTEM_TENANT
+        while True:
+            with self._lock:
+                waiter = _Waiter(self._tenant(tenant))
+                delay = self._admit(waiter, patient, charge)
+            if not delay:
+                break
+            self._check_delay(delay)
+            time.sleep(delay)
+
+        if waiter.state == "queued":
+            timeout = bound(None if patient else self.queue_timeout)
+            if not waiter.event.wait(timeout) and self._give_up(waiter):
+                self._timed_out(waiter)
+        return waiter
+
+    @contextmanager
+    def slot(self, tenant: Optional[str] = None, patient: Optional[bool] = None):
+        waiter = self.acquire(
+            tenant or get_tenant(),
+            _patient.get() if patient is None else patient,
+            charge=not _admitted.get()
+        )
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    # ---------- async ----------
+
+    async def aacquire(self, tenant: str, patient: bool = False, charge: bool = True) -> _Waiter:
+        loop = asyncio.get_running_loop()
+        patient = patient or tenant == SYSTEM_TENANT
+        while True:
+            with self._lock:
+                waiter = _Waiter(self._tenant(tenant), loop)
+                delay = self._admit(waiter, patient, charge)
+            if not delay:
+                break
+            self._check_delay(delay)
+            await asyncio.sleep(delay)
+
+        if waiter.state == "queued":
+            try:
+                timeout = bound(None if patient else self.queue_timeout)
+                await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+            except asyncio.TimeoutError:
+                if self._give_up(waiter):
+                    self._timed_out(waiter)
+            except asyncio.CancelledError:
+                if not self._give_up(waiter):
+                    self._release(waiter)
+                raise
+        return waiter
+
+    @asynccontextmanager
+    async def aslot(self, tenant: Optional[str] = None, patient: Optional[bool] = None):
+        waiter = await self.aacquire(
+            tenant or get_tenant(),
+            _patient.get() if patient is None else patient,
+            charge=not _admitted.get()
+        )
+        try:
+            yield
+        finally:
+            self._release(waiter)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "capacity": self.capacity,
+                "active": self._active,
+                "queued": sum(t.queued for t in self._tenants.values()),
+                "tenants": {
+                    t.name: {"active": t.active, "queued": t.queued}
+                    for t in self._tenants.values()
+                    if t.active or t.queued
+                },
+            }
+
+
+def _build(resource: str) -> FairScheduler:
+    return FairScheduler(
+        resource,
+        capacity=getattr(settings, f"{resource}_max_concurrency"),
+        rate=getattr(settings, f"{resource}_tenant_rate"),
+        burst=getattr(settings, f"{resource}_tenant_burst"),
+        max_queued=settings.scheduler_max_queued_per_tenant,
+        queue_timeout=settings.scheduler_queue_timeout,
+        weights=settings.scheduler_tenant_weights
+    )
+
+
+for _resource in RESOURCES:
+    register_client(f"scheduler:{_resource}", lambda resource=_resource: _build(resource))
+
+
+def get_scheduler(resource: str) -> FairScheduler:
+    return get_client(f"scheduler:{resource}")
+
+
+def admit(resource: str):
+    """
+    Charges the current tenant one call of `resource` for a batch whose
+    calls then run in tenant_scope(admitted=True)
+    """
+    if settings.scheduler_enabled:
+        get_scheduler(resource).admit(get_tenant())
+
+
+def hold(resource: str) -> Callable[[], None]:
+    """
+    Takes a slot of `resource` for the current tenant and returns the
+    function that gives it back, for work that outlives the caller's
+    block (handed to another thread)
+    """
+    if not settings.scheduler_enabled:
+        return lambda: None
+    scheduler = get_scheduler(resource)
+    waiter = scheduler.acquire(get_tenant(), _patient.get(), charge=not _admitted.get())
+    return lambda: scheduler._release(waiter)
+
+
+@contextmanager
+def scheduled(resource: str):
+    """
+    Holds a slot of `resource` for the current tenant during the block
+    """
+    if not settings.scheduler_enabled:
+        yield
+        return
+    with get_scheduler(resource).slot():
+        yield
+
+
+@asynccontextmanager
+async def ascheduled(resource: str):
+    if not settings.scheduler_enabled:
+        yield
+        return
+    async with get_scheduler(resource).aslot():
+        yield
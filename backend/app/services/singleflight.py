@@ -0,0 +1,90 @@
+"""
+Single-flight call coalescing: concurrent calls with the same key share
+one execution and all receive its result (or its exception).
+
+Unlike the answer cache this only covers calls that overlap in time, so
+it also protects the window before a cache entry exists.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Awaitable, Callable, Hashable
+
+from app.core.metrics import SINGLEFLIGHT_CALLS
+
+
+class SingleFlight:
+    """
+    Thread-based: the first caller for a key runs the function, callers
+    arriving while it runs block on its result
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: Hashable, fn: Callable):
+        """
+        Returns (result, shared): shared is False for the caller that ran fn
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+
+        SINGLEFLIGHT_CALLS.inc(flight=self.name, role="leader" if leader else "follower")
+        if not leader:
+            return call.result(), True
+
+        try:
+            result = fn()
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        else:
+            call.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+
+class AsyncSingleFlight:
+    """
+    Asyncio-based: the first caller for a key starts the coroutine as a
+    task, and every caller (the first included) awaits it shielded, so a
+    caller that goes away does not cancel the call for the others
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._calls = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable]):
+        """
+        Returns (result, shared): shared is False for the caller that started fn
+        """
+        task = self._calls.get(key)
+        leader = task is None
+        if leader:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finish(key, t))
+
+        SINGLEFLIGHT_CALLS.inc(flight=self.name, role="leader" if leader else "follower")
+        return await asyncio.shield(task), not leader
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieve it, so an error nobody awaited any more is not logged
+            task.exception()
+
+    def in_flight(self) -> int:
+        return len(self._calls)
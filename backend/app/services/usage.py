@@ -0,0 +1,219 @@
+import threading
+import time
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.usage import Usage, UsageDaily
+from app.services.context import count_tokens
+
+# INSERT ... ON CONFLICT DO UPDATE, per database dialect
+_UPSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+_ROLLUP_FIELDS = ("events", "tokens", "prompt_tokens", "completion_tokens", "latency_ms", "chunks")
+
+
+class UsageRecorder:
+    """
+    Buffers usage events in memory and writes them in bulk from a
+    background thread, so the request path never waits on the database.
+
+    The buffer is bounded. When it is full, the `drop` policy discards the
+    new event (counted in `dropped`); the `block` policy waits up to
+    `block_timeout` for the flusher to make room before dropping.
+    """
+
+    def __init__(
+        self,
+        max_events: int,
+        flush_interval: float,
+        flush_batch: int,
+        overflow_policy: str = "drop",
+        block_timeout: float = 0.05
+    ):
+        self.max_events = max_events
+        self.flush_interval = flush_interval
+        self.flush_batch = flush_batch
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+        self._events = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(
+        self,
+        user_id: int,
+        action: str,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        latency_ms: float = 0.0,
+        chunks: int = 0
+    ) -> bool:
+        """
+        Queues one event; returns False if it was dropped
+        """
+        event = {
+            "user_id": user_id,
+            "action": action,
+            "tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": latency_ms,
+            "chunks": chunks,
+            "created_at": datetime.utcnow(),
+        }
+
+        with self._cond:
+            if len(self._events) >= self.max_events and self.overflow_policy == "block":
+                self._cond.notify_all()
+                self._cond.wait_for(
+                    lambda: len(self._events) < self.max_events,
+                    timeout=self.block_timeout
+                )
+            if len(self._events) >= self.max_events:
+                self.dropped += 1
+                return False
+
+            self._events.append(event)
+            if len(self._events) >= self.flush_batch:
+                self._cond.notify_all()
+        return True
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run,
+            name="usage-flusher",
+            daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the flusher and writes out everything still buffered
+        """
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            while self.flush():
+                pass
+        except Exception:
+            traceback.print_exc()
+
+    def _run(self):
+        while not self._stop.is_set():
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stop.is_set() or len(self._events) >= self.flush_batch,
+                    timeout=self.flush_interval
+                )
+            try:
+                while self.flush() >= self.flush_batch:
+                    pass
+            except Exception:
+                traceback.print_exc()
+                time.sleep(self.flush_interval)
+
+    def _take(self) -> list[dict]:
+        with self._cond:
+            batch = []
+            while self._events and len(batch) < self.flush_batch:
+                batch.append(self._events.popleft())
+            self._cond.notify_all()
+        return batch
+
+    def flush(self) -> int:
+        """
+        Writes one batch of buffered events plus their daily roll-ups.
+        Returns the number of events written.
+        """
+        events = self._take()
+        if not events:
+            return 0
+
+        totals = {}
+        for e in events:
+            key = (e["user_id"], e["created_at"].date(), e["action"])
+            t = totals.setdefault(key, dict.fromkeys(_ROLLUP_FIELDS, 0))
+            t["events"] += 1
+            for field in _ROLLUP_FIELDS[1:]:
+                t[field] += e[field]
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(Usage), events)
+            db.execute(_rollup_statement(db.get_bind().dialect.name, totals))
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put the batch back so it is retried on the next flush
+            with self._cond:
+                self._events.extendleft(reversed(events))
+            raise
+        finally:
+            db.close()
+
+        return len(events)
+
+
+def _rollup_statement(dialect: str, totals: dict):
+    """
+    Adds the totals to their usage_daily rows in one upsert, so
+    concurrent flushers (other workers or processes) can't lose each
+    other's increments
+    """
+    statement = _UPSERTS[dialect](UsageDaily).values([
+        {"user_id": user_id, "day": day, "action": action, **t}
+        for (user_id, day, action), t in totals.items()
+    ])
+    return statement.on_conflict_do_update(
+        index_elements=["user_id", "day", "action"],
+        set_={
+            field: func.coalesce(getattr(UsageDaily, field), 0) + statement.excluded[field]
+            for field in _ROLLUP_FIELDS
+        }
+    )
+
+
+usage_recorder = UsageRecorder(
+    max_events=settings.usage_buffer_size,
+    flush_interval=settings.usage_flush_interval,
+    flush_batch=settings.usage_flush_batch,
+    overflow_policy=settings.usage_overflow_policy,
+    block_timeout=settings.usage_block_timeout
+)
+
+
+def record_usage(user_id: Optional[int], action: str, **fields) -> bool:
+    if user_id is None:
+        return False
+    return usage_recorder.record(user_id, action, **fields)
+
+
+def record_query_usage(user_id: int, result: dict, latency_ms: float, action: str = "query") -> bool:
+    """
+    Records a RAG answer; cached and coalesced answers consumed no LLM
+    tokens
+    """
+    cached = result.get("cached", False) or result.get("coalesced", False)
+    return record_usage(
+        user_id,
+        action,
+        prompt_tokens=0 if cached else result.get("prompt_tokens", 0),
+        completion_tokens=0 if cached else count_tokens(result.get("answer") or ""),
+        latency_ms=latency_ms,
+        chunks=len(result.get("sources", []))
+    )
@@ -0,0 +1,99 @@
+from typing import Optional
+
+from app.core.clients import get_client, override_client, register_client
+from app.core.config import settings
+from app.services.vector_backends.base import VectorStore
+
+
+def _build_pinecone():
+    from pinecone import Pinecone
+
+    return Pinecone(api_key=settings.pinecone_api_key)
+
+
+def _build_lexical() -> Optional[VectorStore]:
+    if not settings.lexical_index_enabled:
+        return None
+
+    from app.services.vector_backends.bm25_store import BM25Store
+
+    return BM25Store(
+        root=settings.lexical_index_dir,
+        k1=settings.lexical_bm25_k1,
+        b=settings.lexical_bm25_b,
+        merge_factor=settings.lexical_merge_factor
+    )
+
+
+def _build_stores() -> dict:
+    backend = settings.vector_backend
+
+    if backend == "pinecone":
+        from app.services.vector_backends.pinecone_store import PineconeVectorStore
+
+        # One client (and connection pool) shared by every index handle
+        pc = get_client("pinecone")
+
+        def store(host: str) -> PineconeVectorStore:
+            return PineconeVectorStore(
+                pc.Index(host=host),
+                async_index_factory=lambda: pc.IndexAsyncio(host=host)
+            )
+
+        # ---- Dense index (required) ----
+        dense = store(settings.pinecone_index_host)
+
+        # ---- Sparse index (optional, hybrid-ready) ----
+        if settings.pinecone_sparse_index_host:
+            sparse = store(settings.pinecone_sparse_index_host)
+        else:
+            sparse = _build_lexical()
+
+        return {"dense": dense, "sparse": sparse}
+
+    if backend == "local":
+        from app.services.vector_backends.local_store import LocalVectorStore
+
+        dense = LocalVectorStore(
+            root=settings.local_index_dir,
+            dim=settings.local_embedding_dim,
+            ann_threshold=settings.local_ann_threshold
+        )
+        return {"dense": dense, "sparse": _build_lexical()}
+
+    raise ValueError(f"Unknown vector backend: {backend}")
+
+
+register_client("pinecone", _build_pinecone)
+register_client("vector_stores", _build_stores)
+
+
+def _get_stores() -> dict:
+    return get_client("vector_stores")
+
+
+def get_dense_store() -> VectorStore:
+    return _get_stores()["dense"]
+
+
+def get_sparse_store() -> Optional[VectorStore]:
+    return _get_stores()["sparse"]
+
+
+def get_vector_stores() -> dict:
+    """
+    Returns every configured store as {"dense": ..., "sparse": ...},
+    omitting the sparse store when there isn't one
+    """
+    return {
+        name: store
+        for name, store in _get_stores().items()
+        if store is not None
+    }
+
+
+def set_vector_stores(dense: VectorStore, sparse: Optional[VectorStore] = None) -> None:
+    """
+    Replaces the configured stores (e.g. with local stand-ins)
+    """
+    override_client("vector_stores", {"dense": dense, "sparse": sparse})
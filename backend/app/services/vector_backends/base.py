@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+import re
+
+_PLAIN_NAMESPACE = re.compile(r"[A-Za-z0-9_-]{1,64}")
+
+
+def namespace_dirname(namespace: str) -> str:
+    """
+    Directory name for a namespace in a backend that keeps one directory
+    per namespace. Plain names ("user_42") are used as they are; any other
+    name maps to a hash, whose "." can't occur in a plain name, so two
+    namespaces never share a directory and none can escape the root.
+    """
+    if _PLAIN_NAMESPACE.fullmatch(namespace):
+        return namespace
+    return "ns." + hashlib.sha256(namespace.encode("utf-8")).hexdigest()
+
+
+class VectorStore:
+    """
+    Interface every vector index backend implements.
+
+    Records are dicts with an `_id`, a `text` field and flat metadata.
+    Search hits use the Pinecone shape: {"_id", "_score", "fields"}.
+
+    The async methods default to running the sync ones on a worker thread;
+    backends with a native async client override them.
+    """
+
+    def upsert(self, namespace: str, records: list[dict]) -> None:
+        raise NotImplementedError
+
+    def search(
+        self,
+        namespace: str,
+        query: str,
+        top_k: int,
+        fields: list[str]
+    ) -> list[dict]:
+        raise NotImplementedError
+
+    def delete_document(self, namespace: str, document_id: int) -> None:
+        raise NotImplementedError
+
+    def delete_records(self, namespace: str, ids: list[str]) -> None:
+        raise NotImplementedError
+
+    def delete_legacy_records(self, namespace: str, document_id: int) -> None:
+        """
+        Deletes the document's records written before chunk manifests
+        (those without a prev_chunk field), leaving newer ones in place
+        """
+        raise NotImplementedError
+
+    def update_fields(self, namespace: str, updates: dict[str, dict]) -> None:
+        """
+        Sets metadata fields on existing records ({_id: fields}) without
+        re-embedding their text
+        """
+        raise NotImplementedError
+
+    def list_ids(self, namespace: str, prefix: str) -> list[str]:
+        """
+        Ids of all records in the namespace starting with `prefix`
+        """
+        raise NotImplementedError
+
+    def namespace_stats(self, namespace: str) -> dict:
+        raise NotImplementedError
+
+    async def aupsert(self, namespace: str, records: list[dict]) -> None:
+        await asyncio.to_thread(self.upsert, namespace, records)
+
+    async def asearch(
+        self,
+        namespace: str,
+        query: str,
+        top_k: int,
+        fields: list[str]
+    ) -> list[dict]:
+        return await asyncio.to_thread(self.search, namespace, query, top_k, fields)
+
+    async def adelete_document(self, namespace: str, document_id: int) -> None:
+        await asyncio.to_thread(self.delete_document, namespace, document_id)
+
+    async def adelete_records(self, namespace: str, ids: list[str]) -> None:
+        await asyncio.to_thread(self.delete_records, namespace, ids)
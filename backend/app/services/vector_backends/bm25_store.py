@@ -0,0 +1,602 @@
+import heapq
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+import traceback
+from collections import Counter, defaultdict
+from typing import Optional
+
+import numpy as np
+
+from app.services.vector_backends.base import VectorStore, namespace_dirname
+
+_TOKEN_RE = re.compile(r"\w+")
+_MAX_TF = np.iinfo(np.uint16).max
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+def _write_array(path: str, array: np.ndarray):
+    tmp = path + ".tmp"
+    array.tofile(tmp)
+    os.replace(tmp, path)
+
+
+def _read_array(path: str, dtype) -> np.ndarray:
+    # np.memmap cannot map an empty file
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype)
+    # A plain ndarray view of the mapping slices without memmap overhead
+    return np.memmap(path, dtype=dtype, mode="r").view(np.ndarray)
+
+
+def _write_json(path: str, data):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+class _Segment:
+    """
+    One immutable segment on disk:
+
+      terms.json    sorted term dictionary
+      offsets.i64   postings of term i are postings[offsets[i]:offsets[i + 1]]
+      postings.u32  segment row of every posting, ascending per term
+      freqs.u16     term frequency of every posting
+      lengths.u32   token count of every row
+      records.json  record fields per row
+
+    The arrays are memory-mapped. Deleted rows stay in the files (they are
+    only masked in `alive`) until the segment is merged away.
+    """
+
+    def __init__(self, path: str, dead: list[int] = ()):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(self._file("terms.json")) as f:
+            self.terms = {term: i for i, term in enumerate(json.load(f))}
+        with open(self._file("records.json")) as f:
+            self.records = json.load(f)
+        self.offsets = _read_array(self._file("offsets.i64"), np.int64)
+        self.postings = _read_array(self._file("postings.u32"), np.uint32)
+        self.freqs = _read_array(self._file("freqs.u16"), np.uint16)
+        self.lengths = _read_array(self._file("lengths.u32"), np.uint32)
+
+        self.alive = np.ones(len(self.records), dtype=bool)
+        self.alive[list(dead)] = False
+        self._norms = None
+        self._norms_key = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def count(self) -> int:
+        return len(self.records)
+
+    @property
+    def dead(self) -> list[int]:
+        return np.flatnonzero(~self.alive).tolist()
+
+    def postings_of(self, term: str):
+        i = self.terms.get(term)
+        if i is None:
+            return None
+        lo, hi = self.offsets[i], self.offsets[i + 1]
+        return self.postings[lo:hi], self.freqs[lo:hi]
+
+    def length_norms(self, k1: float, b: float, avgdl: float) -> np.ndarray:
+        """
+        k1 * (1 - b + b * length / avgdl) of every row, cached until the
+        average length changes
+        """
+        key = (k1, b, avgdl)
+        if self._norms_key != key:
+            self._norms = (k1 * (1 - b + b * self.lengths / avgdl)).astype(np.float32)
+            self._norms_key = key
+        return self._norms
+
+    def doc_freq(self, term: str) -> int:
+        i = self.terms.get(term)
+        return 0 if i is None else int(self.offsets[i + 1] - self.offsets[i])
+
+    def save_records(self):
+        _write_json(self._file("records.json"), self.records)
+
+    @staticmethod
+    def write(path: str, records: list[dict], postings: dict, lengths: np.ndarray):
+        _Segment.write_postings(path, postings, lengths)
+        _write_json(os.path.join(path, "records.json"), records)
+
+    @staticmethod
+    def write_postings(path: str, postings: dict, lengths: np.ndarray):
+        """
+        Writes everything but the records from {term: (rows, freqs)}
+        (rows ascending) and the row lengths
+        """
+        os.makedirs(path)
+        terms = sorted(postings)
+        sizes = [len(postings[term][0]) for term in terms]
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        rows = np.empty(offsets[-1], dtype=np.uint32)
+        freqs = np.empty(offsets[-1], dtype=np.uint16)
+        for i, term in enumerate(terms):
+            rows[offsets[i]:offsets[i + 1]], freqs[offsets[i]:offsets[i + 1]] = postings[term]
+
+        _write_array(os.path.join(path, "offsets.i64"), offsets)
+        _write_array(os.path.join(path, "postings.u32"), rows)
+        _write_array(os.path.join(path, "freqs.u16"), freqs)
+        _write_array(os.path.join(path, "lengths.u32"), lengths.astype(np.uint32))
+        _write_json(os.path.join(path, "terms.json"), terms)
+
+
+class _Namespace:
+    """
+    One namespace on disk: a directory of segments plus segments.json,
+    which lists the live segments and the deleted rows of each.
+
+    Every upsert writes a new segment; segments are merged in the
+    background (the smallest `merge_factor` at a time) once there are more
+    than `merge_factor` of them. Document frequencies count deleted rows
+    until their segment is merged, as in Lucene.
+
+    Opening a namespace only reads it: segments left by a write that never
+    committed are removed before this process writes its first one.
+    """
+
+    def __init__(self, path: str, merge_factor: int):
+        self.path = path
+        self.merge_factor = merge_factor
+        self.lock = threading.Lock()
+        self.merging = False
+        self._swept = False
+
+        state_path = os.path.join(path, "segments.json")
+        state = {"next": 0, "segments": []}
+        if os.path.exists(state_path):
+            with open(state_path) as f:
+                state = json.load(f)
+
+        self.next = state["next"]
+        self.segments = [
+            _Segment(os.path.join(path, s["name"]), s["dead"])
+            for s in state["segments"]
+        ]
+
+        self.location = {}  # _id -> (segment, row)
+        self.live = 0
+        self.total_length = 0
+        for segment in self.segments:
+            self._track(segment)
+
+    def _track(self, segment: _Segment):
+        for row in np.flatnonzero(segment.alive):
+            self.location[segment.records[row]["_id"]] = (segment, int(row))
+        live = segment.alive.sum()
+        self.live += int(live)
+        self.total_length += int(segment.lengths[segment.alive].sum()) if live else 0
+
+    def _sweep(self):
+        # Segments written by an upsert or merge that never committed
+        listed = {s.name for s in self.segments}
+        for name in os.listdir(self.path):
+            if name.startswith("seg-") and name not in listed:
+                shutil.rmtree(os.path.join(self.path, name), ignore_errors=True)
+        self._swept = True
+
+    def _new_segment_path(self) -> str:
+        if not self._swept:
+            self._sweep()
+        self.next += 1
+        return os.path.join(self.path, f"seg-{self.next:08d}")
+
+    def save(self):
+        _write_json(os.path.join(self.path, "segments.json"), {
+            "next": self.next,
+            "segments": [
+                {"name": s.name, "dead": s.dead}
+                for s in self.segments
+            ],
+        })
+
+    # ---------- operations (caller holds self.lock) ----------
+
+    def _kill(self, segment: _Segment, row: int):
+        segment.alive[row] = False
+        del self.location[segment.records[row]["_id"]]
+        self.live -= 1
+        self.total_length -= int(segment.lengths[row])
+
+    def upsert(self, records: list[dict], counts: list[Counter]):
+        postings = defaultdict(lambda: ([], []))
+        lengths = np.zeros(len(records), dtype=np.int64)
+        for row, terms in enumerate(counts):
+            lengths[row] = sum(terms.values())
+            for term, tf in terms.items():
+                rows, freqs = postings[term]
+                rows.append(row)
+                freqs.append(min(tf, _MAX_TF))
+
+        path = self._new_segment_path()
+        _Segment.write(path, records, postings, lengths)
+        segment = _Segment(path)
+
+        for record in records:
+            found = self.location.get(record["_id"])
+            if found is not None:
+                self._kill(*found)
+
+        self.segments.append(segment)
+        self._track(segment)
+        self.save()
+
+    def delete(self, ids):
+        for _id in ids:
+            found = self.location.get(_id)
+            if found is not None:
+                self._kill(*found)
+        self._drop_empty()
+        self.save()
+
+    def delete_where(self, predicate):
+        self.delete([
+            _id for _id, (segment, row) in self.location.items()
+            if predicate(segment.records[row])
+        ])
+
+    def update_fields(self, updates: dict[str, dict]):
+        touched = set()
+        for _id, fields in updates.items():
+            found = self.location.get(_id)
+            if found is not None:
+                segment, row = found
+                segment.records[row].update(fields)
+                touched.add(segment)
+
+        for segment in touched:
+            segment.save_records()
+
+    def _drop_empty(self):
+        empty = [s for s in self.segments if not s.alive.any()]
+        if empty:
+            self.segments = [s for s in self.segments if s.alive.any()]
+            for segment in empty:
+                shutil.rmtree(segment.path, ignore_errors=True)
+
+    def wants_merge(self) -> bool:
+        return not self.merging and len(self.segments) > self.merge_factor
+
+    # ---------- merging ----------
+
+    def merge(self, count: Optional[int] = None):
+        """
+        Merges the `count` smallest segments into one (caller has set
+        `merging`); by default enough of them to get back to
+        `merge_factor` segments. The new segment's postings are written
+        without holding the lock; rows deleted or updated meanwhile are
+        carried over on commit.
+        """
+        path = None
+        try:
+            with self.lock:
+                if count is None:
+                    count = max(self.merge_factor, len(self.segments) - self.merge_factor + 1)
+                sources = sorted(self.segments, key=lambda s: s.count)[:count]
+                if len(sources) < 2:
+                    return
+                alive = [s.alive.copy() for s in sources]
+                path = self._new_segment_path()
+                self.save()
+
+            remap = []  # new row of every source row, -1 for deleted rows
+            lengths = []
+            base = 0
+            for segment, keep in zip(sources, alive):
+                rows = np.full(segment.count, -1, dtype=np.int64)
+                rows[keep] = np.arange(base, base + keep.sum())
+                base += int(keep.sum())
+                remap.append(rows)
+                lengths.append(np.asarray(segment.lengths)[keep])
+
+            postings = {}
+            for term in sorted(set().union(*(s.terms for s in sources))):
+                rows, freqs = [], []
+                for segment, mapping in zip(sources, remap):
+                    found = segment.postings_of(term)
+                    if found is None:
+                        continue
+                    new_rows = mapping[found[0]]
+                    kept = new_rows >= 0
+                    rows.append(new_rows[kept])
+                    freqs.append(found[1][kept])
+                rows = np.concatenate(rows)
+                if len(rows):
+                    postings[term] = (rows, np.concatenate(freqs))
+
+            _Segment.write_postings(path, postings, np.concatenate(lengths))
+
+            with self.lock:
+                _write_json(os.path.join(path, "records.json"), [
+                    segment.records[row]
+                    for segment, keep in zip(sources, alive)
+                    for row in np.flatnonzero(keep)
+                ])
+                merged = _Segment(path)
+
+                # Rows deleted while merging
+                for segment, keep, mapping in zip(sources, alive, remap):
+                    merged.alive[mapping[np.flatnonzero(keep & ~segment.alive)]] = False
+
+                for segment in sources:
+                    for row in np.flatnonzero(segment.alive):
+                        self._kill(segment, int(row))
+                self.segments = [s for s in self.segments if s not in sources] + [merged]
+                self._track(merged)
+                self._drop_empty()
+                self.save()
+            path = None
+        finally:
+            with self.lock:
+                self.merging = False
+            if path is not None:
+                shutil.rmtree(path, ignore_errors=True)
+
+        for segment in sources:
+            shutil.rmtree(segment.path, ignore_errors=True)
+
+    # ---------- search ----------
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.segments), self.live, self.total_length
+
+    @staticmethod
+    def search(snapshot, terms: list[str], top_k: int, k1: float, b: float) -> list[tuple[float, _Segment, int]]:
+        segments, live, total_length = snapshot
+        if not live or not terms:
+            return []
+
+        avgdl = total_length / live
+        # Postings keep deleted rows until they are merged away, so
+        # document frequencies are taken over every row, deleted ones
+        # included (Lucene's maxDoc), never over the live rows alone
+        total_rows = sum(s.count for s in segments)
+        idf = {}
+        for term in set(terms):
+            df = sum(s.doc_freq(term) for s in segments)
+            if df:
+                idf[term] = max(0.0, math.log(1 + (total_rows - df + 0.5) / (df + 0.5)))
+        idf = {term: weight for term, weight in idf.items() if weight > 0}
+        if not idf:
+            return []
+
+        hits = []
+        for segment in segments:
+            rows, contributions = [], []
+            norms = None
+            for term, weight in idf.items():
+                found = segment.postings_of(term)
+                if found is None:
+                    continue
+                if norms is None:
+                    norms = segment.length_norms(k1, b, avgdl)
+                tf = found[1].astype(np.float32)
+                rows.append(found[0])
+                contributions.append(np.float32(weight * (k1 + 1)) * tf / (tf + norms[found[0]]))
+            if not rows:
+                continue
+
+            if sum(map(len, rows)) * 4 >= segment.count:
+                # Common terms: accumulate over every row of the segment
+                dense = np.zeros(segment.count, dtype=np.float32)
+                for term_rows, term_scores in zip(rows, contributions):
+                    dense[term_rows] += term_scores
+                dense[~segment.alive] = 0
+                rows = np.flatnonzero(dense)
+                scores = dense[rows]
+            else:
+                rows, scores = np.concatenate(rows), np.concatenate(contributions)
+                if len(contributions) > 1:
+                    rows, inverse = np.unique(rows, return_inverse=True)
+                    scores = np.bincount(inverse, weights=scores)
+                keep = segment.alive[rows]
+                rows, scores = rows[keep], scores[keep]
+
+            if len(rows) > top_k:
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+                rows, scores = rows[top], scores[top]
+            hits.extend(zip(scores.tolist(), [segment] * len(rows), rows.tolist()))
+
+        # Scale by the best score the query could reach, so scores fall in
+        # [0, 1) like the cosine similarities they are merged with
+        bound = sum(idf.values()) * (k1 + 1)
+        return [
+            (score / bound, segment, row)
+            for score, segment, row in heapq.nlargest(top_k, hits, key=lambda hit: hit[0])
+        ]
+
+
+class BM25Store(VectorStore):
+    """
+    In-process lexical index with BM25 scoring, persisted under `root`
+    with one directory per namespace. Used as the sparse leg of hybrid
+    retrieval when no hosted sparse index is configured: queries made of
+    identifiers (policy numbers, clause ids) match on exact tokens, which
+    dense embeddings are poor at.
+
+    Hit scores are BM25 divided by its upper bound for the query
+    (every query term at saturating frequency).
+
+    Postings are compact arrays (uint32 rows, uint16 term frequencies)
+    in memory-mapped, immutable segment files; see _Namespace for how
+    segments are written and merged.
+    """
+
+    def __init__(self, root: str, k1: float = 1.2, b: float = 0.75, merge_factor: int = 8):
+        self.root = root
+        self.k1 = k1
+        self.b = b
+        self.merge_factor = merge_factor
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        self._pending = []
+        self._wake = threading.Condition(self._lock)
+        self._merger = None
+        os.makedirs(root, exist_ok=True)
+
+    def _namespace(self, namespace: str, create: bool = True):
+        """
+        Opens the namespace; without `create`, one that was never written
+        gives None
+        """
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                path = os.path.join(self.root, namespace_dirname(namespace))
+                if not os.path.exists(path):
+                    if not create:
+                        return None
+                    os.makedirs(path)
+                ns = _Namespace(path, self.merge_factor)
+                self._namespaces[namespace] = ns
+            return ns
+
+    # ---------- background merging ----------
+
+    def _schedule_merge(self, ns: _Namespace):
+        """
+        Queues a merge for the namespace (caller holds ns.lock)
+        """
+        if not ns.wants_merge():
+            return
+        ns.merging = True
+        with self._wake:
+            self._pending.append(ns)
+            if self._merger is None:
+                self._merger = threading.Thread(target=self._merge_loop, name="bm25-merge", daemon=True)
+                self._merger.start()
+            self._wake.notify()
+
+    def _merge_loop(self):
+        while True:
+            with self._wake:
+                while not self._pending:
+                    self._wake.wait()
+                ns = self._pending.pop(0)
+            try:
+                ns.merge()
+            except Exception:
+                traceback.print_exc()
+                continue
+            with ns.lock:
+                self._schedule_merge(ns)
+
+    def merge(self, namespace: str) -> None:
+        """
+        Merges the namespace's segments into one, in the calling thread
+        (after any background merge in progress)
+        """
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        while True:
+            with ns.lock:
+                if not ns.merging:
+                    ns.merging = True
+                    count = len(ns.segments)
+                    break
+            time.sleep(0.01)
+        ns.merge(count)
+
+    # ---------- VectorStore ----------
+
+    def upsert(self, namespace: str, records: list[dict]) -> None:
+        if not records:
+            return
+        # Last write wins for ids repeated within the batch
+        records = list({r["_id"]: dict(r) for r in records}.values())
+        counts = [Counter(tokenize(r.get("text", ""))) for r in records]
+        ns = self._namespace(namespace)
+        with ns.lock:
+            ns.upsert(records, counts)
+            self._schedule_merge(ns)
+
+    def search(
+        self,
+        namespace: str,
+        query: str,
+        top_k: int,
+        fields: list[str]
+    ) -> list[dict]:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return []
+        found = _Namespace.search(ns.snapshot(), tokenize(query), top_k, self.k1, self.b)
+        return [
+            {
+                "_id": segment.records[row]["_id"],
+                "_score": score,
+                "fields": {
+                    k: segment.records[row][k] for k in fields
+                    if k in segment.records[row]
+                },
+            }
+            for score, segment, row in found
+        ]
+
+    def delete_document(self, namespace: str, document_id: int) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        with ns.lock:
+            ns.delete_where(lambda r: r.get("document_id") == document_id)
+
+    def delete_legacy_records(self, namespace: str, document_id: int) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        with ns.lock:
+            ns.delete_where(lambda r: r.get("document_id") == document_id and "prev_chunk" not in r)
+
+    def delete_records(self, namespace: str, ids: list[str]) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        with ns.lock:
+            ns.delete(ids)
+
+    def update_fields(self, namespace: str, updates: dict[str, dict]) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        with ns.lock:
+            ns.update_fields(updates)
+
+    def list_ids(self, namespace: str, prefix: str) -> list[str]:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return []
+        with ns.lock:
+            return [_id for _id in ns.location if _id.startswith(prefix)]
+
+    def namespace_stats(self, namespace: str) -> dict:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return {"backend": "bm25", "vector_count": 0, "segments": 0, "terms": 0}
+        with ns.lock:
+            return {
+                "backend": "bm25",
+                "vector_count": ns.live,
+                "segments": len(ns.segments),
+                "terms": sum(len(s.terms) for s in ns.segments),
+            }
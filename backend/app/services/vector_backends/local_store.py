@@ -0,0 +1,493 @@
+import heapq
+import json
+import os
+import threading
+
+import numpy as np
+
+from app.services.embeddings import embed_texts
+from app.services.vector_backends.base import VectorStore, namespace_dirname
+
+_INITIAL_CAPACITY = 1024
+_GRAPH_BUILD_BLOCK = 2048
+
+
+def _open_matrix(path: str, dtype, shape: tuple, fill=None) -> np.memmap:
+    if os.path.exists(path):
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    matrix = np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+    if fill is not None:
+        matrix[:] = fill
+    return matrix
+
+
+class _Namespace:
+    """
+    One namespace on disk:
+
+      vectors.f32   memory-mapped (capacity, dim) float32 embeddings
+      graph.i32     memory-mapped (capacity, degree) neighbour lists,
+                    only present once the namespace is large enough for ANN
+      meta.json     dimension, capacity and whether there is a graph
+      records.jsonl append-only log of record fields: one line per
+                    appended row, plus tombstone and field update lines
+
+    Operations only append their own lines to the log, so writing a batch
+    costs the batch rather than the namespace. The log is rewritten as a
+    snapshot when the matrices are (grow, compact, graph build) or once
+    tombstones and updates outnumber the rows.
+
+    Vectors are unit length, so scores are cosine similarities.
+    """
+
+    def __init__(self, path: str, dim: int, degree: int, ann_threshold: int, ef_search: int):
+        self.path = path
+        self.degree = degree
+        self.ann_threshold = ann_threshold
+        self.ef_search = ef_search
+        self.lock = threading.Lock()
+        os.makedirs(path, exist_ok=True)
+        self._pending = []  # log lines of the current operation
+        self._log_lines = 0
+        self._stale = False  # the log must be rewritten as a snapshot
+
+        legacy_path = self._file("records.json")
+        if os.path.exists(self._file("meta.json")):
+            with open(self._file("meta.json")) as f:
+                meta = json.load(f)
+            meta["records"] = self._replay()
+        elif os.path.exists(legacy_path):
+            # Written before the log existed: converted on first open
+            with open(legacy_path) as f:
+                meta = json.load(f)
+            self._stale = True
+        else:
+            meta = {"dim": dim, "capacity": _INITIAL_CAPACITY, "graph": False, "records": []}
+            self._stale = True
+
+        self.dim = meta["dim"]
+        self.capacity = meta["capacity"]
+        self.records = meta["records"]
+        self.vectors = _open_matrix(self._file("vectors.f32"), np.float32, (self.capacity, self.dim))
+        self.neighbors = None
+        if meta["graph"]:
+            self.neighbors = _open_matrix(self._file("graph.i32"), np.int32, (self.capacity, self.degree), fill=-1)
+        self._reindex()
+        if self._stale:
+            self.flush()
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @property
+    def count(self) -> int:
+        return len(self.records)
+
+    def _reindex(self):
+        self.alive = np.zeros(self.capacity, dtype=bool)
+        self.row_of = {}
+        for row, record in enumerate(self.records):
+            if record is not None:
+                self.alive[row] = True
+                self.row_of[record["_id"]] = row
+
+    # ---------- persistence ----------
+
+    def _replay(self) -> list:
+        records = []
+        with open(self._file("records.jsonl")) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break  # torn last line of an interrupted append
+                self._log_lines += 1
+                if "record" in entry:
+                    records.append(entry["record"])
+                elif "delete" in entry:
+                    for row in entry["delete"]:
+                        records[row] = None
+                else:
+                    for row, fields in entry["update"]:
+                        records[row].update(fields)
+        return records
+
+    def flush(self):
+        """
+        Persists the current operation: the matrices, then its log lines
+        (or a snapshot of every record when one is due)
+        """
+        self.vectors.flush()
+        if self.neighbors is not None:
+            self.neighbors.flush()
+
+        if self._stale or self._log_lines > 2 * self.count + _INITIAL_CAPACITY:
+            self._snapshot()
+        elif self._pending:
+            with open(self._file("records.jsonl"), "a") as f:
+                f.write("".join(json.dumps(entry) + "\n" for entry in self._pending))
+            self._log_lines += len(self._pending)
+        self._pending = []
+
+    def _snapshot(self):
+        tmp = self._file("records.jsonl.tmp")
+        with open(tmp, "w") as f:
+            for record in self.records:
+                f.write(json.dumps({"record": record}) + "\n")
+        os.replace(tmp, self._file("records.jsonl"))
+        self._log_lines = self.count
+
+        tmp = self._file("meta.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump({
+                "dim": self.dim,
+                "capacity": self.capacity,
+                "graph": self.neighbors is not None,
+            }, f)
+        os.replace(tmp, self._file("meta.json"))
+        self._stale = False
+
+    def _rewrite(self, capacity: int, vectors: np.ndarray, neighbors=None):
+        """
+        Replaces the on-disk matrices with new ones of the given capacity
+        """
+        del self.vectors
+        self.vectors = None
+        tmp = self._file("vectors.f32.tmp")
+        new_vectors = np.memmap(tmp, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        new_vectors[:len(vectors)] = vectors
+        new_vectors.flush()
+        del new_vectors
+        os.replace(tmp, self._file("vectors.f32"))
+        self.vectors = np.memmap(self._file("vectors.f32"), dtype=np.float32, mode="r+", shape=(capacity, self.dim))
+
+        if self.neighbors is not None:
+            del self.neighbors
+            self.neighbors = None
+        graph_path = self._file("graph.i32")
+        if neighbors is not None:
+            tmp = graph_path + ".tmp"
+            new_graph = np.memmap(tmp, dtype=np.int32, mode="w+", shape=(capacity, self.degree))
+            new_graph[:] = -1
+            new_graph[:len(neighbors)] = neighbors
+            new_graph.flush()
+            del new_graph
+            os.replace(tmp, graph_path)
+            self.neighbors = np.memmap(graph_path, dtype=np.int32, mode="r+", shape=(capacity, self.degree))
+        elif os.path.exists(graph_path):
+            os.remove(graph_path)
+
+        self.capacity = capacity
+        self._reindex()
+        self._stale = True
+
+    def _grow(self):
+        neighbors = None
+        if self.neighbors is not None:
+            neighbors = np.array(self.neighbors[:self.count])
+        self._rewrite(self.capacity * 2, np.array(self.vectors[:self.count]), neighbors)
+
+    def _compact(self):
+        keep = [row for row, record in enumerate(self.records) if record is not None]
+        vectors = np.array(self.vectors[keep]) if keep else np.zeros((0, self.dim), dtype=np.float32)
+        self.records = [self.records[row] for row in keep]
+        capacity = _INITIAL_CAPACITY
+        while capacity < len(keep) * 2:
+            capacity *= 2
+        self.neighbors = None
+        self._rewrite(capacity, vectors)
+        if self.count >= self.ann_threshold:
+            self._build_graph()
+
+    # ---------- ANN graph ----------
+
+    def _build_graph(self):
+        """
+        Builds an exact k-nearest-neighbour graph over all current rows,
+        block by block; later inserts are linked incrementally.
+        """
+        n = self.count
+        k = min(self.degree, max(n - 1, 0))
+        neighbors = np.full((n, self.degree), -1, dtype=np.int32)
+        data = self.vectors[:n]
+
+        for start in range(0, n, _GRAPH_BUILD_BLOCK):
+            block = data[start:start + _GRAPH_BUILD_BLOCK]
+            scores = block @ data.T
+            rows = np.arange(len(block))
+            scores[rows, rows + start] = -np.inf
+            if k:
+                top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+                neighbors[start:start + len(block), :k] = np.take_along_axis(top, order, axis=1)
+
+        self._rewrite(self.capacity, np.array(data), neighbors)
+
+    def _entry_points(self) -> list[int]:
+        n = self.count
+        return sorted(set(np.linspace(0, n - 1, num=min(n, 8), dtype=int).tolist()))
+
+    def _graph_search(self, query: np.ndarray, ef: int) -> list[tuple[float, int]]:
+        """
+        Best-first beam search over the neighbour graph.
+        Returns up to `ef` (score, row) pairs, best first, including
+        deleted rows (callers filter them).
+        """
+        entries = self._entry_points()
+        scores = self.vectors[entries] @ query
+        visited = set(entries)
+        candidates = [(-float(s), row) for s, row in zip(scores, entries)]
+        heapq.heapify(candidates)
+        results = [(float(s), row) for s, row in zip(scores, entries)]
+        heapq.heapify(results)
+        while len(results) > ef:
+            heapq.heappop(results)
+
+        while candidates:
+            neg_score, row = heapq.heappop(candidates)
+            if len(results) >= ef and -neg_score < results[0][0]:
+                break
+
+            nbrs = [int(n) for n in self.neighbors[row] if n >= 0 and n not in visited]
+            if not nbrs:
+                continue
+            visited.update(nbrs)
+
+            for n, s in zip(nbrs, self.vectors[nbrs] @ query):
+                s = float(s)
+                if len(results) < ef or s > results[0][0]:
+                    heapq.heappush(candidates, (-s, n))
+                    heapq.heappush(results, (s, n))
+                    if len(results) > ef:
+                        heapq.heappop(results)
+
+        return sorted(results, reverse=True)
+
+    def _link(self, row: int):
+        vector = self.vectors[row]
+        found = [
+            (s, r) for s, r in self._graph_search(vector, max(self.ef_search, self.degree * 2))
+            if r != row
+        ][:self.degree]
+
+        self.neighbors[row] = -1
+        for slot, (_, r) in enumerate(found):
+            self.neighbors[row, slot] = r
+
+        for score, r in found:
+            nbrs = self.neighbors[r]
+            free = np.flatnonzero(nbrs < 0)
+            if len(free):
+                nbrs[free[0]] = row
+                continue
+            current = self.vectors[nbrs] @ self.vectors[r]
+            weakest = int(np.argmin(current))
+            if current[weakest] < score:
+                nbrs[weakest] = row
+
+    # ---------- operations (caller holds self.lock) ----------
+
+    def upsert(self, records: list[dict], vectors: np.ndarray):
+        for record, vector in zip(records, vectors):
+            old = self.row_of.get(record["_id"])
+            if old is not None:
+                self.records[old] = None
+                self.alive[old] = False
+                self._pending.append({"delete": [old]})
+
+            if self.count == self.capacity:
+                self._grow()
+
+            row = self.count
+            self.vectors[row] = vector
+            self.records.append(record)
+            self._pending.append({"record": record})
+            self.alive[row] = True
+            self.row_of[record["_id"]] = row
+
+            if self.neighbors is not None:
+                self._link(row)
+
+        if self.neighbors is None and self.count >= self.ann_threshold:
+            self._build_graph()
+
+        self._maybe_compact()
+        self.flush()
+
+    def delete_where(self, predicate):
+        deleted = []
+        for row, record in enumerate(self.records):
+            if record is not None and predicate(record):
+                self.records[row] = None
+                self.alive[row] = False
+                del self.row_of[record["_id"]]
+                deleted.append(row)
+
+        if deleted:
+            self._pending.append({"delete": deleted})
+        self._maybe_compact()
+        self.flush()
+
+    def update_fields(self, updates: dict[str, dict]):
+        updated = []
+        for _id, fields in updates.items():
+            row = self.row_of.get(_id)
+            if row is not None:
+                self.records[row].update(fields)
+                updated.append([row, fields])
+
+        if updated:
+            self._pending.append({"update": updated})
+        self.flush()
+
+    def _maybe_compact(self):
+        dead = self.count - len(self.row_of)
+        if dead and dead * 2 > self.count:
+            self._compact()
+
+    def search(self, query: np.ndarray, top_k: int) -> list[tuple[float, int]]:
+        live = len(self.row_of)
+        if not live:
+            return []
+
+        if self.neighbors is None:
+            scores = self.vectors[:self.count] @ query
+            scores = np.where(self.alive[:self.count], scores, -np.inf)
+            k = min(top_k, live)
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [(float(scores[row]), int(row)) for row in top]
+
+        ef = max(self.ef_search, top_k * 2)
+        hits = [(s, r) for s, r in self._graph_search(query, ef) if self.alive[r]]
+        return hits[:top_k]
+
+
+class LocalVectorStore(VectorStore):
+    """
+    In-process vector index persisted under `root`, one directory per
+    namespace. Small namespaces are searched exactly (brute force); once a
+    namespace reaches `ann_threshold` vectors it switches to a
+    neighbour-graph ANN index. Text is embedded locally, so no network is
+    needed.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        dim: int,
+        ann_threshold: int = 20000,
+        degree: int = 16,
+        ef_search: int = 64
+    ):
+        self.root = root
+        self.dim = dim
+        self.ann_threshold = ann_threshold
+        self.degree = degree
+        self.ef_search = ef_search
+        self._namespaces = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _namespace(self, namespace: str, create: bool = True):
+        """
+        Opens the namespace; without `create`, one that was never written
+        gives None, so reads don't leave empty namespaces behind
+        """
+        with self._lock:
+            ns = self._namespaces.get(namespace)
+            if ns is None:
+                path = os.path.join(self.root, namespace_dirname(namespace))
+                if not create and not os.path.exists(path):
+                    return None
+                ns = _Namespace(
+                    path,
+                    dim=self.dim,
+                    degree=self.degree,
+                    ann_threshold=self.ann_threshold,
+                    ef_search=self.ef_search
+                )
+                self._namespaces[namespace] = ns
+            return ns
+
+    def upsert(self, namespace: str, records: list[dict]) -> None:
+        ns = self._namespace(namespace)
+        vectors = embed_texts([r["text"] for r in records], dim=ns.dim)
+        with ns.lock:
+            ns.upsert([dict(r) for r in records], vectors)
+
+    def search(
+        self,
+        namespace: str,
+        query: str,
+        top_k: int,
+        fields: list[str]
+    ) -> list[dict]:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return []
+        vector = embed_texts([query], dim=ns.dim)[0]
+        with ns.lock:
+            found = ns.search(vector, top_k)
+            return [
+                {
+                    "_id": ns.records[row]["_id"],
+                    "_score": score,
+                    "fields": {
+                        k: ns.records[row][k] for k in fields
+                        if k in ns.records[row]
+                    },
+                }
+                for score, row in found
+            ]
+
+    def delete_document(self, namespace: str, document_id: int) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        with ns.lock:
+            ns.delete_where(lambda r: r.get("document_id") == document_id)
+
+    def delete_legacy_records(self, namespace: str, document_id: int) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        with ns.lock:
+            ns.delete_where(lambda r: r.get("document_id") == document_id and "prev_chunk" not in r)
+
+    def delete_records(self, namespace: str, ids: list[str]) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        wanted = set(ids)
+        with ns.lock:
+            ns.delete_where(lambda r: r["_id"] in wanted)
+
+    def update_fields(self, namespace: str, updates: dict[str, dict]) -> None:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return
+        with ns.lock:
+            ns.update_fields(updates)
+
+    def list_ids(self, namespace: str, prefix: str) -> list[str]:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return []
+        with ns.lock:
+            return [_id for _id in ns.row_of if _id.startswith(prefix)]
+
+    def namespace_stats(self, namespace: str) -> dict:
+        ns = self._namespace(namespace, create=False)
+        if ns is None:
+            return {"backend": "local", "vector_count": 0, "dimension": self.dim, "index": "flat"}
+        with ns.lock:
+            return {
+                "backend": "local",
+                "vector_count": len(ns.row_of),
+                "dimension": ns.dim,
+                "index": "graph" if ns.neighbors is not None else "flat",
+            }
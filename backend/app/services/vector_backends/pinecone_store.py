@@ -0,0 +1,111 @@
+from app.services.vector_backends.base import VectorStore
+
+
+class PineconeVectorStore(VectorStore):
+    """
+    Pinecone index with integrated embedding.
+
+    `async_index_factory` builds a native asyncio index (pinecone[asyncio])
+    on first async use; without it the async methods use worker threads.
+    """
+
+    def __init__(self, index, async_index_factory=None):
+        self.index = index
+        self._async_index_factory = async_index_factory
+        self._async_index = None
+
+    def _get_async_index(self):
+        if self._async_index is None:
+            self._async_index = self._async_index_factory()
+        return self._async_index
+
+    def upsert(self, namespace: str, records: list[dict]) -> None:
+        self.index.upsert_records(namespace, records)
+
+    def search(
+        self,
+        namespace: str,
+        query: str,
+        top_k: int,
+        fields: list[str]
+    ) -> list[dict]:
+        response = self.index.search(
+            namespace=namespace,
+            query={
+                "inputs": {"text": query},
+                "top_k": top_k
+            },
+            fields=fields
+        )
+        return response.get("result", {}).get("hits", [])
+
+    def delete_document(self, namespace: str, document_id: int) -> None:
+        self.index.delete(
+            namespace=namespace,
+            filter={
+                "document_id": document_id
+            }
+        )
+
+    def delete_records(self, namespace: str, ids: list[str]) -> None:
+        self.index.delete(namespace=namespace, ids=ids)
+
+    def delete_legacy_records(self, namespace: str, document_id: int) -> None:
+        self.index.delete(
+            namespace=namespace,
+            filter={
+                "document_id": {"$eq": document_id},
+                "prev_chunk": {"$exists": False}
+            }
+        )
+
+    def update_fields(self, namespace: str, updates: dict[str, dict]) -> None:
+        # Pinecone updates metadata one record per request
+        for _id, fields in updates.items():
+            self.index.update(id=_id, set_metadata=fields, namespace=namespace)
+
+    def list_ids(self, namespace: str, prefix: str) -> list[str]:
+        # Paginated id listing (serverless indexes)
+        ids = []
+        for page in self.index.list(prefix=prefix, namespace=namespace):
+            ids.extend(page)
+        return ids
+
+    def namespace_stats(self, namespace: str) -> dict:
+        stats = self.index.describe_index_stats()
+        ns = (stats.namespaces or {}).get(namespace)
+        return {
+            "backend": "pinecone",
+            "vector_count": ns.vector_count if ns is not None else 0,
+            "dimension": stats.dimension,
+        }
+
+    async def aupsert(self, namespace: str, records: list[dict]) -> None:
+        if self._async_index_factory is None:
+            return await super().aupsert(namespace, records)
+        await self._get_async_index().upsert_records(namespace, records)
+
+    async def asearch(
+        self,
+        namespace: str,
+        query: str,
+        top_k: int,
+        fields: list[str]
+    ) -> list[dict]:
+        if self._async_index_factory is None:
+            return await super().asearch(namespace, query, top_k, fields)
+
+        response = await self._get_async_index().search(
+            namespace=namespace,
+            query={
+                "inputs": {"text": query},
+                "top_k": top_k
+            },
+            fields=fields
+        )
+        return response.get("result", {}).get("hits", [])
+
+    async def adelete_records(self, namespace: str, ids: list[str]) -> None:
+        if self._async_index_factory is None:
+            return await super().adelete_records(namespace, ids)
+        await self._get_async_index().delete(namespace=namespace, ids=ids)
@@ -1,67 +1,323 @@
-from pinecone import Pinecone
 from app.core.config import settings
-import uuid
+from app.services.scheduler import scheduled
+from app.services.vector_backends import get_vector_stores
+import asyncio
+import hashlib
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Optional
 
-pc = Pinecone(api_key=settings.pinecone_api_key)
 
-# ---- Dense index (existing, required) ----
-dense_index = pc.Index(
-    host=settings.pinecone_index_host
-)
+class UpsertError(Exception):
+    """
+    Raised when some batches still fail after all retries.
+    `result` carries the per-batch report.
+    """
+
+    def __init__(self, message: str, result: dict):
+        super().__init__(message)
+        self.result = result
+
+
+def _record_size(record: dict) -> int:
+    return len(json.dumps(record, default=str).encode("utf-8"))
+
+
+def batch_records(
+    records: list[dict],
+    max_records: int,
+    max_bytes: int
+) -> list[list[dict]]:
+    """
+    Splits records into batches bounded by record count and payload size
+    """
+    batches = []
+    current = []
+    current_bytes = 0
+
+    for record in records:
+        size = _record_size(record)
+        if current and (
+            len(current) >= max_records
+            or current_bytes + size > max_bytes
+        ):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(record)
+        current_bytes += size
+
+    if current:
+        batches.append(current)
 
-# ---- Sparse index (optional, hybrid-ready) ----
-sparse_index = None
-if hasattr(settings, "pinecone_sparse_index_host") and settings.pinecone_sparse_index_host:
-    sparse_index = pc.Index(
-        host=settings.pinecone_sparse_index_host
+    return batches
+
+
+def _upsert_batch(store, store_name: str, batch_no: int, namespace: str, batch: list[dict]) -> dict:
+    attempts = 0
+    error = None
+
+    while attempts <= settings.upsert_max_retries:
+        if attempts:
+            time.sleep(settings.upsert_retry_backoff * (2 ** (attempts - 1)))
+        attempts += 1
+        try:
+            store.upsert(namespace, batch)
+            error = None
+            break
+        except Exception as e:
+            error = str(e)
+
+    return {
+        "index": store_name,
+        "batch": batch_no,
+        "records": len(batch),
+        "attempts": attempts,
+        "ok": error is None,
+        "error": error,
+    }
+
+
+def bulk_upsert(
+    stores: dict,
+    namespace: str,
+    records: list[dict],
+    on_progress: Optional[Callable[[int, int], None]] = None
+) -> dict:
+    """
+    Upserts records into every store in `stores` ({name: VectorStore}).
+
+    Records are split into count- and byte-bounded batches; batches for all
+    stores run concurrently up to `upsert_parallelism`, and each failed
+    batch is retried with exponential backoff. Returns a per-batch report
+    and raises UpsertError if any batch is still failing.
+    """
+    batches = batch_records(
+        records,
+        max_records=settings.upsert_batch_size,
+        max_bytes=settings.upsert_batch_max_bytes
     )
 
+    tasks = [
+        (name, store, batch_no, batch)
+        for name, store in stores.items()
+        for batch_no, batch in enumerate(batches)
+    ]
+
+    results = []
+    with ThreadPoolExecutor(max_workers=settings.upsert_parallelism) as pool:
+        futures = [
+            pool.submit(_upsert_batch, store, name, batch_no, namespace, batch)
+            for name, store, batch_no, batch in tasks
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+            if on_progress:
+                on_progress(len(results), len(tasks))
+
+    return _report(records, results)
+
+
+def _report(records: list[dict], results: list[dict]) -> dict:
+    results.sort(key=lambda r: (r["index"], r["batch"]))
+    failed = [r for r in results if not r["ok"]]
+
+    result = {
+        "records": len(records),
+        "batches": results,
+        "failed_batches": len(failed),
+    }
+
+    if failed:
+        raise UpsertError(
+            f"{len(failed)} of {len(results)} upsert batches failed: {failed[0]['error']}",
+            result
+        )
+
+    return result
+
+
 def upsert_texts(
     texts: list[str],
     metadatas: list[dict],
-    namespace: str
+    namespace: str,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+    ids: Optional[list[str]] = None
 ):
     """
     Upserts texts into dense index (and sparse index if configured).
     Compatible with Pinecone integrated embedding.
+    Record ids default to chunk_record_id of each metadata's
+    document_id and chunk_hash (hash of the text if absent).
     """
 
+    records = _build_records(texts, metadatas, ids)
+
+    with scheduled("upsert"):
+        return bulk_upsert(
+            get_vector_stores(),
+            namespace,
+            records,
+            on_progress=on_progress
+        )
+
+
+def chunk_record_id(document_id: int, chunk_hash: str) -> str:
+    """
+    Record id of a chunk: the same for every upsert of the same chunk of
+    the same document (so retries overwrite instead of duplicating) and
+    prefixed with the document id so a document's records can be listed
+    """
+    return f"{document_prefix(document_id)}{chunk_hash[:32]}"
+
+
+def document_prefix(document_id: int) -> str:
+    return f"{document_id}:"
+
+
+def _build_records(texts: list[str], metadatas: list[dict], ids: Optional[list[str]] = None) -> list[dict]:
     records = []
+    ids = ids or [
+        chunk_record_id(
+            metadata["document_id"],
+            metadata.get("chunk_hash") or hashlib.sha256(text.encode("utf-8")).hexdigest()
+        )
+        for text, metadata in zip(texts, metadatas)
+    ]
 
-    for text, metadata in zip(texts, metadatas):
+    for _id, text, metadata in zip(ids, texts, metadatas):
         record = {
-            "_id": str(uuid.uuid4()),
+            "_id": _id,
             "text": text,   # MUST match Pinecone field_map
             **metadata
         }
         records.append(record)
 
-    # ---- Dense upsert (existing behavior) ----
-    dense_index.upsert_records(
-        namespace,
-        records
-    )
+    return records
 
-    # ---- Sparse upsert (only if index exists) ----
-    if sparse_index is not None:
-        sparse_index.upsert_records(
-            namespace,
-            records
-        )
-def delete_document_vectors(document_id: int, namespace: str):
+
+def _id_batches(ids: list[str]) -> list[list[str]]:
+    step = settings.vector_delete_batch_size
+    return [ids[i:i + step] for i in range(0, len(ids), step)]
+
+
+def delete_document_vectors(document_id: int, namespace: str, ids: Optional[list[str]] = None):
+    """
+    Delete all vectors related to a document from every configured store:
+    by record id when the document's chunk manifest is given, otherwise
+    (documents indexed before the manifest) with a metadata-filter delete
+    """
+    if ids is not None:
+        delete_records(ids, namespace)
+        return
+
+    for store in get_vector_stores().values():
+        store.delete_document(namespace, document_id)
+
+
+def delete_legacy_vectors(document_id: int, namespace: str):
+    """
+    Deletes a document's records from before the chunk manifest, once a
+    re-index has upserted their replacements
+    """
+    for store in get_vector_stores().values():
+        store.delete_legacy_records(namespace, document_id)
+
+
+async def adelete_document_vectors(document_id: int, namespace: str, ids: Optional[list[str]] = None):
+    if ids is not None:
+        await adelete_records(ids, namespace)
+        return
+
+    await asyncio.gather(*(
+        store.adelete_document(namespace, document_id)
+        for store in get_vector_stores().values()
+    ))
+
+
+def delete_records(ids: list[str], namespace: str):
+    """
+    Deletes specific records from every configured store, in parallel
+    batches of at most `vector_delete_batch_size` ids
+    """
+    if not ids:
+        return
+
+    with ThreadPoolExecutor(max_workers=settings.upsert_parallelism) as pool:
+        futures = [
+            pool.submit(store.delete_records, namespace, batch)
+            for store in get_vector_stores().values()
+            for batch in _id_batches(ids)
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+
+async def adelete_records(ids: list[str], namespace: str):
     """
-    Delete all vectors related to a document using metadata filter
+    Async variant of delete_records; parallelism is bounded by a semaphore
     """
-    dense_index.delete(
-        namespace=namespace,
-        filter={
-            "document_id": document_id
+    if not ids:
+        return
+
+    limit = asyncio.Semaphore(settings.upsert_parallelism)
+
+    async def delete_batch(store, batch):
+        async with limit:
+            await store.adelete_records(namespace, batch)
+
+    await asyncio.gather(*(
+        delete_batch(store, batch)
+        for store in get_vector_stores().values()
+        for batch in _id_batches(ids)
+    ))
+
+
+def update_record_fields(updates: dict[str, dict], namespace: str):
+    """
+    Sets metadata on existing records in every store, in parallel
+    batches, without re-embedding them
+    """
+    if not updates:
+        return
+
+    items = list(updates.items())
+    step = max(1, -(-len(items) // settings.upsert_parallelism))
+    parts = [dict(items[i:i + step]) for i in range(0, len(items), step)]
+
+    with ThreadPoolExecutor(max_workers=settings.upsert_parallelism) as pool:
+        futures = [
+            pool.submit(store.update_fields, namespace, part)
+            for store in get_vector_stores().values()
+            for part in parts
+        ]
+        for future in as_completed(futures):
+            future.result()
+
+
+def verify_records(document_id: int, ids: list[str], namespace: str) -> dict:
+    """
+    Compares the record ids a document's manifest lists with the records
+    each store holds for the document. `missing` records are in the
+    manifest but not the index, `orphaned` ones the other way round.
+    """
+    expected = set(ids)
+    report = {}
+
+    for name, store in get_vector_stores().items():
+        found = set(store.list_ids(namespace, document_prefix(document_id)))
+        report[name] = {
+            "indexed": len(found),
+            "missing": sorted(expected - found),
+            "orphaned": sorted(found - expected),
         }
-    )
-    if sparse_index is not None:
-        sparse_index.delete(
-            namespace=namespace,
-            filter={
-                "document_id": document_id
-            }
-        )
+
+    return report
+
+
+def namespace_stats(namespace: str) -> dict:
+    return {
+        name: store.namespace_stats(namespace)
+        for name, store in get_vector_stores().items()
+    }
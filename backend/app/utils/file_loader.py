@@ -1,14 +1,37 @@
-from supabase import create_client
+from app.core.clients import get_client, peek_client, register_client, require_setting, set_client
 from app.core.config import settings
 import uuid
 import os
-from pypdf import PdfReader
 import io
+import asyncio
+import itertools
+import mmap
+import multiprocessing
+import signal
+import tempfile
+import threading
+import warnings
+from collections import deque
+from contextlib import contextmanager
+from typing import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
-supabase = create_client(
-    settings.SUPABASE_URL,
-    settings.SUPABASE_SERVICE_KEY
-)
+
+def _build_supabase():
+    from supabase import create_client
+
+    return create_client(
+        require_setting(settings.SUPABASE_URL, "SUPABASE_URL"),
+        require_setting(settings.SUPABASE_SERVICE_KEY, "SUPABASE_SERVICE_KEY")
+    )
+
+
+register_client("supabase", _build_supabase)
+
+
+def get_supabase():
+    return get_client("supabase")
 
 
 def upload_file(file_bytes: bytes, filename: str) -> str:
@@ -18,34 +41,280 @@ def upload_file(file_bytes: bytes, filename: str) -> str:
     ext = os.path.splitext(filename)[1]
     storage_path = f"{uuid.uuid4()}{ext}"
 
-    supabase.storage \
+    get_supabase().storage \
         .from_(settings.SUPABASE_BUCKET) \
         .upload(storage_path, file_bytes)
 
     return storage_path
 
 
+def upload_file_from_path(path: str, filename: str) -> str:
+    """
+    Uploads a file from local disk; the storage client streams it from
+    the open file instead of taking the whole content as bytes
+    """
+    ext = os.path.splitext(filename)[1]
+    storage_path = f"{uuid.uuid4()}{ext}"
+
+    with open(path, "rb") as f:
+        get_supabase().storage \
+            .from_(settings.SUPABASE_BUCKET) \
+            .upload(storage_path, f)
+
+    return storage_path
+
+
 def download_file(storage_path: str) -> bytes:
     """
     Download file from Supabase Storage
     """
-    response = supabase.storage \
+    response = get_supabase().storage \
         .from_(settings.SUPABASE_BUCKET) \
         .download(storage_path)
 
     return response
 
 
-def extract_text_from_pdf_bytes(file_bytes: bytes) -> str:
-    reader = PdfReader(io.BytesIO(file_bytes))
-    text = ""
+_async_supabase_lock = asyncio.Lock()
+
+
+async def _get_async_supabase():
+    # The async client has an async constructor, so it is created here
+    # and stored in the registry rather than built by a factory
+    client = peek_client("supabase_async")
+    if client is not None:
+        return client
+
+    async with _async_supabase_lock:
+        client = peek_client("supabase_async")
+        if client is None:
+            from supabase import acreate_client
+
+            client = await acreate_client(
+                require_setting(settings.SUPABASE_URL, "SUPABASE_URL"),
+                require_setting(settings.SUPABASE_SERVICE_KEY, "SUPABASE_SERVICE_KEY")
+            )
+            set_client("supabase_async", client)
+    return client
+
+
+async def adelete_file(storage_path: str):
+    client = await _get_async_supabase()
+    await client.storage \
+        .from_(settings.SUPABASE_BUCKET) \
+        .remove([storage_path])
+
+
+class _PageTimeout(BaseException):
+    # Not an Exception, so pypdf's own error handling can't swallow it
+    pass
+
+
+def _raise_page_timeout(signum, frame):
+    raise _PageTimeout()
+
+
+@contextmanager
+def _open_pdf(source):
+    """
+    Opens a PDF given as bytes or a file path. Files are memory-mapped,
+    so pages are read from the OS page cache on demand rather than the
+    whole file being copied into the process.
+    """
+    from pypdf import PdfReader
+
+    if isinstance(source, (bytes, bytearray)):
+        yield PdfReader(io.BytesIO(source))
+        return
+
+    with open(source, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            # mmap can't map an empty file; let pypdf report it
+            yield PdfReader(f)
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield PdfReader(mapped)
+
+
+def count_pdf_pages(source) -> int:
+    with _open_pdf(source) as reader:
+        return len(reader.pages)
+
+
+def _iter_page_texts(reader, start: int, stop: int, page_timeout: float):
+    """
+    Yields (page_index, text, timed_out) for pages [start, stop).
+
+    The per-page timeout relies on SIGALRM, so it is only enforced when
+    running on the main thread of a process (i.e. inside pool workers).
+    """
+    use_alarm = (
+        page_timeout
+        and hasattr(signal, "setitimer")
+        and threading.current_thread() is threading.main_thread()
+    )
+    if use_alarm:
+        previous = signal.signal(signal.SIGALRM, _raise_page_timeout)
+
+    try:
+        for idx in range(start, stop):
+            timed_out = False
+            try:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, page_timeout)
+                text = reader.pages[idx].extract_text() or ""
+            except _PageTimeout:
+                text = ""
+                timed_out = True
+            finally:
+                if use_alarm:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+            yield idx, text, timed_out
+    finally:
+        if use_alarm:
+            signal.signal(signal.SIGALRM, previous)
+
+
+def _extract_page_range(source, start: int, stop: int, page_timeout: float):
+    """
+    Extracts pages [start, stop) and returns [(page_index, text, timed_out)]
+    """
+    with _open_pdf(source) as reader:
+        return list(_iter_page_texts(reader, start, stop, page_timeout))
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Forking a process that runs threads (workers, clients) can
+            # copy a held lock into the child; start workers fresh instead
+            methods = multiprocessing.get_all_start_methods()
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.pdf_extract_workers or os.cpu_count(),
+                mp_context=multiprocessing.get_context(
+                    "forkserver" if "forkserver" in methods else "spawn"
+                )
+            )
+        return _pool
+
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _iter_extracted(path: str, num_pages: int, page_timeout: float):
+    if not page_timeout and num_pages < settings.pdf_parallel_min_pages:
+        with _open_pdf(path) as reader:
+            yield from _iter_page_texts(reader, 0, num_pages, page_timeout)
+        return
+
+    workers = settings.pdf_extract_workers or os.cpu_count() or 1
+    if num_pages < settings.pdf_parallel_min_pages:
+        # Too few pages to be worth splitting, but still extracted in a
+        # worker, where the per-page timeout can be enforced
+        step = max(1, num_pages)
+    else:
+        # Several ranges per worker so one slow range doesn't idle the rest
+        step = max(1, -(-num_pages // (workers * 4)))
+    ranges = iter([
+        (start, min(start + step, num_pages))
+        for start in range(0, num_pages, step)
+    ])
+
+    # Only a bounded number of ranges is in flight (or finished but not
+    # yet consumed), so memory doesn't grow with the page count
+    pending = deque()
+    try:
+        pool = _get_pool()
+        for start, stop in itertools.islice(ranges, workers * 2):
+            pending.append(pool.submit(_extract_page_range, path, start, stop, page_timeout))
+
+        while pending:
+            extracted = pending.popleft().result()
+            for start, stop in itertools.islice(ranges, 1):
+                pending.append(pool.submit(_extract_page_range, path, start, stop, page_timeout))
+            yield from extracted
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
 
-    for page in reader.pages:
-        text += page.extract_text() or ""
 
-    return text
+@contextmanager
+def _as_path(source):
+    """
+    The PDF as a file path: bytes are written to a temporary file, so
+    pool workers are handed its path rather than a pickled copy each
+    """
+    if not isinstance(source, (bytes, bytearray)):
+        yield source
+        return
+
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(source)
+        yield path
+    finally:
+        os.remove(path)
+
+
+def iter_pdf_pages(source) -> Iterator[dict]:
+    """
+    Yields the pages of a PDF (bytes or a file path) one at a time, in
+    order, as {page_number, text, start, end} where start/end are offsets
+    into the concatenated document text.
+
+    Pages are extracted on a process pool, where pages that exceed
+    `pdf_page_timeout` are cut short and returned empty. Documents of
+    pdf_parallel_min_pages or more are split into page ranges extracted
+    concurrently.
+    """
+    with _as_path(source) as path:
+        yield from _iter_pdf_pages(path)
+
+
+def _iter_pdf_pages(path: str) -> Iterator[dict]:
+    page_timeout = settings.pdf_page_timeout
+    offset = 0
+
+    for idx, text, timed_out in _iter_extracted(path, count_pdf_pages(path), page_timeout):
+        if timed_out:
+            warnings.warn(f"PDF page {idx + 1} timed out after {page_timeout}s; skipped")
+        yield {
+            "page_number": idx + 1,
+            "text": text,
+            "start": offset,
+            "end": offset + len(text),
+        }
+        offset += len(text)
+
+
+def extract_pages_from_pdf(source) -> list[dict]:
+    """
+    Extracts every page of a PDF; see iter_pdf_pages
+    """
+    return list(iter_pdf_pages(source))
+
+
+def extract_text_from_pdf_bytes(file_bytes: bytes) -> str:
+    return "".join(
+        page["text"] for page in extract_pages_from_pdf(file_bytes)
+    )
+
 
 def delete_file(storage_path: str):
-    supabase.storage \
+    get_supabase().storage \
         .from_(settings.SUPABASE_BUCKET) \
         .remove([storage_path])
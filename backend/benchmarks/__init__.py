@@ -0,0 +1,21 @@
+"""
+Benchmarks run against in-process fakes, so the app settings get harmless
+defaults here (before any `app` module is imported) unless the
+environment already provides them.
+"""
+import os
+import tempfile
+
+_DEFAULTS = {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_SERVICE_KEY": "benchmark",
+    "GROQ_API_KEY": "benchmark",
+    "JWT_SECRET": "benchmark",
+    "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.gettempdir(), 'doc-intel-bench.db')}",
+    "VECTOR_BACKEND": "local",
+    "LOCAL_INDEX_DIR": os.path.join(tempfile.gettempdir(), "doc-intel-bench-index"),
+    "CACHE_BACKEND": "none",
+}
+
+for _key, _value in _DEFAULTS.items():
+    os.environ.setdefault(_key, _value)
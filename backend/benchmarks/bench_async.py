@@ -0,0 +1,91 @@
+"""
+Load benchmark: sync request path (threadpool) vs async path (event loop).
+
+Both paths run the real RAG pipeline against FakeVectorStore / FakeLLM with
+injected latency. The sync path is capped by a threadpool the size of
+Starlette's default (40), the async path only by client concurrency.
+
+With --distinct N the requests cycle through N questions, so concurrent
+identical questions are coalesced; llm_calls shows how many generations
+they actually cost.
+
+    cd backend && python -m benchmarks.bench_async --requests 400 --concurrency 200
+    cd backend && python -m benchmarks.bench_async --distinct 5 --cache none
+"""
+import argparse
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import summarize
+from benchmarks.fakes import FakeLLM, FakeVectorStore
+from app.core.clients import override_client
+from app.core.config import settings
+from app.services.cache import set_cache
+from app.services.rag import arun_rag, run_rag
+from app.services.vector_backends import set_vector_stores
+
+
+def bench_sync(requests: int, threadpool: int, distinct: int, llm: FakeLLM) -> dict:
+    calls = llm.calls
+
+    def one(i):
+        t0 = time.perf_counter()
+        run_rag(query=f"question {i % distinct}", namespace="bench")
+        return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threadpool) as pool:
+        latencies = list(pool.map(one, range(requests)))
+    return summarize("sync", latencies, time.perf_counter() - started, llm_calls=llm.calls - calls)
+
+
+async def bench_async(requests: int, concurrency: int, distinct: int, llm: FakeLLM) -> dict:
+    limit = asyncio.Semaphore(concurrency)
+    calls = llm.calls
+
+    async def one(i):
+        async with limit:
+            t0 = time.perf_counter()
+            await arun_rag(query=f"question {i % distinct}", namespace="bench")
+            return time.perf_counter() - t0
+
+    started = time.perf_counter()
+    latencies = await asyncio.gather(*(one(i) for i in range(requests)))
+    return summarize("async", list(latencies), time.perf_counter() - started, llm_calls=llm.calls - calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threadpool", type=int, default=40)
+    parser.add_argument("--search-latency", type=float, default=0.05)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--distinct", type=int, help="distinct questions (default: one per request)")
+    parser.add_argument("--cache", choices=["memory", "none"], default="memory", help="answer cache")
+    args = parser.parse_args()
+    distinct = args.distinct or args.requests
+
+    set_vector_stores(
+        dense=FakeVectorStore(latency=args.search_latency),
+        sparse=FakeVectorStore(latency=args.search_latency)
+    )
+    llm = FakeLLM(latency=args.llm_latency)
+    override_client("llm", llm)
+    # This compares request paths, not backend capacity (see bench_fairness)
+    settings.scheduler_enabled = False
+    if args.cache == "none":
+        set_cache(None)
+        settings.cache_backend = "none"
+
+    results = [
+        bench_sync(args.requests, args.threadpool, distinct, llm),
+        asyncio.run(bench_async(args.requests, args.concurrency, distinct, llm)),
+    ]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Chunking throughput and equivalence on multi-megabyte texts of a few
+shapes (blank-line paragraphs, wrapped lines, one flat run of sentences,
+words without punctuation):
+
+  langchain[<shape>]     RecursiveCharacterTextSplitter (when installed)
+  chunk_text[<shape>]    native splitter over the whole text
+  chunk_pages[<shape>]   native streaming over pages
+
+Before timing, every shape is checked: chunk_text must return exactly
+LangChain's chunks, and chunk_pages the chunks of chunk_text with
+offsets and pages that point back at them. Any mismatch exits non-zero.
+
+Results go to benchmarks/results/chunking-<commit>.json.
+
+    cd backend && python -m benchmarks.bench_chunking --megabytes 4
+"""
+import argparse
+import json
+import random
+import sys
+import textwrap
+import time
+
+from benchmarks.common import summarize, write_results
+from benchmarks.pdfs import synthetic_text
+from app.services.chunking import SEPARATORS, chunk_pages, chunk_text, get_chunking_config
+
+DOC_TYPE = "general"
+PURPOSE = "qa"
+
+
+def shapes(megabytes: float, rng: random.Random) -> dict:
+    paragraphs = synthetic_text(int(megabytes * 1024 * 1024 / 7), rng)
+    return {
+        "paragraphs": "\n\n".join(paragraphs),
+        "lines": "\n".join(textwrap.fill(p, 90) for p in paragraphs),
+        "flat": " ".join(paragraphs),
+        "words": " ".join(p.replace(".", "") for p in paragraphs),
+    }
+
+
+def paginate(text: str, rng: random.Random) -> list[dict]:
+    pages = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(1500, 4000)
+        pages.append({"page_number": len(pages) + 1, "text": text[pos:pos + size]})
+        pos += size
+    return pages
+
+
+def langchain_splitter():
+    try:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+    except ImportError:
+        return None
+    chunk_size, overlap = get_chunking_config(DOC_TYPE, PURPOSE)
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size,
+        chunk_overlap=overlap,
+        separators=list(SEPARATORS)
+    )
+
+
+def check(name: str, text: str, pages: list[dict], reference) -> list[str]:
+    """
+    Returns a description of every way the native chunkers disagree
+    """
+    problems = []
+    chunks = chunk_text(text, DOC_TYPE, PURPOSE)
+
+    if reference is not None:
+        expected = reference.split_text(text)
+        if chunks != expected:
+            first = next((i for i, (a, b) in enumerate(zip(chunks, expected)) if a != b), min(len(chunks), len(expected)))
+            problems.append(f"{name}: chunk_text differs from langchain at chunk {first} ({len(chunks)} vs {len(expected)} chunks)")
+
+    page_starts = []
+    offset = 0
+    for page in pages:
+        page_starts.append((offset, page["page_number"]))
+        offset += len(page["text"])
+
+    def page_at(pos):
+        return max(number for start, number in page_starts if start <= pos)
+
+    records = list(chunk_pages(pages, DOC_TYPE, PURPOSE))
+    if [r["text"] for r in records] != chunks:
+        problems.append(f"{name}: chunk_pages differs from chunk_text ({len(records)} vs {len(chunks)} chunks)")
+    for r in records[::max(1, len(records) // 200)]:
+        if text[r["start"]:r["end"]] != r["text"]:
+            problems.append(f"{name}: offsets {r['start']}:{r['end']} do not match the chunk text")
+            break
+        if (r["page"], r["page_end"]) != (page_at(r["start"]), page_at(r["end"] - 1)):
+            problems.append(f"{name}: wrong page range for chunk at {r['start']}")
+            break
+
+    return problems
+
+
+def timed(name: str, repeat: int, fn, **extra) -> dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return summarize(name, latencies, time.perf_counter() - started, **extra)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--megabytes", type=float, default=4.0, help="size of each input text")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/chunking-<commit>.json)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    reference = langchain_splitter()
+    if reference is None:
+        print("langchain_text_splitters not installed: skipping the reference splitter")
+
+    results = []
+    problems = []
+
+    for name, text in shapes(args.megabytes, rng).items():
+        pages = paginate(text, rng)
+        problems += check(name, text, pages, reference)
+
+        if reference is not None:
+            results.append(timed(
+                f"langchain[{name}]", args.repeat,
+                lambda: reference.split_text(text),
+                chars=len(text)
+            ))
+        results.append(timed(
+            f"chunk_text[{name}]", args.repeat,
+            lambda: chunk_text(text, DOC_TYPE, PURPOSE),
+            chars=len(text)
+        ))
+        results.append(timed(
+            f"chunk_pages[{name}]", args.repeat,
+            lambda: sum(1 for _ in chunk_pages(pages, DOC_TYPE, PURPOSE)),
+            chars=len(text), pages=len(pages)
+        ))
+
+    print(json.dumps(results, indent=2))
+    path = write_results("chunking", results, params=vars(args), output=args.output)
+    print(f"results written to {path}")
+
+    if problems:
+        sys.exit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
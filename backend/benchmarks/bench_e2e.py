@@ -0,0 +1,198 @@
+"""
+End-to-end benchmark of the real FastAPI app (`app.main:app`) with the
+external services replaced by in-process fakes:
+
+  Pinecone  FakeIndex behind the real PineconeVectorStore (dense + sparse)
+  Supabase  FakeSupabase storage
+  Groq      FakeLLM
+
+Each fake takes an injected latency. Requests go through httpx's ASGI
+transport, so routing, auth, the database (a fresh SQLite file per run)
+and the ingestion workers all run for real. Reports latency percentiles
+and throughput for login, upload (accept and full ingestion) and query,
+and writes them to benchmarks/results/e2e-<commit>.json.
+
+    cd backend && python -m benchmarks.bench_e2e --uploads 20 --queries 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+_workdir = tempfile.mkdtemp(prefix="doc-intel-e2e-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'bench.db')}"
+os.environ["INGESTION_SPOOL_DIR"] = os.path.join(_workdir, "spool")
+os.environ.setdefault("CACHE_BACKEND", "none")
+
+import httpx
+
+from benchmarks.common import summarize, write_results
+from benchmarks.fakes import FakeAsyncIndex, FakeIndex, FakeLLM, FakeSupabase
+from benchmarks.pdfs import SIZES, VOCABULARY, make_pdf
+from app.core.clients import override_client
+from app.main import app
+from app.services.vector_backends import set_vector_stores
+from app.services.vector_backends.pinecone_store import PineconeVectorStore
+
+
+def install_fakes(index_latency: float, storage_latency: float, llm_latency: float) -> dict:
+    dense = FakeIndex(latency=index_latency)
+    sparse = FakeIndex(latency=index_latency)
+    set_vector_stores(
+        dense=PineconeVectorStore(dense, async_index_factory=lambda: FakeAsyncIndex(dense)),
+        sparse=PineconeVectorStore(sparse, async_index_factory=lambda: FakeAsyncIndex(sparse))
+    )
+
+    storage = FakeSupabase(latency=storage_latency)
+    override_client("supabase", storage)
+    override_client("supabase_async", storage.async_view())
+    override_client("llm", FakeLLM(latency=llm_latency))
+    return {"dense": dense, "sparse": sparse, "storage": storage}
+
+
+async def run_phase(name: str, count: int, concurrency: int, call) -> dict:
+    """
+    Runs `call(i)` for i in range(count) with at most `concurrency` in
+    flight. `call` returns True on success; failures count as errors
+    and are left out of the latencies.
+    """
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(i):
+        nonlocal errors
+        async with limit:
+            t0 = time.perf_counter()
+            try:
+                ok = await call(i)
+            except Exception:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - t0)
+            else:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return summarize(name, latencies, time.perf_counter() - started, errors=errors)
+
+
+async def bench(args) -> list[dict]:
+    rng = random.Random(args.seed)
+    sizes = [s.strip() for s in args.pdf_sizes.split(",")]
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            # ---- Users (setup, not timed) ----
+            users = []
+            for u in range(args.users):
+                email, password = f"bench{u}@example.com", "bench-password"
+                r = await client.post("/auth/register", params={"email": email, "password": password})
+                r.raise_for_status()
+                users.append({"id": r.json()["id"], "email": email, "password": password})
+
+            async def login(i):
+                user = users[i % len(users)]
+                r = await client.post("/auth/login", params={"email": user["email"], "password": user["password"]})
+                if r.status_code == 200:
+                    user["token"] = r.json()["token"]
+                return r.status_code == 200
+
+            results = [await run_phase("login", max(args.logins, len(users)), args.concurrency, login)]
+
+            def headers(user):
+                return {"Authorization": f"Bearer {user['token']}"}
+
+            # ---- Uploads: accept latency and time until ingested ----
+            pdfs = [
+                (f"bench-{i}-{sizes[i % len(sizes)]}.pdf", make_pdf(SIZES[sizes[i % len(sizes)]], seed=args.seed + i))
+                for i in range(args.uploads)
+            ]
+            submitted = {}
+
+            async def upload(i):
+                user = users[i % len(users)]
+                filename, data = pdfs[i]
+                r = await client.post(
+                    "/documents/upload",
+                    files={"file": (filename, data, "application/pdf")},
+                    headers=headers(user)
+                )
+                if r.status_code == 202:
+                    submitted[i] = (user, r.json()["job_id"], time.perf_counter())
+                return r.status_code == 202
+
+            results.append(await run_phase("upload_accept", args.uploads, args.concurrency, upload))
+
+            async def ingested(i):
+                """
+                Polls the job; returns seconds from submission to success
+                """
+                user, job_id, submitted_at = submitted[i]
+                while True:
+                    r = await client.get(f"/documents/jobs/{job_id}", headers=headers(user))
+                    status = r.json()["status"]
+                    if status == "succeeded":
+                        return time.perf_counter() - submitted_at
+                    if status == "failed":
+                        return None
+                    await asyncio.sleep(args.poll_interval)
+
+            # Measured from submission, so this is end-to-end ingestion time
+            done = await asyncio.gather(*(ingested(i) for i in submitted))
+            first_submit = min((s[2] for s in submitted.values()), default=time.perf_counter())
+            results.append(summarize(
+                "upload_ingest",
+                [latency for latency in done if latency is not None],
+                time.perf_counter() - first_submit,
+                errors=sum(latency is None for latency in done)
+            ))
+
+            # ---- Queries against the ingested documents ----
+            async def query(i):
+                user = users[i % len(users)]
+                question = " ".join(rng.choice(VOCABULARY) for _ in range(6)) + "?"
+                r = await client.post(
+                    "/query/",
+                    params={"question": question, "namespace": f"user_{user['id']}"},
+                    headers=headers(user)
+                )
+                return r.status_code == 200
+
+            results.append(await run_phase("query", args.queries, args.concurrency, query))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--pdf-sizes", default="small,medium", help=f"comma-separated, from {sorted(SIZES)}")
+    parser.add_argument("--index-latency", type=float, default=0.02)
+    parser.add_argument("--storage-latency", type=float, default=0.02)
+    parser.add_argument("--llm-latency", type=float, default=0.3)
+    parser.add_argument("--poll-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/e2e-<commit>.json)")
+    args = parser.parse_args()
+
+    install_fakes(args.index_latency, args.storage_latency, args.llm_latency)
+    results = asyncio.run(bench(args))
+
+    print(json.dumps(results, indent=2))
+    path = write_results("e2e", results, params=vars(args), output=args.output)
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Fairness under abusive load: interactive tenants asking one question at
+a time while one tenant hammers arun_rag from many concurrent loops, all
+against a FakeLLM that serves at most --llm-capacity generations at once.
+
+Modes:
+
+  off        no scheduler: every call goes straight to the provider
+  fair       concurrency cap + weighted fair queuing, no rate limits
+  fair+rate  as fair, plus per-tenant token buckets (429 when exceeded)
+
+Reports interactive latency percentiles per mode, and how many abusive
+calls were answered or refused.
+
+Results go to benchmarks/results/fairness-<commit>.json.
+
+    cd backend && python -m benchmarks.bench_fairness --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import time
+
+from benchmarks.common import summarize, write_results
+from benchmarks.fakes import FakeLLM, FakeVectorStore
+from app.core.clients import override_client, reset_client
+from app.core.config import settings
+from app.services.cache import set_cache
+from app.services.rag import arun_rag
+from app.services.scheduler import RESOURCES, RateLimited, tenant_scope
+from app.services.vector_backends import set_vector_stores
+
+_questions = itertools.count()
+
+
+async def ask(tenant: str) -> str:
+    with tenant_scope(tenant):
+        try:
+            # Distinct questions, so nothing is coalesced
+            await arun_rag(query=f"{tenant} question {next(_questions)}", namespace="bench")
+            return "ok"
+        except RateLimited:
+            return "refused"
+
+
+async def run_mode(args) -> dict:
+    for resource in RESOURCES:
+        reset_client(f"scheduler:{resource}")
+    stop = time.monotonic() + args.duration
+    interactive = []
+    abusive = {"ok": 0, "refused": 0}
+
+    async def user(tenant: str):
+        while time.monotonic() < stop:
+            t0 = time.perf_counter()
+            outcome = await ask(tenant)
+            if outcome == "ok":
+                interactive.append(time.perf_counter() - t0)
+            await asyncio.sleep(args.think_time)
+
+    async def abuser():
+        while time.monotonic() < stop:
+            outcome = await ask("abuser")
+            abusive[outcome] += 1
+            if outcome == "refused":
+                await asyncio.sleep(0.05)
+
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(user(f"user{i}") for i in range(args.users)),
+        *(abuser() for _ in range(args.abuse_concurrency))
+    )
+    return interactive, abusive, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per mode")
+    parser.add_argument("--users", type=int, default=4, help="interactive tenants")
+    parser.add_argument("--think-time", type=float, default=0.2)
+    parser.add_argument("--abuse-concurrency", type=int, default=64)
+    parser.add_argument("--llm-capacity", type=int, default=8)
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/fairness-<commit>.json)")
+    args = parser.parse_args()
+
+    set_vector_stores(
+        dense=FakeVectorStore(latency=args.search_latency),
+        sparse=FakeVectorStore(latency=args.search_latency)
+    )
+    override_client("llm", FakeLLM(latency=args.llm_latency, capacity=args.llm_capacity))
+    set_cache(None)
+    settings.cache_backend = "none"
+    settings.llm_max_concurrency = args.llm_capacity
+
+    modes = {
+        "off": {"scheduler_enabled": False},
+        "fair": {"scheduler_enabled": True, "llm_tenant_rate": 0.0, "search_tenant_rate": 0.0},
+        "fair+rate": {"scheduler_enabled": True, "llm_tenant_rate": 1.0, "search_tenant_rate": 5.0},
+    }
+
+    results = []
+    for mode, overrides in modes.items():
+        for name, value in overrides.items():
+            setattr(settings, name, value)
+        interactive, abusive, elapsed = asyncio.run(run_mode(args))
+        results.append(summarize(
+            f"interactive[{mode}]", interactive, elapsed,
+            abusive_ok=abusive["ok"], abusive_refused=abusive["refused"]
+        ))
+
+    print(json.dumps(results, indent=2))
+    path = write_results("fairness", results, params=vars(args), output=args.output)
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
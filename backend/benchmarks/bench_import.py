@@ -0,0 +1,118 @@
+"""
+Cold-start benchmark: wall time of `python -c "import app.main"` in a fresh
+interpreter, plus the slowest modules reported by `-X importtime`.
+
+Importing the app should not create any external client or pull in
+LangChain / Pinecone / Supabase / pypdf; those load on first use.
+
+    cd backend && python -m benchmarks.bench_import --runs 10 --output import.json
+    cd backend && python -m benchmarks.bench_import --bare-env   # no service settings at all
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmarks import _DEFAULTS
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+IMPORT_STMT = "import app.main"
+
+# Modules that must stay out of the import path
+DEFERRED = ("langchain_core", "langchain_groq", "langchain_text_splitters", "pinecone", "supabase", "pypdf", "tiktoken")
+
+
+def _env(bare: bool) -> dict:
+    env = dict(os.environ)
+    if bare:
+        for key in _DEFAULTS:
+            env.pop(key, None)
+    return env
+
+
+def time_import(env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-c", IMPORT_STMT],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL
+    )
+    return time.perf_counter() - started
+
+
+def import_profile(env: dict, top: int) -> tuple[list[dict], list[str]]:
+    """
+    Returns the `top` modules by cumulative import time and any
+    deferred modules that were imported anyway
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", IMPORT_STMT],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True
+    )
+
+    modules = []
+    for line in proc.stderr.splitlines():
+        # "import time:   self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules.append({
+            "module": name.strip(),
+            "self_ms": round(int(self_us) / 1000, 2),
+            "cumulative_ms": round(int(cumulative_us) / 1000, 2),
+        })
+
+    leaked = sorted({
+        m["module"] for m in modules
+        if m["module"].split(".")[0] in DEFERRED
+    })
+    modules.sort(key=lambda m: m["cumulative_ms"], reverse=True)
+    return modules[:top], leaked
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--bare-env", action="store_true", help="drop service settings from the environment")
+    parser.add_argument("--budget-ms", type=float, help="exit non-zero if the median exceeds this")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    env = _env(args.bare_env)
+    time_import(env)  # warm the filesystem / bytecode caches
+    timings = [time_import(env) for _ in range(args.runs)]
+    slowest, leaked = import_profile(env, args.top)
+
+    result = {
+        "statement": IMPORT_STMT,
+        "runs": args.runs,
+        "bare_env": args.bare_env,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+        "deferred_modules_imported": leaked,
+        "slowest_modules": slowest,
+    }
+    print(json.dumps(result, indent=2))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.budget_ms is not None and result["median_ms"] > args.budget_ms:
+        sys.exit(f"import took {result['median_ms']}ms, budget is {args.budget_ms}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+"""
+Lexical (BM25) index: upsert throughput and query latency for keyword
+queries on synthetic chunks tagged with policy numbers and clause ids:
+
+  upsert          BM25Store.upsert, one call per batch (one segment each)
+  search[<n>]     queries against <n> segments (before / after merging)
+
+Before timing, search results are checked against a brute-force BM25
+over the live records, after upserts, overwrites and deletes, after a
+merge, and after reopening the index from disk. Any mismatch exits
+non-zero.
+
+Results go to benchmarks/results/lexical-<commit>.json.
+
+    cd backend && python -m benchmarks.bench_lexical --chunks 50000
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from benchmarks.common import summarize, write_results
+from benchmarks.pdfs import synthetic_text
+from app.services.vector_backends.bm25_store import BM25Store, tokenize
+
+NAMESPACE = "bench"
+FIELDS = ["text", "document_id"]
+K1 = 1.2
+B = 0.75
+
+
+def make_records(count: int, rng: random.Random) -> list[dict]:
+    paragraphs = synthetic_text(count * 60, rng)
+    records = []
+    for i in range(count):
+        text = paragraphs[i % len(paragraphs)]
+        tag = f"policy POL-{rng.randint(0, count // 4):06d} clause {rng.randint(1, 40)}.{rng.randint(1, 9)}"
+        records.append({
+            "_id": f"{i // 20}:{i:032x}",
+            "text": f"{tag} {text}",
+            "document_id": i // 20,
+        })
+    return records
+
+
+def reference_search(records: dict, query: str, top_k: int) -> list[tuple[str, float]]:
+    """
+    BM25 over every live record, scaled like BM25Store
+    """
+    docs = {_id: Counter(tokenize(r["text"])) for _id, r in records.items()}
+    n = len(docs)
+    avgdl = sum(sum(c.values()) for c in docs.values()) / n
+    idf = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for c in docs.values() if term in c)
+        if df:
+            idf[term] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+    bound = sum(idf.values()) * (K1 + 1)
+    scores = {}
+    for _id, counts in docs.items():
+        length = sum(counts.values())
+        score = sum(
+            weight * counts[term] * (K1 + 1) / (counts[term] + K1 * (1 - B + B * length / avgdl))
+            for term, weight in idf.items() if term in counts
+        )
+        if score:
+            scores[_id] = score / bound
+    return sorted(scores.items(), key=lambda x: -x[1])[:top_k]
+
+
+def check(stage: str, store: BM25Store, records: dict, queries: list[str], top_k: int) -> list[str]:
+    # Document frequencies count deleted rows until they are merged away,
+    # so only fully merged indexes are compared score for score
+    problems = []
+    for query in queries:
+        found = [(h["_id"], h["_score"]) for h in store.search(NAMESPACE, query, top_k, FIELDS)]
+        expected = reference_search(records, query, top_k)
+        # Scores are accumulated in float32
+        if len(found) != len(expected) or any(
+            abs(a - b) > 1e-5 for (_, a), (_, b) in zip(found, expected)
+        ):
+            problems.append(f"{stage}: scores differ for {query!r}")
+        elif any(_id not in records for _id, _ in found):
+            problems.append(f"{stage}: deleted record returned for {query!r}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=96, help="records per upsert (upsert_batch_size)")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--check-chunks", type=int, default=2000, help="size of the index checked against the reference")
+    parser.add_argument("--top-k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/lexical-<commit>.json)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    problems = []
+
+    # ---------- equivalence ----------
+    with tempfile.TemporaryDirectory() as root:
+        store = BM25Store(root, k1=K1, b=B, merge_factor=4)
+        records = make_records(args.check_chunks, rng)
+        live = {}
+        for start in range(0, len(records), args.batch):
+            batch = records[start:start + args.batch]
+            store.upsert(NAMESPACE, batch)
+            live.update((r["_id"], r) for r in batch)
+
+        # Overwrite some records, delete some, and a whole document
+        for r in rng.sample(records, len(records) // 10):
+            r = {**r, "text": r["text"] + " amended"}
+            store.upsert(NAMESPACE, [r])
+            live[r["_id"]] = r
+        gone = [r["_id"] for r in rng.sample(records, len(records) // 10)]
+        store.delete_records(NAMESPACE, gone)
+        for _id in gone:
+            live.pop(_id, None)
+        store.delete_document(NAMESPACE, 3)
+        live = {_id: r for _id, r in live.items() if r["document_id"] != 3}
+
+        queries = [
+            " ".join(tokenize(rng.choice(records)["text"])[:2]) for _ in range(20)
+        ] + ["amended", "clause 12.3", "nothing-matches-this"]
+
+        if sorted(store.list_ids(NAMESPACE, "")) != sorted(live):
+            problems.append("list_ids differs from the live records")
+
+        store.merge(NAMESPACE)
+        problems += check("merged", store, live, queries, args.top_k)
+        problems += check("reopened", BM25Store(root, k1=K1, b=B), live, queries, args.top_k)
+
+    # Rows overwritten many times stay in the postings until merged: the
+    # ranking must not flip while they do
+    with tempfile.TemporaryDirectory() as root:
+        store = BM25Store(root, k1=K1, b=B, merge_factor=100)
+        repeated = [
+            {"_id": "a", "text": "policy policy policy", "document_id": 1},
+            {"_id": "b", "text": "policy and some unrelated words here", "document_id": 1},
+            {"_id": "c", "text": "filler one", "document_id": 1},
+            {"_id": "d", "text": "filler two", "document_id": 1},
+        ]
+        for _ in range(10):
+            store.upsert(NAMESPACE, repeated)
+        ranked = [h["_id"] for h in store.search(NAMESPACE, "policy", 4, FIELDS)]
+        if ranked[:1] != ["a"]:
+            problems.append(f"overwritten: ranking {ranked} before merging")
+
+    # ---------- timing ----------
+    results = []
+    with tempfile.TemporaryDirectory() as root:
+        store = BM25Store(root, k1=K1, b=B)
+        records = make_records(args.chunks, rng)
+
+        latencies = []
+        started = time.perf_counter()
+        for start in range(0, len(records), args.batch):
+            t0 = time.perf_counter()
+            store.upsert(NAMESPACE, records[start:start + args.batch])
+            latencies.append(time.perf_counter() - t0)
+        results.append(summarize("upsert", latencies, time.perf_counter() - started, records=len(records), batch=args.batch))
+
+        queries = [
+            rng.choice([
+                f"POL-{rng.randint(0, args.chunks // 4):06d}",
+                f"policy POL-{rng.randint(0, args.chunks // 4):06d} clause {rng.randint(1, 40)}.{rng.randint(1, 9)}",
+                " ".join(rng.sample(tokenize(rng.choice(records)["text"]), 3)),
+            ])
+            for _ in range(args.queries)
+        ]
+
+        def search_all(label):
+            segments = store.namespace_stats(NAMESPACE)["segments"]
+            latencies = []
+            started = time.perf_counter()
+            for query in queries:
+                t0 = time.perf_counter()
+                store.search(NAMESPACE, query, args.top_k, FIELDS)
+                latencies.append(time.perf_counter() - t0)
+            results.append(summarize(f"search[{label}]", latencies, time.perf_counter() - started, segments=segments))
+
+        search_all("background")
+        store.merge(NAMESPACE)
+        search_all("merged")
+
+    print(json.dumps(results, indent=2))
+    path = write_results("lexical", results, params=vars(args), output=args.output)
+    print(f"results written to {path}")
+
+    if problems:
+        sys.exit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
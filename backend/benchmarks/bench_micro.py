@@ -0,0 +1,103 @@
+"""
+Micro-benchmarks for the CPU-bound steps of ingestion and retrieval:
+
+  extract_text_from_pdf_bytes  per synthetic PDF size
+  chunk_text                   per input text length
+  merge_hits                   per number of hits from two backends
+
+Results go to benchmarks/results/micro-<commit>.json.
+
+    cd backend && python -m benchmarks.bench_micro --repeat 20
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.common import summarize, write_results
+from benchmarks.pdfs import SIZES, make_pdf, synthetic_text
+from app.services.chunking import chunk_text
+from app.services.retriever import merge_hits
+from app.utils.file_loader import extract_text_from_pdf_bytes
+
+TEXT_LENGTHS = [10_000, 100_000, 1_000_000]
+HIT_COUNTS = [10, 100, 1000]
+
+
+def timed(name: str, repeat: int, fn, *args, **extra) -> dict:
+    fn(*args)  # warm-up (imports, pools, caches)
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t0)
+    return summarize(name, latencies, time.perf_counter() - started, **extra)
+
+
+def synthetic_hits(count: int, rng: random.Random) -> list[dict]:
+    """
+    Hits as two backends would return them: the second half of the ids
+    is returned by both, with different scores
+    """
+    def hit(i):
+        return {
+            "_id": f"doc-{i % 7}#{i}",
+            "_score": rng.random(),
+            "fields": {
+                "text": f"passage {i}",
+                "document_id": i % 7,
+                "filename": f"doc-{i % 7}.pdf",
+                "chunk_index": i,
+                "page": 1 + i // 10,
+            },
+        }
+
+    dense = [hit(i) for i in range(count)]
+    sparse = [hit(i) for i in range(count // 2, count + count // 2)]
+    return dense + sparse
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--pdf-sizes", default=",".join(SIZES), help=f"comma-separated, from {sorted(SIZES)}")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="result file (default: benchmarks/results/micro-<commit>.json)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = []
+
+    for size in (s.strip() for s in args.pdf_sizes.split(",")):
+        pdf = make_pdf(SIZES[size], seed=args.seed)
+        results.append(timed(
+            f"extract_text_from_pdf_bytes[{size}]", args.repeat,
+            extract_text_from_pdf_bytes, pdf,
+            pages=SIZES[size], bytes=len(pdf)
+        ))
+
+    corpus = "\n\n".join(synthetic_text(TEXT_LENGTHS[-1] // 6, rng))
+    for length in TEXT_LENGTHS:
+        text = corpus[:length]
+        results.append(timed(
+            f"chunk_text[{length}]", args.repeat,
+            lambda t: chunk_text(text=t, doc_type="general", purpose="qa"), text,
+            chars=len(text)
+        ))
+
+    for count in HIT_COUNTS:
+        hits = synthetic_hits(count, rng)
+        results.append(timed(
+            f"merge_hits[{count}]", args.repeat * 10,
+            merge_hits, hits, 5,
+            hits=len(hits)
+        ))
+
+    print(json.dumps(results, indent=2))
+    path = write_results("micro", results, params=vars(args), output=args.output)
+    print(f"results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
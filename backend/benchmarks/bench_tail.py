@@ -0,0 +1,187 @@
+"""
+Tail latency under slow replicas: searches and generations drawn from
+long-tailed latency distributions (lognormal, plus a small fraction of
+calls that hang), measured through the real retrieval and RAG pipeline.
+
+  retrieve[<mode>]   aretrieve_chunks / retrieve_chunks with hedging off
+                     and on; reports the searches issued per query
+  rag[<api>]         arun_rag / run_rag / astream_rag under --deadline:
+                     reports how many answers timed out (partial)
+
+Every rag call (or stream) must finish within the deadline plus --slack,
+and timed out answers must be marked as such; otherwise the run exits
+non-zero.
+
+Results go to benchmarks/results/tail-<commit>.json.
+
+    cd backend && python -m benchmarks.bench_tail --queries 400
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import summarize, write_results
+from benchmarks.fakes import FakeLLM, FakeVectorStore, lognormal_latency, tail_latency
+from app.core.clients import override_client
+from app.core.config import settings
+from app.services.cache import set_cache
+from app.services.hedging import reset_trackers
+from app.services.rag import arun_rag, astream_rag, run_rag
+from app.services.retriever import aretrieve_chunks, retrieve_chunks
+from app.services.vector_backends import set_vector_stores
+
+NAMESPACE = "bench"
+
+
+def make_stores(args) -> tuple:
+    dense = FakeVectorStore(latency=tail_latency(
+        lognormal_latency(args.search_median, seed=1), args.search_tail, args.tail_rate, seed=2
+    ))
+    sparse = FakeVectorStore(latency=tail_latency(
+        lognormal_latency(args.search_median / 4, seed=3), args.search_tail, args.tail_rate, seed=4
+    ))
+    set_vector_stores(dense=dense, sparse=sparse)
+    reset_trackers()
+    return dense, sparse
+
+
+async def run_async(fn, queries: list[str], concurrency: int) -> tuple:
+    limit = asyncio.Semaphore(concurrency)
+    latencies = []
+    results = []
+
+    async def one(query):
+        async with limit:
+            t0 = time.perf_counter()
+            results.append(await fn(query))
+            latencies.append(time.perf_counter() - t0)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(q) for q in queries))
+    return latencies, results, time.perf_counter() - started
+
+
+async def consume_stream(query: str) -> dict:
+    answer = ""
+    timed_out = False
+    async for event, data in astream_rag(query=query, namespace=NAMESPACE):
+        if event == "token":
+            answer += data["text"]
+        elif event == "done":
+            timed_out = data.get("timed_out", False)
+    return {"answer": answer, "timed_out": timed_out}
+
+
+def run_sync(fn, queries: list[str], concurrency: int) -> tuple:
+    def one(query):
+        t0 = time.perf_counter()
+        result = fn(query)
+        return time.perf_counter() - t0, result
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        done = list(pool.map(one, queries))
+    return [d[0] for d in done], [d[1] for d in done], time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--search-median", type=float, default=0.02)
+    parser.add_argument("--search-tail", type=float, default=1.0, help="latency of a hung search")
+    parser.add_argument("--tail-rate", type=float, default=0.03, help="fraction of calls that hang")
+    parser.add_argument("--llm-median", type=float, default=0.2)
+    parser.add_argument("--llm-tail", type=float, default=10.0, help="first-token latency of a hung generation")
+    parser.add_argument("--deadline", type=float, default=1.0)
+    parser.add_argument("--slack", type=float, default=0.15, help="allowed overshoot of the deadline")
+    parser.add_argument("--output", help="result file (default: benchmarks/results/tail-<commit>.json)")
+    args = parser.parse_args()
+
+    set_cache(None)
+    settings.cache_backend = "none"
+    settings.scheduler_enabled = False
+    settings.query_singleflight_enabled = False
+    settings.sparse_search_timeout = settings.dense_search_timeout
+
+    queries = [f"question {i}" for i in range(args.queries)]
+    warmup = [f"warmup {i}" for i in range(settings.search_hedge_min_samples * 2)]
+    results = []
+    problems = []
+
+    # ---------- retrieval: hedging off / on ----------
+    for hedging in (False, True):
+        settings.search_hedging_enabled = hedging
+        mode = "hedged" if hedging else "plain"
+
+        dense, sparse = make_stores(args)
+        asyncio.run(run_async(lambda q: aretrieve_chunks(q, NAMESPACE), warmup, args.concurrency))
+        dense.searches = sparse.searches = 0
+        latencies, _, elapsed = asyncio.run(
+            run_async(lambda q: aretrieve_chunks(q, NAMESPACE), queries, args.concurrency)
+        )
+        results.append(summarize(
+            f"retrieve[async,{mode}]", latencies, elapsed,
+            searches_per_query=round((dense.searches + sparse.searches) / len(queries), 3)
+        ))
+
+        dense, sparse = make_stores(args)
+        run_sync(lambda q: retrieve_chunks(q, NAMESPACE), warmup, args.concurrency)
+        dense.searches = sparse.searches = 0
+        latencies, _, elapsed = run_sync(lambda q: retrieve_chunks(q, NAMESPACE), queries, args.concurrency)
+        results.append(summarize(
+            f"retrieve[sync,{mode}]", latencies, elapsed,
+            searches_per_query=round((dense.searches + sparse.searches) / len(queries), 3)
+        ))
+
+    # ---------- generation under a deadline ----------
+    settings.query_deadline_seconds = args.deadline
+    override_client("llm", FakeLLM(
+        latency=tail_latency(lognormal_latency(args.llm_median, seed=5), args.llm_tail, args.tail_rate, seed=6),
+        tokens=40,
+        token_latency=0.01
+    ))
+
+    runs = {
+        "async": lambda: asyncio.run(run_async(
+            lambda q: arun_rag(query=q, namespace=NAMESPACE), queries, args.concurrency
+        )),
+        "sync": lambda: run_sync(
+            lambda q: run_rag(query=q, namespace=NAMESPACE), queries, args.concurrency
+        ),
+        "stream": lambda: asyncio.run(run_async(consume_stream, queries, args.concurrency)),
+    }
+    for api, run in runs.items():
+        make_stores(args)
+        latencies, answers, elapsed = run()
+        timed_out = [a for a in answers if a["timed_out"]]
+        results.append(summarize(
+            f"rag[{api}]", latencies, elapsed,
+            deadline=args.deadline,
+            timed_out=len(timed_out),
+            partial=sum(1 for a in timed_out if a["answer"].startswith("token"))
+        ))
+
+        late = [l for l in latencies if l > args.deadline + args.slack]
+        if late:
+            problems.append(f"rag[{api}]: {len(late)} answers past the deadline (max {max(late):.3f}s)")
+        # A hung generation takes --llm-tail; anything clearly slower than
+        # the deadline must have been cut short (a stream that completes
+        # right at it may end a moment after)
+        slow = sum(1 for l in latencies if l >= args.deadline + 0.01)
+        if len(timed_out) < slow:
+            problems.append(f"rag[{api}]: {slow - len(timed_out)} answers at the deadline not marked timed_out")
+
+    print(json.dumps(results, indent=2))
+    path = write_results("tail", results, params=vars(args), output=args.output)
+    print(f"results written to {path}")
+
+    if problems:
+        sys.exit("\n".join(problems))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Shared helpers for the benchmark scripts: latency summaries and JSON
+result files keyed by git commit, so runs can be compared across commits
+with `python -m benchmarks.compare`.
+"""
+import json
+import os
+import platform
+import subprocess
+import time
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))]
+
+
+def summarize(name: str, latencies: list[float], elapsed: float, **extra) -> dict:
+    """
+    Latency percentiles (ms) and throughput for one benchmarked operation
+    """
+    latencies = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 2)
+
+    return {
+        "name": name,
+        "count": len(latencies),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_s": round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        "mean_ms": ms(sum(latencies) / len(latencies)) if latencies else 0.0,
+        "p50_ms": ms(percentile(latencies, 0.50)),
+        "p95_ms": ms(percentile(latencies, 0.95)),
+        "p99_ms": ms(percentile(latencies, 0.99)),
+        "max_ms": ms(latencies[-1]) if latencies else 0.0,
+        **extra,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(suite: str, results: list[dict], params: dict, output: str = None) -> str:
+    """
+    Writes {suite, commit, params, results} to `output`, or to
+    benchmarks/results/<suite>-<commit>.json. Returns the path.
+    """
+    commit = git_commit()
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{suite}-{commit}.json")
+
+    with open(output, "w") as f:
+        json.dump({
+            "suite": suite,
+            "commit": commit,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "params": params,
+            "results": results,
+        }, f, indent=2)
+    return output
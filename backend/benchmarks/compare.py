@@ -0,0 +1,70 @@
+"""
+Compares two benchmark result files (e.g. the same suite on two commits)
+and flags operations whose p50/p95 latency got slower by more than
+--threshold percent.
+
+    cd backend && python -m benchmarks.compare results/e2e-abc123.json results/e2e-def456.json
+"""
+import argparse
+import json
+import sys
+
+METRICS = ["p50_ms", "p95_ms", "throughput_per_s"]
+
+
+def _load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def _change(before: float, after: float) -> float:
+    if not before:
+        return 0.0
+    return (after - before) / before * 100
+
+
+def compare(base: dict, head: dict, threshold: float) -> tuple[list[str], list[str]]:
+    """
+    Returns (table lines, names of regressed operations)
+    """
+    base_results = {r["name"]: r for r in base["results"]}
+    lines = [f"{'operation':40} " + " ".join(f"{m:>24}" for m in METRICS)]
+    regressions = []
+
+    for result in head["results"]:
+        before = base_results.get(result["name"])
+        if before is None:
+            continue
+
+        cells = []
+        for metric in METRICS:
+            change = _change(before[metric], result[metric])
+            cells.append(f"{before[metric]:>9} -> {result[metric]:<9}{change:+5.0f}%")
+        lines.append(f"{result['name']:40} " + " ".join(f"{c:>24}" for c in cells))
+
+        slower = max(_change(before[m], result[m]) for m in ("p50_ms", "p95_ms"))
+        if slower > threshold:
+            regressions.append(result["name"])
+
+    return lines, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent slowdown that counts as a regression")
+    args = parser.parse_args()
+
+    base, head = _load(args.base), _load(args.head)
+    print(f"{base['suite']}: {base['commit']} -> {head['commit']}")
+
+    lines, regressions = compare(base, head, args.threshold)
+    print("\n".join(lines))
+
+    if regressions:
+        sys.exit(f"regressed by more than {args.threshold}%: {', '.join(regressions)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,408 @@
+"""
+In-process stand-ins for external services, used by the benchmarks and
+for exercising the service layer without network access.
+"""
+import asyncio
+import random
+import threading
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app.services.vector_backends.base import VectorStore
+
+
+def lognormal_latency(median: float, sigma: float = 0.5, seed: int = 0):
+    """
+    Latency distribution: lognormal around `median` seconds
+    """
+    rng = random.Random(seed)
+    return lambda: median * rng.lognormvariate(0.0, sigma)
+
+
+def tail_latency(base, tail: float, p: float, seed: int = 0):
+    """
+    Latency distribution: `base` (seconds or a distribution), except a
+    fraction `p` of calls that take `tail` seconds (a stuck replica)
+    """
+    rng = random.Random(seed)
+    return lambda: tail if rng.random() < p else _draw(base)
+
+
+def _draw(latency) -> float:
+    # Fixed seconds, or a distribution from lognormal_latency / tail_latency
+    return latency() if callable(latency) else latency
+
+
+def _matches(record: dict, key: str, condition) -> bool:
+    # Pinecone metadata filter: a plain value, {"$eq": v} or {"$exists": bool}
+    if isinstance(condition, dict):
+        if "$exists" in condition:
+            return (key in record) == condition["$exists"]
+        return record.get(key) == condition["$eq"]
+    return record.get(key) == condition
+
+
+class FakeIndex:
+    """
+    Mimics the subset of the Pinecone Index API used by the app.
+
+    Every `upsert_records` call is recorded in `batches` as
+    (namespace, number of records). Failures can be injected with
+    `fail_rate` (random) or `fail_first` (the first N calls fail).
+    """
+
+    def __init__(self, latency: float = 0.0, fail_rate: float = 0.0, fail_first: int = 0, seed: int = 0):
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.fail_first = fail_first
+        self.records = {}
+        self.batches = []
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            call = self.calls
+            roll = self._random.random()
+        if call <= self.fail_first or roll < self.fail_rate:
+            raise RuntimeError(f"injected failure on call {call}")
+
+    def upsert_records(self, namespace, records):
+        if self.latency:
+            time.sleep(self.latency)
+        self._store(namespace, records)
+
+    def _store(self, namespace, records):
+        self._maybe_fail()
+
+        with self._lock:
+            self.batches.append((namespace, len(records)))
+            ns = self.records.setdefault(namespace, {})
+            for record in records:
+                ns[record["_id"]] = dict(record)
+
+    def delete(self, namespace, filter=None, ids=None):
+        with self._lock:
+            ns = self.records.get(namespace, {})
+            if ids is not None:
+                for _id in ids:
+                    ns.pop(_id, None)
+            elif filter:
+                for _id in [
+                    _id for _id, record in ns.items()
+                    if all(_matches(record, k, v) for k, v in filter.items())
+                ]:
+                    del ns[_id]
+
+    def update(self, id, set_metadata=None, namespace=None):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            record = self.records.get(namespace, {}).get(id)
+            if record is not None:
+                record.update(set_metadata or {})
+
+    def search(self, namespace, query, fields=None):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._search(namespace, query, fields)
+
+    def _search(self, namespace, query, fields=None):
+        words = set(query["inputs"]["text"].lower().split())
+        with self._lock:
+            records = list(self.records.get(namespace, {}).values())
+
+        hits = []
+        for record in records:
+            overlap = len(words & set(record["text"].lower().split()))
+            if overlap:
+                hits.append({
+                    "_id": record["_id"],
+                    "_score": overlap / (len(words) or 1),
+                    "fields": {
+                        k: v for k, v in record.items()
+                        if fields is None or k in fields
+                    },
+                })
+
+        hits.sort(key=lambda h: h["_score"], reverse=True)
+        return {"result": {"hits": hits[:query["top_k"]]}}
+
+    def list(self, prefix=None, namespace=None, limit=100):
+        with self._lock:
+            ids = [
+                _id for _id in self.records.get(namespace, {})
+                if prefix is None or _id.startswith(prefix)
+            ]
+        for start in range(0, len(ids), limit):
+            yield ids[start:start + limit]
+
+    def describe_index_stats(self):
+        with self._lock:
+            namespaces = {
+                name: SimpleNamespace(vector_count=len(records))
+                for name, records in self.records.items()
+            }
+        return SimpleNamespace(namespaces=namespaces, dimension=1024)
+
+
+class FakeAsyncIndex:
+    """
+    Asyncio view of a FakeIndex (the pinecone IndexAsyncio API): the
+    latency is awaited, then the call runs against the shared records
+    """
+
+    def __init__(self, index: FakeIndex):
+        self.index = index
+
+    async def upsert_records(self, namespace, records):
+        await asyncio.sleep(self.index.latency)
+        self.index._store(namespace, records)
+
+    async def search(self, namespace, query, fields=None):
+        await asyncio.sleep(self.index.latency)
+        return self.index._search(namespace, query, fields)
+
+    async def delete(self, namespace, filter=None, ids=None):
+        await asyncio.sleep(self.index.latency)
+        self.index.delete(namespace, filter=filter, ids=ids)
+
+
+def _read(file) -> bytes:
+    return file.read() if hasattr(file, "read") else bytes(file)
+
+
+class _FakeBucket:
+    def __init__(self, storage, bucket: str):
+        self.storage = storage
+        self.bucket = bucket
+
+    def upload(self, path, file):
+        self.storage._wait()
+        with self.storage._lock:
+            self.storage.objects[(self.bucket, path)] = _read(file)
+        return {"Key": f"{self.bucket}/{path}"}
+
+    def download(self, path):
+        self.storage._wait()
+        with self.storage._lock:
+            return self.storage.objects[(self.bucket, path)]
+
+    def remove(self, paths):
+        self.storage._wait()
+        with self.storage._lock:
+            for path in paths:
+                self.storage.objects.pop((self.bucket, path), None)
+        return []
+
+
+class _FakeAsyncBucket(_FakeBucket):
+    async def upload(self, path, file):
+        await asyncio.sleep(self.storage.latency)
+        with self.storage._lock:
+            self.storage.objects[(self.bucket, path)] = _read(file)
+        return {"Key": f"{self.bucket}/{path}"}
+
+    async def download(self, path):
+        await asyncio.sleep(self.storage.latency)
+        with self.storage._lock:
+            return self.storage.objects[(self.bucket, path)]
+
+    async def remove(self, paths):
+        await asyncio.sleep(self.storage.latency)
+        with self.storage._lock:
+            for path in paths:
+                self.storage.objects.pop((self.bucket, path), None)
+        return []
+
+
+class FakeSupabase:
+    """
+    Stand-in for the Supabase client's storage API
+    (`client.storage.from_(bucket).upload/download/remove`), keeping
+    objects in memory. `asynchronous=True` gives the AsyncClient shape.
+    Share `objects` between a sync and an async instance with `async_view`.
+    """
+
+    def __init__(self, latency: float = 0.0, asynchronous: bool = False):
+        self.latency = latency
+        self.objects = {}
+        self._lock = threading.Lock()
+        self._bucket_class = _FakeAsyncBucket if asynchronous else _FakeBucket
+        self.storage = SimpleNamespace(from_=lambda bucket: self._bucket_class(self, bucket))
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def async_view(self) -> "FakeSupabase":
+        view = FakeSupabase(latency=self.latency, asynchronous=True)
+        view.objects = self.objects
+        view._lock = self._lock
+        return view
+
+
+class FakeRedis:
+    """
+    Local stand-in for the redis client calls used by RedisCache
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value, ex=None):
+        with self._lock:
+            expires_at = time.monotonic() + ex if ex else None
+            self._data[key] = (str(value).encode("utf-8"), expires_at)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (b"0", None))
+            value = int(value) + 1
+            self._data[key] = (str(value).encode("utf-8"), expires_at)
+            return value
+
+
+class FakeVectorStore(VectorStore):
+    """
+    VectorStore with a per-call latency, fixed or drawn from a
+    distribution. The sync methods block a thread for it; the async ones
+    await it, like a real network client. `searches` counts search calls.
+    """
+
+    def __init__(self, latency: float = 0.05, hits: int = 5):
+        self.latency = latency
+        self.hits = hits
+        self.searches = 0
+
+    def _hits(self, top_k: int, fields: list[str]) -> list[dict]:
+        return [
+            {
+                "_id": f"doc-1#{i}",
+                "_score": 1.0 - i / 100,
+                "fields": {
+                    k: v for k, v in {
+                        "text": f"Synthetic passage {i} about the benchmark policy.",
+                        "document_id": 1,
+                        "filename": "bench.pdf",
+                        "chunk_index": i,
+                        "page": 1,
+                    }.items() if k in fields
+                },
+            }
+            for i in range(min(top_k, self.hits))
+        ]
+
+    def upsert(self, namespace, records):
+        time.sleep(_draw(self.latency))
+
+    async def aupsert(self, namespace, records):
+        await asyncio.sleep(_draw(self.latency))
+
+    def search(self, namespace, query, top_k, fields):
+        self.searches += 1
+        time.sleep(_draw(self.latency))
+        return self._hits(top_k, fields)
+
+    async def asearch(self, namespace, query, top_k, fields):
+        self.searches += 1
+        await asyncio.sleep(_draw(self.latency))
+        return self._hits(top_k, fields)
+
+    def delete_document(self, namespace, document_id):
+        time.sleep(_draw(self.latency))
+
+    async def adelete_document(self, namespace, document_id):
+        await asyncio.sleep(_draw(self.latency))
+
+    def delete_records(self, namespace, ids):
+        time.sleep(_draw(self.latency))
+
+    def delete_legacy_records(self, namespace, document_id):
+        time.sleep(_draw(self.latency))
+
+    def update_fields(self, namespace, updates):
+        time.sleep(_draw(self.latency))
+
+    def list_ids(self, namespace, prefix):
+        return []
+
+    def namespace_stats(self, namespace):
+        return {"backend": "fake", "vector_count": self.hits}
+
+
+class FakeLLM:
+    """
+    Stand-in for the ChatGroq client: `latency` to the first token (fixed
+    or a distribution), then `token_latency` per further token. `calls`
+    counts generations. With `capacity`, at most that many async
+    generations run at once and the rest queue first come first served,
+    like a saturated provider.
+    """
+
+    def __init__(self, latency: float = 0.3, tokens: int = 20, token_latency: float = 0.0, capacity: int = None):
+        self.latency = latency
+        self.tokens = tokens
+        self.token_latency = token_latency
+        self.capacity = capacity
+        self.calls = 0
+        self._slots = None
+
+    def _tokens(self):
+        return [f"token{i} " for i in range(self.tokens)]
+
+    @asynccontextmanager
+    async def _slot(self):
+        if self.capacity is None:
+            yield
+            return
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots[0] is not loop:
+            self._slots = (loop, asyncio.Semaphore(self.capacity))
+        async with self._slots[1]:
+            yield
+
+    def invoke(self, prompt):
+        self.calls += 1
+        time.sleep(_draw(self.latency) + self.token_latency * self.tokens)
+        return SimpleNamespace(content="".join(self._tokens()))
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        async with self._slot():
+            await asyncio.sleep(_draw(self.latency) + self.token_latency * self.tokens)
+        return SimpleNamespace(content="".join(self._tokens()))
+
+    def stream(self, prompt):
+        self.calls += 1
+        time.sleep(_draw(self.latency))
+        for token in self._tokens():
+            yield SimpleNamespace(content=token)
+            time.sleep(self.token_latency)
+
+    async def astream(self, prompt):
+        self.calls += 1
+        async with self._slot():
+            await asyncio.sleep(_draw(self.latency))
+            for token in self._tokens():
+                yield SimpleNamespace(content=token)
+                await asyncio.sleep(self.token_latency)
@@ -0,0 +1,96 @@
+"""
+Synthetic text PDFs for benchmarks. Written by hand (one Helvetica text
+stream per page) so no PDF library is needed to produce them, and
+deterministic for a given seed so runs are comparable.
+"""
+import random
+import textwrap
+
+SIZES = {
+    "small": 2,
+    "medium": 20,
+    "large": 100,
+}
+
+VOCABULARY = (
+    "policy employee contract payment invoice retention security access "
+    "review quarterly revenue customer support incident report compliance "
+    "audit vendor service level agreement termination notice period data "
+    "processing storage encryption backup recovery approval manager budget "
+    "forecast travel expense reimbursement onboarding training benefit "
+    "leave holiday schedule shift overtime project milestone delivery risk"
+).split()
+
+
+def synthetic_text(words: int, rng: random.Random) -> list[str]:
+    """
+    Returns paragraphs of sentence-like text totalling about `words` words
+    """
+    paragraphs = []
+    remaining = words
+    while remaining > 0:
+        sentences = []
+        for _ in range(rng.randint(2, 5)):
+            n = rng.randint(6, 18)
+            sentence = " ".join(rng.choice(VOCABULARY) for _ in range(n))
+            sentences.append(sentence.capitalize() + ".")
+            remaining -= n
+        paragraphs.append(" ".join(sentences))
+    return paragraphs
+
+
+def _escape(line: str) -> str:
+    return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _page_stream(lines: list[str]) -> bytes:
+    ops = ["BT", "/F1 10 Tf", "12 TL", "50 790 Td"]
+    for line in lines:
+        ops.append(f"({_escape(line)}) Tj T*")
+    ops.append("ET")
+    return "\n".join(ops).encode("latin-1")
+
+
+def make_pdf(pages: int, words_per_page: int = 350, seed: int = 0) -> bytes:
+    """
+    Builds a PDF with `pages` pages of synthetic text. Every page carries
+    the same running header, like real reports do.
+    """
+    rng = random.Random(seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page object numbers are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+
+    page_refs = []
+    for number in range(1, pages + 1):
+        lines = [f"Synthetic benchmark document - page {number}", ""]
+        for paragraph in synthetic_text(words_per_page, rng):
+            lines.extend(textwrap.wrap(paragraph, width=95))
+            lines.append("")
+
+        stream = _page_stream(lines[:64])
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(len(objects))
+
+    kids = " ".join(f"{ref} 0 R" for ref in page_refs).encode()
+    objects[1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, pages)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
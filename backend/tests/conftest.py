@@ -0,0 +1,91 @@
+"""
+Shared fixtures. Settings are read when app modules are first imported,
+so the environment points at a throwaway SQLite database and spool
+directory before any of them is.
+"""
+import io
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="doc-intel-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["INGESTION_SPOOL_DIR"] = os.path.join(_workdir, "spool")
+os.environ["LOCAL_INDEX_DIR"] = os.path.join(_workdir, "local_index")
+os.environ["LEXICAL_INDEX_DIR"] = os.path.join(_workdir, "lexical_index")
+os.environ["CACHE_BACKEND"] = "none"
+
+import pytest
+
+from benchmarks.fakes import FakeAsyncIndex, FakeIndex, FakeLLM, FakeSupabase
+from app.core.clients import override_client, reset_client
+from app.core.database import Base, get_engine
+from app.models.document import Document, DocumentChunk  # noqa: F401 (tables)
+from app.models.usage import Usage, UsageDaily  # noqa: F401
+from app.models.user import User  # noqa: F401
+from app.services.ingestion import enqueue_ingestion, run_ingestion_job, run_reindex_job, spool_upload
+from app.services.job_queue import get_job_queue
+from app.services.vector_backends import set_vector_stores
+from app.services.vector_backends.pinecone_store import PineconeVectorStore
+
+
+@pytest.fixture
+def db():
+    """
+    Empty tables for the test
+    """
+    engine = get_engine()
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    yield engine
+
+
+@pytest.fixture
+def services(db):
+    """
+    Fake Pinecone indexes (dense + sparse), storage and LLM
+    """
+    dense = FakeIndex()
+    sparse = FakeIndex()
+    set_vector_stores(
+        dense=PineconeVectorStore(dense, async_index_factory=lambda: FakeAsyncIndex(dense)),
+        sparse=PineconeVectorStore(sparse, async_index_factory=lambda: FakeAsyncIndex(sparse))
+    )
+    storage = FakeSupabase()
+    override_client("supabase", storage)
+    override_client("supabase_async", storage.async_view())
+    llm = FakeLLM(latency=0.0, tokens=5)
+    override_client("llm", llm)
+
+    yield {"dense": dense, "sparse": sparse, "storage": storage, "llm": llm}
+
+    for name in ("vector_stores", "supabase", "supabase_async", "llm"):
+        reset_client(name)
+
+
+@pytest.fixture
+def ingest(services):
+    """
+    Runs a PDF (bytes) through the ingestion job, or the reindex job with
+    a document_id, and returns the job result
+    """
+    def run(data: bytes, owner_id: int = 1, document_id: int = None, filename: str = "doc.pdf") -> dict:
+        spool_path, content_hash = spool_upload(io.BytesIO(data), filename)
+        job = enqueue_ingestion(owner_id, filename, spool_path, content_hash, document_id=document_id)
+        job = get_job_queue().get_job(job["id"])
+        runner = run_ingestion_job if document_id is None else run_reindex_job
+        return runner(job)
+
+    return run
+
+
+@pytest.fixture
+def fresh_schedulers():
+    """
+    Schedulers rebuilt from the (possibly monkeypatched) settings
+    """
+    names = [f"scheduler:{resource}" for resource in ("llm", "search", "upsert")]
+    for name in names:
+        reset_client(name)
+    yield
+    for name in names:
+        reset_client(name)
@@ -0,0 +1,41 @@
+import os
+
+from app.services.vector_backends.base import namespace_dirname
+from app.services.vector_backends.bm25_store import BM25Store
+
+
+def record(_id: str, text: str) -> dict:
+    return {"_id": _id, "text": text, "document_id": 1}
+
+
+def test_namespaces_stay_inside_root_and_apart(tmp_path):
+    store = BM25Store(str(tmp_path / "index"))
+    names = ["user_1", "a/b", "a_b", "..", "../escape"]
+    for name in names:
+        store.upsert(name, [record(f"{name}#1", "clause 7.2 termination")])
+
+    assert sorted(os.listdir(store.root)) == sorted(namespace_dirname(n) for n in names)
+    assert os.listdir(tmp_path) == ["index"]
+    for name in names:
+        hits = store.search(name, "termination", top_k=10, fields=[])
+        assert [h["_id"] for h in hits] == [f"{name}#1"]
+
+
+def test_reads_leave_disk_alone(tmp_path):
+    root = str(tmp_path / "index")
+    BM25Store(root).upsert("user_1", [record("a", "invoice 42")])
+    # An upsert that died before committing its segment
+    orphan = os.path.join(root, "user_1", "seg-99999999")
+    os.makedirs(orphan)
+
+    store = BM25Store(root)
+    assert store.search("user_9", "invoice", top_k=5, fields=[]) == []
+    assert [h["_id"] for h in store.search("user_1", "invoice", top_k=5, fields=[])] == ["a"]
+    assert store.namespace_stats("user_9")["vector_count"] == 0
+    assert sorted(os.listdir(root)) == ["user_1"]
+    assert os.path.exists(orphan)
+
+    # The first write from this process clears it
+    store.upsert("user_1", [record("b", "invoice 43")])
+    assert not os.path.exists(orphan)
+    assert store.namespace_stats("user_1")["vector_count"] == 2
@@ -0,0 +1,36 @@
+import io
+
+from pypdf import PdfWriter
+
+from benchmarks.pdfs import make_pdf
+from app.services.bulk_ingestion import enqueue_bulk_ingestion, new_file_entry, run_bulk_job
+from app.services.ingestion import spool_upload
+from app.services.job_queue import get_job_queue
+
+
+def blank_pdf(pages: int = 1) -> bytes:
+    writer = PdfWriter()
+    for _ in range(pages):
+        writer.add_blank_page(612, 842)
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def run_bulk(files: dict[str, bytes]) -> tuple[dict, list[dict]]:
+    entries = [
+        new_file_entry(name, *spool_upload(io.BytesIO(data), name))
+        for name, data in files.items()
+    ]
+    job = enqueue_bulk_ingestion(1, "batch", entries)
+    result = run_bulk_job(get_job_queue().get_job(job["id"]))
+    return result, get_job_queue().get_job(job["id"])["files"]
+
+
+def test_bulk_file_without_text(services):
+    result, files = run_bulk({"scan.pdf": blank_pdf(2), "report.pdf": make_pdf(2)})
+
+    assert result["succeeded"] == 2
+    by_name = {f["filename"]: f for f in files}
+    assert by_name["scan.pdf"]["num_chunks"] == 0
+    assert by_name["report.pdf"]["num_chunks"] > 0
@@ -0,0 +1,54 @@
+import pytest
+
+from benchmarks.pdfs import make_pdf
+from app.services.cache import (
+    InMemoryCache,
+    answer_cache_key,
+    get_cached_answer,
+    invalidate_namespace,
+    set_cache,
+    set_cached_answer
+)
+from app.services.rag import run_rag
+
+
+@pytest.fixture
+def cache():
+    cache = InMemoryCache(max_entries=100)
+    set_cache(cache)
+    yield cache
+    set_cache(None)
+
+
+def test_invalidation_hides_entries(cache):
+    key = answer_cache_key("ns", "What is the policy?", 5, "model")
+    set_cached_answer(key, {"answer": "a"})
+    assert get_cached_answer(answer_cache_key("ns", "what is the policy", 5, "model")) == {"answer": "a"}
+
+    invalidate_namespace("ns")
+
+    assert get_cached_answer(answer_cache_key("ns", "What is the policy?", 5, "model")) is None
+    # An answer computed under the old generation stays unreachable
+    set_cached_answer(key, {"answer": "stale"})
+    assert get_cached_answer(answer_cache_key("ns", "What is the policy?", 5, "model")) is None
+
+
+def test_other_namespaces_keep_entries(cache):
+    key = answer_cache_key("other", "question", 5, "model")
+    set_cached_answer(key, {"answer": "a"})
+    invalidate_namespace("ns")
+    assert get_cached_answer(answer_cache_key("other", "question", 5, "model")) == {"answer": "a"}
+
+
+def test_ingestion_invalidates_answers(cache, ingest, services):
+    ingest(make_pdf(2, seed=1))
+    first = run_rag("policy employee contract", "user_1")
+    again = run_rag("policy employee contract", "user_1")
+    assert (first["cached"], again["cached"]) == (False, True)
+    calls = services["llm"].calls
+
+    ingest(make_pdf(2, seed=2))
+    after = run_rag("policy employee contract", "user_1")
+
+    assert after["cached"] is False
+    assert services["llm"].calls == calls + 1
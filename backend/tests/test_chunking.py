@@ -0,0 +1,203 @@
+"""
+Tests for app.services.chunking: the native splitter against LangChain's
+RecursiveCharacterTextSplitter, and streaming chunk_pages against
+chunk_text.
+
+    cd backend && python -m pytest tests
+"""
+import hashlib
+import random
+
+import pytest
+
+from app.services.chunking import (
+    SEPARATORS,
+    TextSplitter,
+    chunk_pages,
+    chunk_text,
+    get_chunking_config
+)
+
+WORDS = "policy employee contract payment invoice retention security access review".split()
+
+# Expected chunks: RecursiveCharacterTextSplitter(chunk_size=20,
+# chunk_overlap=5, separators=SEPARATORS).split_text(text)
+LANGCHAIN_CASES = {
+    "paragraphs": (
+        "First paragraph here.\n\nSecond one is a bit longer than that.\n\nThird.",
+        ["First paragraph here", ".", "Second one is a bit", "bit longer than", "than that", ".", "Third."],
+    ),
+    "lines": (
+        "alpha beta gamma\ndelta epsilon\nzeta eta theta iota kappa\nlambda",
+        ["alpha beta gamma", "delta epsilon", "zeta eta theta iota", "iota kappa", "lambda"],
+    ),
+    "sentences": (
+        "One two three. Four five six seven. Eight nine. Ten eleven twelve thirteen.",
+        ["One two three", ". Four five six", "six seven", ". Eight nine", ". Ten eleven twelve", "thirteen", "."],
+    ),
+    "no_separators": (
+        "abcdefghijklmnopqrstuvwxyzABCDEFGHIJ",
+        ["abcdefghijklmnopqrst", "pqrstuvwxyzABCDEFGHI", "EFGHIJ"],
+    ),
+    "long_word": (
+        "short words then averyveryverylongwordwithoutanyspaces end",
+        ["short words then", "averyveryverylongwo", "ongwordwithoutanyspa", "nyspaces", "end"],
+    ),
+}
+
+
+def make_text(paragraphs: int, seed: int = 0, separator: str = "\n\n") -> str:
+    rng = random.Random(seed)
+    return separator.join(
+        ". ".join(
+            " ".join(rng.choice(WORDS) for _ in range(rng.randint(4, 12)))
+            for _ in range(rng.randint(1, 4))
+        ) + "."
+        for _ in range(paragraphs)
+    )
+
+
+def paginate(text: str, seed: int = 0) -> list[dict]:
+    rng = random.Random(seed)
+    pages = []
+    pos = 0
+    while pos < len(text):
+        size = rng.randint(40, 300)
+        pages.append({"page_number": len(pages) + 1, "text": text[pos:pos + size]})
+        pos += size
+    return pages
+
+
+def page_at(pages: list[dict], offset: int) -> int:
+    start = 0
+    for page in pages:
+        if offset < start + len(page["text"]):
+            return page["page_number"]
+        start += len(page["text"])
+    return pages[-1]["page_number"]
+
+
+@pytest.mark.parametrize("name", sorted(LANGCHAIN_CASES))
+def test_split_text_matches_langchain(name):
+    text, expected = LANGCHAIN_CASES[name]
+    assert TextSplitter(20, 5).split_text(text) == expected
+
+
+def test_split_text_matches_installed_langchain():
+    splitters = pytest.importorskip("langchain_text_splitters")
+    reference = splitters.RecursiveCharacterTextSplitter(
+        chunk_size=50,
+        chunk_overlap=10,
+        separators=list(SEPARATORS)
+    )
+    for separator in ("\n\n", "\n", " "):
+        text = make_text(60, seed=1, separator=separator)
+        assert TextSplitter(50, 10).split_text(text) == reference.split_text(text)
+
+
+def test_offsets_point_at_chunks():
+    text = make_text(40, seed=2)
+    for start, chunk in TextSplitter(50, 10).split_with_offsets(text):
+        assert text[start:start + len(chunk)] == chunk
+
+
+@pytest.mark.parametrize("separator", ["\n\n", "\n", " "])
+def test_chunk_pages_matches_chunk_text(separator):
+    text = make_text(300, seed=3, separator=separator)
+    pages = paginate(text, seed=3)
+    splitter = TextSplitter(50, 10)
+
+    records = list(chunk_pages(pages, "general", "qa", splitter=splitter))
+
+    assert [r["text"] for r in records] == splitter.split_text(text)
+
+
+def test_chunk_pages_offsets_and_pages():
+    text = make_text(300, seed=4)
+    pages = paginate(text, seed=4)
+
+    records = list(chunk_pages(pages, "general", "qa", splitter=TextSplitter(50, 10)))
+
+    assert records
+    for r in records:
+        assert text[r["start"]:r["end"]] == r["text"]
+        assert r["page"] == page_at(pages, r["start"])
+        assert r["page_end"] == page_at(pages, r["end"] - 1)
+        assert r["chunk_hash"] == hashlib.sha256(r["text"].encode("utf-8")).hexdigest()
+
+
+def test_chunk_pages_with_default_profile():
+    text = make_text(400, seed=5)
+    pages = paginate(text, seed=5)
+
+    records = list(chunk_pages(pages, "general", "qa"))
+
+    assert [r["text"] for r in records] == chunk_text(text, "general", "qa")
+
+
+def test_chunk_pages_streams():
+    # Chunks come out long before the last page is read
+    text = make_text(600, seed=6)
+    pages = paginate(text, seed=6)
+    read = []
+
+    def source():
+        for page in pages:
+            read.append(page["page_number"])
+            yield page
+
+    first = next(chunk_pages(source(), "general", "qa", splitter=TextSplitter(50, 10)))
+
+    assert first["start"] == 0
+    assert len(read) < len(pages) // 2
+
+
+def test_separator_fixed_by_first_window():
+    # A coarser separator that only shows up after the first window is
+    # not used: the chunks are those of the text split with the first
+    # window's separator
+    splitter = TextSplitter(50, 10)
+    head = make_text(80, seed=7, separator="\n") + "\nend."
+    text = head + "\n\n" + "\n\n".join(f"item {i}." for i in range(40))
+    pages = paginate(text, seed=7)
+    level = splitter.top_level(text[:splitter.chunk_size * 8])
+    assert SEPARATORS[level] == "\n"
+
+    chunks = [r["text"] for r in chunk_pages(pages, "general", "qa", splitter=splitter)]
+
+    assert chunks == [c for _, c in splitter.split_with_offsets(text, level)]
+    assert chunks != splitter.split_text(text)
+
+
+def test_long_stretch_without_separator():
+    # After a long stretch without the top-level separator, chunk_pages
+    # gives up exactness to keep its window bounded; chunks still map
+    # back to the text, in order and within the chunk size
+    splitter = TextSplitter(50, 10)
+    text = make_text(10, seed=9) + "\n\n" + make_text(800, seed=10, separator=" ")
+    pages = paginate(text, seed=9)
+
+    records = list(chunk_pages(pages, "general", "qa", splitter=splitter))
+
+    starts = [r["start"] for r in records]
+    assert starts == sorted(starts)
+    for r in records:
+        assert text[r["start"]:r["end"]] == r["text"]
+        assert len(r["text"]) <= splitter.chunk_size
+    assert records[-1]["end"] == len(text.rstrip())
+
+
+def test_chunk_pages_empty():
+    assert list(chunk_pages([], "general", "qa")) == []
+    assert list(chunk_pages([{"page_number": 1, "text": ""}], "general", "qa")) == []
+
+
+@pytest.mark.parametrize("doc_type, purpose, expected", [
+    ("general", "qa", (900, 200)),
+    ("legal", "qa", (900, 300)),
+    ("notes", "qa", (700, 100)),
+    ("technical", "summary", (1500, 300)),
+    ("unknown", "unknown", (1000, 200)),
+])
+def test_chunking_config(doc_type, purpose, expected):
+    assert get_chunking_config(doc_type, purpose) == expected
@@ -0,0 +1,36 @@
+from app.services.chunking import chunk_pages
+from app.services.context import _overlap, merge_adjacent
+from tests.test_chunking import make_text, paginate
+
+
+def test_adjacent_chunks_merge_back_into_the_text():
+    text = make_text(120, seed=11)
+    records = list(chunk_pages(paginate(text, seed=11), "general", "qa"))
+    assert len(records) > 3
+
+    passages = merge_adjacent(
+        [r["text"] for r in records],
+        [{"document_id": 1, "chunk_index": i, "score": 1.0} for i in range(len(records))]
+    )
+
+    assert len(passages) == 1
+    merged = passages[0]["text"]
+    original = text[records[0]["start"]:records[-1]["end"]]
+    # Nothing lost or repeated (seams without overlap lose their whitespace)
+    assert "".join(merged.split()) == "".join(original.split())
+
+
+def test_chance_matches_are_not_overlap():
+    # A shared word at the seam
+    assert _overlap("Payment is due within 30 days", "days of the invoice date") == 0
+    # A long match that starts mid-word
+    assert _overlap("see the subparagraph", "paragraph 4 for the rules") == 0
+    # Longer than any chunk overlap
+    seam = "termination notice period " * 20
+    assert _overlap("intro " + seam, seam + "end") < len(seam)
+
+
+def test_real_overlap_is_removed():
+    assert _overlap("The notice period is thirty days", "notice period is thirty days. After") == len(
+        "notice period is thirty days"
+    )
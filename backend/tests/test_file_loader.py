@@ -0,0 +1,45 @@
+import pytest
+
+from benchmarks.pdfs import make_pdf
+from app.core.config import settings
+from app.utils import file_loader
+from app.utils.file_loader import iter_pdf_pages
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """
+    Records the ranges handed to the extraction pool
+    """
+    calls = []
+    pool = file_loader._get_pool()
+
+    class Recording:
+        def submit(self, fn, path, start, stop, page_timeout):
+            calls.append((path, start, stop))
+            return pool.submit(fn, path, start, stop, page_timeout)
+
+    monkeypatch.setattr(file_loader, "_get_pool", Recording)
+    return calls
+
+
+@pytest.mark.parametrize("pages", [3, 20])
+def test_bytes_reach_the_pool_as_a_path(tmp_path, submitted, pages):
+    data = make_pdf(pages)
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(data)
+
+    from_bytes = list(iter_pdf_pages(data))
+
+    assert from_bytes == list(iter_pdf_pages(str(path)))
+    assert len(from_bytes) == pages
+    assert all(isinstance(p, str) for p, _, _ in submitted)
+
+
+def test_small_documents_are_one_range(tmp_path, submitted):
+    path = tmp_path / "doc.pdf"
+    path.write_bytes(make_pdf(settings.pdf_parallel_min_pages - 1))
+
+    list(iter_pdf_pages(str(path)))
+
+    assert [(start, stop) for _, start, stop in submitted] == [(0, settings.pdf_parallel_min_pages - 1)]
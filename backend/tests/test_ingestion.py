@@ -0,0 +1,30 @@
+import pytest
+
+from benchmarks.pdfs import make_pdf
+from app.core.database import SessionLocal
+from app.models.document import Document, DocumentChunk
+
+
+def count(model) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(model).count()
+    finally:
+        db.close()
+
+
+def test_ingest_indexes_document(ingest, services):
+    result = ingest(make_pdf(3))
+
+    assert result["num_chunks"] > 0
+    assert count(Document) == 1
+    assert count(DocumentChunk) == result["num_chunks"]
+    assert len(services["dense"].records["user_1"]) == result["num_chunks"]
+
+
+def test_unreadable_pdf_leaves_nothing_behind(ingest, services):
+    with pytest.raises(Exception):
+        ingest(b"%PDF-1.4 this is not a pdf")
+
+    assert count(Document) == 0
+    assert services["storage"].objects == {}
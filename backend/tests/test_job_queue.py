@@ -0,0 +1,84 @@
+import io
+import os
+import time
+
+import pytest
+
+from benchmarks.pdfs import make_pdf
+from app.core.config import settings
+from app.core.database import SessionLocal
+from app.models.document import Document, DocumentChunk
+from app.services import ingestion
+from app.services.ingestion import enqueue_ingestion, run_ingestion_job, spool_upload
+from app.services.job_queue import InMemoryJobQueue, SQLiteJobQueue, get_job_queue, new_job
+
+
+class Crash(BaseException):
+    """A process dying mid-job: not caught by the job's own cleanup"""
+
+
+def count(model) -> int:
+    db = SessionLocal()
+    try:
+        return db.query(model).count()
+    finally:
+        db.close()
+
+
+def test_sqlite_requeues_interrupted_jobs(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    jobs = SQLiteJobQueue(path, poll_interval=0.01)
+    jobs.create_job(new_job(1, "doc.pdf", "/spool/doc.pdf"))
+    claimed = jobs.claim_next(timeout=0.1)
+    assert claimed["status"] == "running"
+    jobs.close()
+
+    jobs = SQLiteJobQueue(path, poll_interval=0.01)
+    try:
+        assert jobs.get_job(claimed["id"])["status"] == "queued"
+        assert jobs.claim_next(timeout=0.1)["id"] == claimed["id"]
+    finally:
+        jobs.close()
+
+
+def test_rerun_of_interrupted_ingest_replaces_its_document(services, monkeypatch):
+    data = make_pdf(3)
+    spool_path, content_hash = spool_upload(io.BytesIO(data), "doc.pdf")
+    job = enqueue_ingestion(1, "doc.pdf", spool_path, content_hash)
+
+    def crash(path):
+        raise Crash()
+        yield
+
+    with monkeypatch.context() as patch:
+        patch.setattr(ingestion, "iter_pdf_pages", crash)
+        with pytest.raises(Crash):
+            run_ingestion_job(get_job_queue().get_job(job["id"]))
+
+    interrupted = get_job_queue().get_job(job["id"])
+    assert interrupted["document_id"] is not None
+    assert count(Document) == 1
+
+    result = run_ingestion_job(interrupted)
+
+    assert count(Document) == 1
+    assert count(DocumentChunk) == result["num_chunks"]
+    assert [path for _, path in services["storage"].objects] == [result["storage_path"]]
+    os.remove(spool_path)
+
+
+def test_memory_queue_forgets_finished_jobs(monkeypatch):
+    monkeypatch.setattr(settings, "ingestion_job_ttl_seconds", 60)
+    jobs = InMemoryJobQueue()
+    finished = new_job(1, "old.pdf", None)
+    waiting = new_job(1, "waiting.pdf", None)
+    jobs.create_job(finished)
+    jobs.create_job(waiting)
+    jobs.update_job(finished["id"], status="succeeded")
+    jobs._jobs[finished["id"]]["updated_at"] = time.time() - 120
+    jobs._jobs[waiting["id"]]["updated_at"] = time.time() - 120
+
+    jobs.create_job(new_job(1, "new.pdf", None))
+
+    assert jobs.get_job(finished["id"]) is None
+    assert jobs.get_job(waiting["id"]) is not None
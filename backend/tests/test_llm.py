@@ -0,0 +1,35 @@
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeLLM
+from app.core.clients import override_client
+from app.core.config import settings
+from app.services.deadline import DeadlineExceeded, deadline_scope
+from app.services.llm import generate_answer
+from app.services.scheduler import get_scheduler
+
+
+def test_slot_held_until_the_stream_is_closed(services, fresh_schedulers, monkeypatch):
+    monkeypatch.setattr(settings, "llm_max_concurrency", 1)
+    override_client("llm", FakeLLM(latency=0.0, tokens=20, token_latency=0.1))
+    scheduler = get_scheduler("llm")
+
+    started = time.monotonic()
+    with deadline_scope(0.15), pytest.raises(DeadlineExceeded) as raised:
+        generate_answer("prompt")
+
+    # The caller is back at the deadline, with what was generated so far...
+    assert time.monotonic() - started < 0.3
+    assert raised.value.partial.startswith("token0 ")
+    # ...while the generation still holds its slot until the worker sees
+    # the stop at its next chunk and closes the stream
+    assert scheduler.stats()["active"] == 1
+    time.sleep(0.2)
+    assert scheduler.stats()["active"] == 0
+
+
+def test_answer_within_deadline(services, fresh_schedulers):
+    with deadline_scope(5.0):
+        assert generate_answer("prompt") == "token0 token1 token2 token3 token4 "
+    assert get_scheduler("llm").stats()["active"] == 0
@@ -0,0 +1,42 @@
+import os
+
+import pytest
+
+from app.services.vector_backends.base import namespace_dirname
+from app.services.vector_backends.local_store import LocalVectorStore
+
+
+def record(_id: str, text: str) -> dict:
+    return {"_id": _id, "text": text, "document_id": 1}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalVectorStore(str(tmp_path / "index"), dim=64)
+
+
+def test_namespaces_stay_inside_root_and_apart(store, tmp_path):
+    names = ["user_1", "a/b", "a_b", ".", "..", "../escape"]
+    for name in names:
+        store.upsert(name, [record(f"{name}#1", f"text of {name}")])
+
+    assert sorted(os.listdir(store.root)) == sorted(namespace_dirname(n) for n in names)
+    assert os.listdir(tmp_path) == ["index"]
+    for name in names:
+        hits = store.search(name, "text", top_k=10, fields=["document_id"])
+        assert [h["_id"] for h in hits] == [f"{name}#1"]
+
+
+def test_plain_namespaces_keep_their_directory():
+    assert namespace_dirname("user_42") == "user_42"
+    assert namespace_dirname("a/b") != namespace_dirname("a_b")
+    assert "/" not in namespace_dirname("../../etc")
+
+
+def test_unknown_namespace_reads_create_nothing(store):
+    assert store.search("user_9", "anything", top_k=5, fields=[]) == []
+    assert store.list_ids("user_9", "") == []
+    assert store.namespace_stats("user_9")["vector_count"] == 0
+    store.delete_document("user_9", 1)
+
+    assert os.listdir(store.root) == []
@@ -0,0 +1,21 @@
+import pytest
+from pydantic import ValidationError
+
+from app.api.query import BatchQueryRequest
+from app.core.config import settings
+
+
+def test_batch_request_defaults():
+    request = BatchQueryRequest(questions=["what is the notice period?"], namespace="user_1")
+    assert request.top_k == 5
+
+
+@pytest.mark.parametrize("top_k", [0, -1, settings.query_max_top_k + 1])
+def test_batch_request_bounds_top_k(top_k):
+    with pytest.raises(ValidationError):
+        BatchQueryRequest(questions=["q"], namespace="user_1", top_k=top_k)
+
+
+def test_batch_request_bounds_question_length():
+    with pytest.raises(ValidationError):
+        BatchQueryRequest(questions=["x" * (settings.query_max_question_chars + 1)], namespace="user_1")
@@ -0,0 +1,84 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from app.api.usage import usage_summary
+from app.core.database import AsyncSessionLocal, SessionLocal
+from app.models.usage import UsageDaily
+from app.services.usage import UsageRecorder
+
+
+def recorder() -> UsageRecorder:
+    return UsageRecorder(max_events=1000, flush_interval=1.0, flush_batch=100)
+
+
+def daily_rows() -> list[UsageDaily]:
+    db = SessionLocal()
+    try:
+        return db.query(UsageDaily).order_by(UsageDaily.action).all()
+    finally:
+        db.close()
+
+
+def test_flushes_add_to_the_daily_rollup(db):
+    usage = recorder()
+    usage.record(1, "query", prompt_tokens=10, completion_tokens=5, latency_ms=100.0, chunks=3)
+    usage.record(1, "upload", latency_ms=50.0)
+    assert usage.flush() == 2
+
+    usage.record(1, "query", prompt_tokens=1, completion_tokens=1, latency_ms=20.0, chunks=1)
+    assert usage.flush() == 1
+
+    query, upload = daily_rows()
+    assert (query.action, query.events, query.tokens, query.prompt_tokens, query.chunks) == ("query", 2, 17, 11, 4)
+    assert query.latency_ms == 120.0
+    assert (upload.action, upload.events, upload.tokens) == ("upload", 1, 0)
+    assert query.day == datetime.utcnow().date()
+
+
+def test_concurrent_flushers_keep_every_event(db):
+    recorders = [recorder() for _ in range(4)]
+    for usage in recorders:
+        for _ in range(25):
+            usage.record(1, "query", prompt_tokens=1)
+
+    def drain(usage):
+        # A flush that hits a locked database puts its batch back
+        while True:
+            try:
+                if not usage.flush():
+                    return
+            except Exception:
+                time.sleep(0.01)
+
+    threads = [threading.Thread(target=drain, args=(usage,)) for usage in recorders]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    (row,) = daily_rows()
+    assert row.events == 100
+    assert row.tokens == 100
+
+
+def test_summary_days_are_utc(db, monkeypatch):
+    usage = recorder()
+    usage.record(1, "query", prompt_tokens=1)
+    usage.flush()
+
+    async def summary():
+        async with AsyncSessionLocal() as session:
+            return await usage_summary(days=1, user_id=None, db=session, user=SimpleNamespace(id=1, role="user"))
+
+    # Local dates ahead of and behind UTC
+    for zone in ("Etc/GMT-14", "Etc/GMT+12"):
+        monkeypatch.setenv("TZ", zone)
+        time.tzset()
+        try:
+            assert [row["events"] for row in asyncio.run(summary())["daily"]] == [1]
+        finally:
+            monkeypatch.undo()
+            time.tzset()
@@ -1,6 +1,8 @@
 import streamlit as st
 import requests
 import os
+import json
+import time
 from dotenv import load_dotenv
 
 # ---------------- Setup ----------------
@@ -14,8 +16,21 @@ st.set_page_config(
 )
 
 # ---------------- Helper Functions ----------------
+@st.cache_resource
+def get_session() -> requests.Session:
+    """
+    One pooled HTTP session per server process: connections to the
+    backend are kept alive and reused across requests and reruns
+    """
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=16)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
 def login_user(email: str, password: str):
-    response = requests.post(
+    response = get_session().post(
         f"{BACKEND_URL}/auth/login",
         params={
             "email": email,
@@ -39,6 +54,69 @@ def get_headers():
     }
 
 
+def wait_for_job(job_id: str, poll_interval: float = 1.0, timeout: float = 3600, on_update=None):
+    deadline = time.time() + timeout
+
+    while time.time() < deadline:
+        response = get_session().get(
+            f"{BACKEND_URL}/documents/jobs/{job_id}",
+            headers=get_headers(),
+            timeout=30
+        )
+        if response.status_code != 200:
+            return {"status": "failed", "error": response.text}
+
+        job = response.json()
+        if on_update:
+            on_update(job)
+        if job["status"] in ("succeeded", "failed"):
+            return job
+
+        time.sleep(poll_interval)
+
+    return {"status": "failed", "error": "Timed out waiting for ingestion"}
+
+
+def stream_query(question: str, namespace: str, placeholder):
+    """
+    Calls the SSE query endpoint and renders answer tokens as they arrive.
+    Returns (answer, sources), or raises RuntimeError on failure.
+    """
+    response = get_session().post(
+        f"{BACKEND_URL}/query/stream",
+        params={
+            "question": question,
+            "namespace": namespace
+        },
+        headers=get_headers(),
+        stream=True,
+        timeout=120
+    )
+
+    if response.status_code != 200:
+        raise RuntimeError(response.text)
+
+    answer = ""
+    sources = []
+    event = None
+
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data = json.loads(line[len("data:"):])
+            if event == "sources":
+                sources = data["sources"]
+            elif event == "token":
+                answer += data["text"]
+                placeholder.markdown(answer + "▌")
+            elif event == "error":
+                raise RuntimeError(data["detail"])
+
+    placeholder.markdown(answer)
+    return answer, sources
+
+
 # ---------------- Auth Gate ----------------
 if "token" not in st.session_state:
     st.title("🔐 Login")
@@ -73,33 +151,55 @@ if st.sidebar.button("Logout"):
 st.header("📤 Upload Documents")
 
 uploaded_files = st.file_uploader(
-    "Upload PDF documents",
-    type=["pdf"],
+    "Upload PDF documents (or zip archives of PDFs)",
+    type=["pdf", "zip"],
     accept_multiple_files=True
 )
 
+
+def show_bulk_progress(job, bar):
+    files = job.get("files") or []
+    finished = sum(f["status"] in ("succeeded", "failed", "duplicate", "rejected") for f in files)
+    bar.progress(finished / len(files) if files else 1.0, text=f"{finished}/{len(files)} files processed")
+
+
 if st.button("Upload"):
     if not uploaded_files:
         st.warning("Please upload at least one PDF")
     else:
         with st.spinner("Uploading documents..."):
-            for file in uploaded_files:
-                response = requests.post(
-                    f"{BACKEND_URL}/documents/upload",
-                    files={
-                        "file": (file.name, file, "application/pdf")
-                    },
-                    data={
-                        "namespace": namespace
-                    },
-                    headers=get_headers(),
-                    timeout=300
-                )
-
-                if response.status_code == 200:
-                    st.success(f"Uploaded: {file.name}")
+            # One request for the whole selection; the backend pipelines
+            # the files through ingestion
+            response = get_session().post(
+                f"{BACKEND_URL}/documents/upload/bulk",
+                files=[
+                    ("files", (file.name, file, "application/zip" if file.name.lower().endswith(".zip") else "application/pdf"))
+                    for file in uploaded_files
+                ],
+                headers=get_headers(),
+                timeout=600
+            )
+
+        if response.status_code != 202:
+            st.error(f"Upload failed → {response.text}")
+        else:
+            body = response.json()
+            files = body["files"]
+
+            if body["job_id"]:
+                bar = st.progress(0.0, text="Ingesting...")
+                job = wait_for_job(body["job_id"], on_update=lambda j: show_bulk_progress(j, bar))
+                if job["status"] == "failed" and not job.get("files"):
+                    st.error(f"Ingestion failed → {job.get('error')}")
+                files = job.get("files") or files
+
+            for f in files:
+                if f["status"] == "succeeded":
+                    st.success(f"Uploaded: {f['filename']} ({f['num_chunks']} chunks)")
+                elif f["status"] == "duplicate":
+                    st.info(f"Already uploaded: {f['filename']}")
                 else:
-                    st.error(f"Failed: {file.name} → {response.text}")
+                    st.error(f"Failed: {f['filename']} → {f.get('error')}")
 
 # ---------------- Chat Section ----------------
 st.divider()
@@ -117,27 +217,21 @@ if st.button("Ask"):
     if not question.strip():
         st.warning("Please enter a question")
     else:
-        with st.spinner("Querying knowledge base..."):
-            response = requests.post(
-                f"{BACKEND_URL}/query",
-                params={
-                    "question": question,
-                    "namespace": namespace
-                },
-                headers=get_headers(),
-                timeout=120
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-
-                st.session_state.chat_history.append({
-                    "question": question,
-                    "answer": data["answer"],
-                    "sources": data.get("sources", [])
-                })
-            else:
-                st.error(f"Error: {response.text}")
+        placeholder = st.empty()
+
+        try:
+            with st.spinner("Querying knowledge base..."):
+                answer, sources = stream_query(question, namespace, placeholder)
+
+            st.session_state.chat_history.append({
+                "question": question,
+                "answer": answer,
+                "sources": sources
+            })
+            # The finished answer is shown in the history below
+            placeholder.empty()
+        except RuntimeError as e:
+            st.error(f"Error: {e}")
 
 # ---------------- Chat History ----------------
 for chat in reversed(st.session_state.chat_history):
@@ -151,7 +245,7 @@ for chat in reversed(st.session_state.chat_history):
         st.markdown("**Sources:**")
         for src in chat["sources"]:
             st.markdown(
-                f"- `{src['filename']}` (chunk {src['chunk_index']}, score {round(src['score'], 3)})"
+                f"- `{src['filename']}` (page {src.get('page') or '?'}, chunk {src['chunk_index']}, score {round(src['score'], 3)})"
             )
 
     st.markdown("---")